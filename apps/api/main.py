@@ -1,5 +1,7 @@
+import importlib.util
 import os
 import shutil
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
@@ -10,12 +12,37 @@ from slowapi.errors import RateLimitExceeded
 load_dotenv()
 
 from routers import abdm, voice, ocr, symptoms, location, vitals, analytics
+from services.circuit_breaker import get_breaker_stats
+from services.db import close_db
+from services.emergency_rules import get_emergency_rule_set
+from services.health_log_writer import get_health_log_writer
+from services.local_ml_service import get_symptom_cache_stats
+from services.medicine_catalog import get_catalog_stats
+from services.medicine_db import prewarm_medicine_context
+from services.prescription_ocr_service import get_name_cache_stats, save_name_normalization_cache
+from services.prompt_context import get_prompt_context_stats
 from services.rate_limit import limiter
+from services.response_cache import get_symptom_response_cache
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Re-send health logs spooled before the last shutdown.
+    get_health_log_writer().start()
+    # Compile emergency rules now so a broken rules file fails the deploy, not a request.
+    get_emergency_rule_set()
+    prewarm_medicine_context()
+    yield
+    await get_health_log_writer().stop()
+    save_name_normalization_cache()
+    await close_db()
+
 
 app = FastAPI(
     title="Rural AI Healthcare API",
     version="0.2.0",
     description="Backend service for AI symptom analysis, prescription OCR, location services, and ABDM integration",
+    lifespan=lifespan,
 )
 
 app.state.limiter = limiter
@@ -57,11 +84,17 @@ async def health_check():
 
     # Check local model
     if use_local:
-        model_path = os.path.join(os.path.dirname(__file__), "models", "symptom_model.joblib")
-        checks["local_symptom_model"] = "loaded" if os.path.exists(model_path) else "missing — run: python scripts/train_model.py"
+        models_dir = os.path.join(os.path.dirname(__file__), "models")
+        model_present = any(
+            os.path.exists(os.path.join(models_dir, name))
+            for name in ("symptom_model_compiled.npz", "symptom_model.joblib")
+        )
+        checks["local_symptom_model"] = "loaded" if model_present else "missing — run: python scripts/train_model.py"
 
     tesseract_bin = shutil.which("tesseract")
     checks["tesseract_binary"] = tesseract_bin if tesseract_bin else "missing"
+    persistent_tesseract = importlib.util.find_spec("tesserocr") is not None
+    checks["tesseract_engine"] = "persistent" if persistent_tesseract else "subprocess"
 
     ocr_model_path = os.getenv("PRESCRIPTION_OCR_MODEL_PATH", "models/prescription_ocr_trocr_int8.onnx")
     ocr_artifact = Path(ocr_model_path)
@@ -87,7 +120,7 @@ async def health_check():
     required_ok = checks["supabase"] == "configured"
     if use_local:
         required_ok = required_ok and checks.get("local_symptom_model") == "loaded"
-        required_ok = required_ok and checks.get("tesseract_binary") != "missing"
+        required_ok = required_ok and (persistent_tesseract or checks.get("tesseract_binary") != "missing")
         # Cloud fallback being enabled is a positive signal (safety net), not a degradation
     else:
         # Cloud mode requires at least one AI provider
@@ -99,4 +132,14 @@ async def health_check():
         "status": "ok" if required_ok else "degraded",
         "service": "rural-ai-api",
         "checks": checks,
+        "caches": {
+            "symptom_results": get_symptom_cache_stats(),
+            "medicine_names": get_name_cache_stats(),
+            "cloud_symptom_responses": get_symptom_response_cache().stats(),
+        },
+        "health_log_queue": get_health_log_writer().stats(),
+        "medicine_catalog": get_catalog_stats(),
+        "emergency_rules": len(get_emergency_rule_set()),
+        "ai_providers": get_breaker_stats(),
+        "prompt_context": get_prompt_context_stats(),
     }
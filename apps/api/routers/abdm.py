@@ -13,7 +13,7 @@ from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
-from services.auth import get_supabase_client
+from services.db import get_db
 from services.rate_limit import limiter
 
 logger = logging.getLogger(__name__)
@@ -48,28 +48,28 @@ def _now_utc() -> datetime:
 
 def _otp_store():
     try:
-        return get_supabase_client().table(_OTP_STORE_TABLE)
+        return get_db().table(_OTP_STORE_TABLE)
     except Exception as e:
         raise HTTPException(status_code=503, detail=_OTP_STORE_ERROR) from e
 
 
-def _cleanup_expired_otps():
+async def _cleanup_expired_otps():
     try:
-        _otp_store().delete().lt("expires_at", _now_utc().isoformat()).execute()
+        await _otp_store().delete().lt("expires_at", _now_utc().isoformat()).execute()
     except Exception as e:
         raise HTTPException(status_code=503, detail=_OTP_STORE_ERROR) from e
 
 
-def _delete_txn(transaction_id: str):
+async def _delete_txn(transaction_id: str):
     try:
-        _otp_store().delete().eq("transaction_id", transaction_id).execute()
+        await _otp_store().delete().eq("transaction_id", transaction_id).execute()
     except Exception as e:
         raise HTTPException(status_code=503, detail=_OTP_STORE_ERROR) from e
 
 
-def _fetch_txn(transaction_id: str) -> dict | None:
+async def _fetch_txn(transaction_id: str) -> dict | None:
     try:
-        res = (
+        res = await (
             _otp_store()
             .select("transaction_id, otp, attempts, max_attempts, expires_at")
             .eq("transaction_id", transaction_id)
@@ -157,14 +157,14 @@ async def create_abha(req: ABHACreateRequest):
 @limiter.limit("5/minute")
 async def auth_init(request: Request, req: AuthInitRequest):
     """Stub: Initiate ABDM authentication. Generates a random OTP stored server-side."""
-    _cleanup_expired_otps()
+    await _cleanup_expired_otps()
 
     txn_id = f"txn_{secrets.token_hex(6)}"
     otp = f"{secrets.randbelow(900000) + 100000}"
     expires_at = _now_utc() + timedelta(seconds=_OTP_TTL_SECONDS)
 
     try:
-        _otp_store().insert(
+        await _otp_store().insert(
             {
                 "transaction_id": txn_id,
                 "abha_id": req.abha_id,
@@ -189,30 +189,30 @@ async def auth_init(request: Request, req: AuthInitRequest):
 @router.post("/auth/confirm")
 async def auth_confirm(req: AuthConfirmRequest):
     """Stub: Confirm ABDM authentication with OTP."""
-    otp_entry = _fetch_txn(req.transaction_id)
+    otp_entry = await _fetch_txn(req.transaction_id)
 
     if otp_entry is None:
         raise HTTPException(status_code=400, detail="Invalid or expired transaction ID")
 
     if _is_expired(otp_entry.get("expires_at")):
-        _delete_txn(req.transaction_id)
+        await _delete_txn(req.transaction_id)
         raise HTTPException(status_code=400, detail="Invalid or expired transaction ID")
 
     if req.otp != otp_entry["otp"]:
         attempts = int(otp_entry.get("attempts") or 0) + 1
         max_attempts = int(otp_entry.get("max_attempts") or _OTP_MAX_ATTEMPTS)
         if attempts >= max_attempts:
-            _delete_txn(req.transaction_id)
+            await _delete_txn(req.transaction_id)
         else:
             try:
-                _otp_store().update(
+                await _otp_store().update(
                     {"attempts": attempts}
                 ).eq("transaction_id", req.transaction_id).execute()
             except Exception as e:
                 raise HTTPException(status_code=503, detail=_OTP_STORE_ERROR) from e
         raise HTTPException(status_code=401, detail="Invalid OTP")
 
-    _delete_txn(req.transaction_id)
+    await _delete_txn(req.transaction_id)
 
     return {
         "success": True,
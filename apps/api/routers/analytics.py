@@ -8,7 +8,8 @@ from datetime import date, timedelta
 
 from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
-from services.auth import get_current_user_id, get_supabase_client
+from services.auth import get_current_user_id
+from services.db import get_db
 
 logger = logging.getLogger(__name__)
 
@@ -83,8 +84,7 @@ async def get_outbreaks(
     - moderate: rate_ratio > 1.5x baseline AND >= 3 patients
     """
     try:
-        supabase = get_supabase_client()
-        query = supabase.table("outbreak_alerts").select("*")
+        query = get_db().table("outbreak_alerts").select("*")
 
         if district:
             query = query.eq("district", district)
@@ -95,7 +95,7 @@ async def get_outbreaks(
             # Exclude 'normal' by default — only show actual alerts
             query = query.neq("severity", "normal")
 
-        result = query.execute()
+        result = await query.execute()
         alerts_data = result.data or []
 
         alerts = []
@@ -154,8 +154,7 @@ async def get_trends(
     days = max(1, min(days, 90))
 
     try:
-        supabase = get_supabase_client()
-        query = supabase.table("symptom_daily_counts").select("*")
+        query = get_db().table("symptom_daily_counts").select("*")
         cutoff_date = (date.today() - timedelta(days=days)).isoformat()
 
         if district:
@@ -169,7 +168,7 @@ async def get_trends(
         # Order by date ascending for chart rendering
         query = query.order("log_date", desc=False)
 
-        result = query.execute()
+        result = await query.execute()
         rows = result.data or []
 
         data = []
@@ -206,8 +205,7 @@ async def get_outbreak_summary(
     Get a high-level outbreak summary for dashboard cards.
     """
     try:
-        supabase = get_supabase_client()
-        result = supabase.table("outbreak_alerts").select("*").neq("severity", "normal").execute()
+        result = await get_db().table("outbreak_alerts").select("*").neq("severity", "normal").execute()
         alerts = result.data or []
 
         critical = [a for a in alerts if a.get("severity") == "critical"]
@@ -13,7 +13,9 @@ from services.rate_limit import limiter
 
 from services.ai_service import extract_prescription
 from services.medicine_db import search_medicines, get_medicines_by_names
-from services.auth import get_current_user_id, get_supabase_client
+from services.auth import get_current_user_id
+from services.db import get_db
+from services.health_log_writer import enqueue_health_log
 from services.patient_utils import get_or_create_self_patient
 
 logger = logging.getLogger(__name__)
@@ -40,20 +42,59 @@ def _confidence_to_score(confidence: str | float | int | None) -> float:
     }.get(token, 0.0)
 
 
-def _is_reasonable_match(search_term: str, candidate: str) -> bool:
+def _match_score(search_term: str, search_tokens: frozenset[str], candidate: str, candidate_tokens: frozenset[str]) -> float:
+    """Similarity of a normalized search term to a normalized DB name; 0.0 means no reasonable match.
+
+    exact name (1.0) > containment of a 5+ char name (0.6-0.9, by length ratio)
+    > shared 5+ char token (0.3-0.6, by token overlap).
+    """
     if not search_term or not candidate:
-        return False
+        return 0.0
     if search_term == candidate:
-        return True
+        return 1.0
 
     shorter, longer = (search_term, candidate) if len(search_term) <= len(candidate) else (candidate, search_term)
     if len(shorter) >= 5 and shorter in longer:
-        return True
-
-    search_tokens = set(search_term.split())
-    candidate_tokens = set(candidate.split())
-    common = search_tokens.intersection(candidate_tokens)
-    return any(len(token) >= 5 for token in common)
+        return 0.6 + 0.3 * len(shorter) / len(longer)
+
+    common = search_tokens & candidate_tokens
+    if any(len(token) >= 5 for token in common):
+        return 0.3 + 0.3 * len(common) / len(search_tokens | candidate_tokens)
+    return 0.0
+
+
+class _MedicineMatchIndex:
+    """Normalized DB names, built once per request and shared by every prescription line."""
+
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self._entries: list[tuple[int, str, frozenset[str]]] = []
+        self._exact: dict[str, int] = {}
+        for idx, row in enumerate(rows):
+            for field in ("brand_name", "generic_name"):
+                name = _normalize_medicine_name(row.get(field) or "")
+                if not name:
+                    continue
+                self._entries.append((idx, name, frozenset(name.split())))
+                self._exact.setdefault(name, idx)
+        self._memo: dict[str, dict | None] = {}
+
+    def best_match(self, search_term: str) -> dict | None:
+        """Highest-scoring row for the term; ties keep the DB ranking order."""
+        if search_term in self._memo:
+            return self._memo[search_term]
+        if search_term in self._exact:
+            match = self.rows[self._exact[search_term]]
+        else:
+            search_tokens = frozenset(search_term.split())
+            best_idx, best_score = -1, 0.0
+            for idx, name, tokens in self._entries:
+                score = _match_score(search_term, search_tokens, name, tokens)
+                if score > best_score:
+                    best_idx, best_score = idx, score
+            match = self.rows[best_idx] if best_idx >= 0 else None
+        self._memo[search_term] = match
+        return match
 
 
 @router.post("/prescription")
@@ -95,7 +136,8 @@ async def scan_prescription(
 
     db_matches = await get_medicines_by_names(medicine_names) if medicine_names else []
 
-    # 3. Build enriched results
+    # 3. Build enriched results (best-scoring DB match per line, totals in the same pass)
+    match_index = _MedicineMatchIndex(db_matches)
     enriched_medicines = []
     total_market = 0.0
     total_jan_aushadhi = 0.0
@@ -103,19 +145,7 @@ async def scan_prescription(
     for raw_med in raw_medicines:
         brand = raw_med.get("brand_name", "")
         generic = raw_med.get("generic_name", "")
-        search_term = _normalize_medicine_name(brand or generic)
-
-        # Find best match from DB
-        db_match = None
-        for dbm in db_matches:
-            brand_name = _normalize_medicine_name(dbm.get("brand_name", ""))
-            generic_name = _normalize_medicine_name(dbm.get("generic_name", ""))
-            if (
-                _is_reasonable_match(search_term, brand_name)
-                or _is_reasonable_match(search_term, generic_name)
-            ):
-                db_match = dbm
-                break
+        db_match = match_index.best_match(_normalize_medicine_name(brand or generic or ""))
 
         market_price = float(db_match["market_price"]) if db_match and db_match.get("market_price") else 0
         jan_price = float(db_match["jan_aushadhi_price"]) if db_match and db_match.get("jan_aushadhi_price") else 0
@@ -139,11 +169,12 @@ async def scan_prescription(
             "found_in_db": db_match is not None,
         })
 
-    # 4. Save to Health Records (Supabase) — BEFORE returning response
+    # 4. Save to Health Records (Supabase) — queued write-behind, not awaited
     saved = False
+    record_id = None
     try:
-        supabase = get_supabase_client()
-        patient_id = get_or_create_self_patient(supabase, user_id)
+        db = get_db()
+        patient_id = await get_or_create_self_patient(db, user_id)
 
         if patient_id:
             log_entry = {
@@ -167,7 +198,7 @@ async def scan_prescription(
                 },
                 "notes": f"Prescription from {doctor_name}",
             }
-            supabase.table("health_logs").insert(log_entry).execute()
+            record_id = await enqueue_health_log(log_entry)
             saved = True
 
     except Exception as e:
@@ -176,6 +207,7 @@ async def scan_prescription(
     return {
         "success": True,
         "saved": saved,
+        "record_id": record_id,
         "prescription": {
             "medicines": enriched_medicines,
             "doctor_name": doctor_name,
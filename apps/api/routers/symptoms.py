@@ -1,6 +1,7 @@
 """
 Symptom Analysis Router — AI-powered symptom checking with Gemini.
-Emergency rules (json-logic) run locally first, then AI analysis.
+Emergency rules (json-logic, data/emergency_rules.json) run locally first,
+then AI analysis.
 """
 
 import logging
@@ -11,108 +12,16 @@ from pydantic import BaseModel, field_validator
 from services.rate_limit import limiter
 
 from services.ai_service import analyze_symptoms
-from services.medicine_db import get_all_medicine_names
-from services.auth import get_current_user_id, get_supabase_client
+from services.auth import get_current_user_id
+from services.db import get_db
+from services.emergency_rules import check_emergency_rules
+from services.health_log_writer import enqueue_health_log
 from services.patient_utils import get_or_create_self_patient
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# --- JSON-logic emergency rules (inline, no dependency on Node.js) ---
-
-EMERGENCY_RULES = [
-    {
-        "id": "cardiac_emergency",
-        "name": "Suspected Cardiac Event",
-        "severity": "critical",
-        "required_symptoms": [["chest_pain"]],
-        "any_of": ["sweating", "breathlessness", "left_arm_pain"],
-        "message": "Possible heart attack. Call emergency services (108) immediately.",
-        "instructions": [
-            "Make the person sit or lie down comfortably",
-            "Loosen any tight clothing",
-            "If available, give one aspirin (300mg) to chew",
-            "Do NOT give water if unconscious",
-            "Call 108 for ambulance",
-        ],
-    },
-    {
-        "id": "stroke_emergency",
-        "name": "Suspected Stroke",
-        "severity": "critical",
-        "any_of": ["sudden_numbness", "face_drooping", "speech_difficulty"],
-        "requires_modifier": "sudden_onset",
-        # Safety-first: still alert on FAST symptoms if onset modifier is missing.
-        "modifier_optional": True,
-        "message": "Possible stroke detected. Time is critical. Call 108 immediately.",
-        "instructions": [
-            "Note the time symptoms started",
-            "Do NOT give food or water",
-            "Keep the person lying down with head slightly elevated",
-            "Call 108 for ambulance",
-        ],
-    },
-    {
-        "id": "severe_breathing",
-        "name": "Severe Breathing Difficulty",
-        "severity": "critical",
-        "required_symptoms": [["breathlessness"]],
-        "any_of": ["bluish_lips", "chest_pain"],
-        "message": "Severe breathing difficulty detected. Seek immediate medical help.",
-        "instructions": [
-            "Help the person sit upright",
-            "If they have an inhaler, help them use it",
-            "Loosen tight clothing around chest and neck",
-            "Call 108 for ambulance",
-        ],
-    },
-]
-
-
-def check_emergency_rules(symptoms: list[str], modifiers: list[str]) -> list[dict]:
-    """Check symptoms against emergency rules (instant, no API call)."""
-    alerts = []
-    for rule in EMERGENCY_RULES:
-        required_groups = rule.get("required_symptoms", [])
-        any_of = rule.get("any_of", [])
-        req_mod = rule.get("requires_modifier")
-        modifier_optional = rule.get("modifier_optional", False)
-
-        # All required symptom groups must have at least one match
-        required_met = all(
-            any(s in symptoms for s in group) for group in required_groups
-        )
-
-        # At least one any_of symptom must be present (if specified)
-        any_met = any(s in symptoms for s in any_of) if any_of else False
-
-        # Modifier must be present (if specified)
-        mod_present = req_mod in modifiers if req_mod else True
-        mod_met = mod_present if req_mod and not modifier_optional else True
-
-        # Rule triggers when:
-        # - All required groups satisfied (or none specified)
-        # - At least one any_of symptom matches (rules must have a trigger)
-        # - Required modifier is present (if specified)
-        has_required = required_met if required_groups else True
-        has_trigger = any_met
-
-        if has_required and has_trigger and mod_met:
-            confidence = "high" if mod_present else "medium"
-            alerts.append(
-                {
-                    "rule_id": rule["id"],
-                    "name": rule["name"],
-                    "severity": rule["severity"],
-                    "confidence": confidence,
-                    "message": rule["message"],
-                    "instructions": rule["instructions"],
-                }
-            )
-    return alerts
-
-
 # --- Request/Response models ---
 
 
@@ -146,6 +55,7 @@ class SymptomAnalysisResponse(BaseModel):
     ai_analysis: dict
     has_emergency: bool
     saved: bool = False
+    record_id: str | None = None
 
 
 # --- Endpoints ---
@@ -164,10 +74,8 @@ async def analyze(
     emergency_alerts = check_emergency_rules(req.symptoms, req.modifiers)
     has_emergency = len(emergency_alerts) > 0
 
-    # 2. Get medicine context for AI
-    medicines_context = await get_all_medicine_names()
-
-    # 3. AI analysis via Unified Service (OpenAI/Gemini)
+    # 2. AI analysis via Unified Service (local model, OpenAI/Gemini fallback).
+    # Cloud providers fetch the medicine context themselves when they run.
     ai_result = await analyze_symptoms(
         symptoms=req.symptoms,
         modifiers=req.modifiers,
@@ -176,20 +84,20 @@ async def analyze(
         gender=req.gender,
         medical_history=req.medical_history,
         current_medications=req.current_medications,
-        medicines_context=medicines_context,
     )
 
 
 
-    # 4. Save to Health Records (Supabase)
+    # 3. Save to Health Records (Supabase) — queued write-behind, not awaited
     saved = False
+    record_id = None
     try:
-        supabase = get_supabase_client()
+        db = get_db()
         patient_id = req.patient_id
 
         # If no patient_id provided, find or create "Self" patient for this user
         if not patient_id:
-            patient_id = get_or_create_self_patient(supabase, user_id, req.age, req.gender)
+            patient_id = await get_or_create_self_patient(db, user_id, req.age, req.gender)
 
         if patient_id:
             log_entry = {
@@ -203,7 +111,7 @@ async def analyze(
                 },
                 "notes": ai_result.get("summary", "Symptom check"),
             }
-            supabase.table("health_logs").insert(log_entry).execute()
+            record_id = await enqueue_health_log(log_entry)
             saved = True
 
     except Exception as e:
@@ -214,4 +122,5 @@ async def analyze(
         ai_analysis=ai_result,
         has_emergency=has_emergency,
         saved=saved,
+        record_id=record_id,
     )
@@ -7,7 +7,9 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, field_validator, model_validator
 
-from services.auth import get_current_user_id, get_supabase_client
+from services.auth import get_current_user_id
+from services.db import get_db
+from services.health_log_writer import enqueue_health_log, get_pending_health_logs
 from services.patient_utils import get_or_create_self_patient
 
 logger = logging.getLogger(__name__)
@@ -22,13 +24,20 @@ async def get_health_logs(
 ):
     """Fetch health logs for the current user (bypasses RLS via service key)."""
     try:
-        supabase = get_supabase_client()
-        query = supabase.table("health_logs").select("*").eq("recorded_by", user_id)
+        query = get_db().table("health_logs").select("*").eq("recorded_by", user_id)
         if log_type:
             query = query.eq("log_type", log_type)
         query = query.order("created_at", desc=True)
-        res = query.execute()
-        return {"success": True, "logs": res.data or []}
+        res = await query.execute()
+        logs = res.data or []
+
+        # Include rows still in the write-behind queue so users see their own recent saves.
+        pending = await get_pending_health_logs(user_id, log_type)
+        if pending:
+            known_ids = {log.get("id") for log in logs}
+            logs.extend(log for log in pending if log["id"] not in known_ids)
+            logs.sort(key=lambda log: log.get("created_at") or "", reverse=True)
+        return {"success": True, "logs": logs}
     except Exception as e:
         logger.error("Failed to fetch health logs: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to fetch health logs: {str(e)}")
@@ -93,12 +102,12 @@ async def save_vitals(
 ):
     """Save patient vitals to Supabase health_logs."""
     try:
-        supabase = get_supabase_client()
+        db = get_db()
         patient_id = req.patient_id
 
         # If no patient_id, find or create "Self" patient for this user
         if not patient_id:
-            patient_id = get_or_create_self_patient(supabase, user_id)
+            patient_id = await get_or_create_self_patient(db, user_id)
 
         if not patient_id:
             raise HTTPException(status_code=500, detail="Could not find or create patient record")
@@ -121,9 +130,9 @@ async def save_vitals(
             "data": vitals_data,
             "notes": "Vitals recorded",
         }
-        supabase.table("health_logs").insert(log_entry).execute()
+        record_id = await enqueue_health_log(log_entry)
 
-        return {"success": True, "saved": True, "patient_id": patient_id}
+        return {"success": True, "saved": True, "patient_id": patient_id, "record_id": record_id}
 
     except Exception as e:
         logger.error("Failed to save vitals: %s", e)
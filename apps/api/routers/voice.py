@@ -1,13 +1,21 @@
 """Voice transcription endpoints — uses local Whisper model (primary) or Gemini (fallback)."""
 
+import json
+
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from services.rate_limit import limiter
 
 from services.ai_models import get_model_for_task
-from services.local_ml_service import transcribe_audio_local, extract_medical_terms_local
+from services.local_ml_service import (
+    extract_medical_terms_local,
+    stream_transcription_local,
+    transcribe_audio_local,
+)
 from services.auth import get_current_user_id
+from services.circuit_breaker import guarded_call
 
 router = APIRouter()
 
@@ -45,6 +53,48 @@ Respond ONLY with valid JSON:
 }"""
 
 
+async def _transcribe_with_gemini(audio_bytes: bytes, mime_type: str, local_error: str | None = None) -> dict:
+    """Gemini audio transcription (fallback), shaped like the /transcribe response."""
+    try:
+        from services.gemini_service import _get_client, _parse_json_response, generate_content
+        from google.genai import types
+
+        client = _get_client()
+        if not client:
+            if local_error:
+                return {"success": False, "error": local_error}
+            return {"success": False, "error": "No transcription service available"}
+
+        model_name = "gemini-2.0-flash"
+        audio_part = types.Part.from_bytes(data=audio_bytes, mime_type=mime_type)
+
+        prompt = f"""{MEDICAL_EXTRACTION_PROMPT}
+
+Transcribe this audio recording from a patient describing their symptoms.
+The audio may be in Hindi, English, or a mix. Extract all medical information."""
+
+        async def call_gemini() -> dict:
+            response = await generate_content(client, model_name, [prompt, audio_part])
+            return {"text": response.text}
+
+        # Shares the Gemini circuit breaker with symptom analysis and OCR. Only the API
+        # call goes through it: a malformed reply says nothing about Gemini's health.
+        reply = await guarded_call("gemini", call_gemini)
+        if reply.get("circuit_open"):
+            return {"success": False, "error": local_error or reply["error"]}
+        if "error" in reply:
+            return {"success": False, "error": f"Transcription failed: {reply['error']}"}
+
+        gemini_result = _parse_json_response(reply["text"])
+        if "error" in gemini_result:
+            return {"success": False, "error": gemini_result["error"]}
+
+        return {"success": True, "transcription": gemini_result}
+
+    except Exception as e:
+        return {"success": False, "error": f"Transcription failed: {str(e)}"}
+
+
 @router.post("/transcribe")
 @limiter.limit("10/minute")
 async def transcribe_voice(
@@ -71,38 +121,53 @@ async def transcribe_voice(
         local_error = result.get("error")
         print(f"Local Whisper failed: {local_error}, falling back to Gemini")
 
-    # Fallback to Gemini
-    try:
-        from services.gemini_service import _get_client, _parse_json_response
-        from google.genai import types
-
-        client = _get_client()
-        if not client:
-            if local_error:
-                return {"success": False, "error": local_error}
-            return {"success": False, "error": "No transcription service available"}
-
-        model_name = "gemini-2.0-flash"
-        audio_part = types.Part.from_bytes(data=audio_bytes, mime_type=mime_type)
-
-        prompt = f"""{MEDICAL_EXTRACTION_PROMPT}
-
-Transcribe this audio recording from a patient describing their symptoms.
-The audio may be in Hindi, English, or a mix. Extract all medical information."""
+    return await _transcribe_with_gemini(audio_bytes, mime_type, local_error)
 
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[prompt, audio_part],
-        )
-        gemini_result = _parse_json_response(response.text)
 
-        if "error" in gemini_result and "raw" in gemini_result:
-            return {"success": False, "error": gemini_result["error"]}
+@router.post("/transcribe-stream")
+@limiter.limit("10/minute")
+async def transcribe_voice_stream(
+    request: Request,
+    audio: UploadFile = File(...),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Transcribe audio and stream results as newline-delimited JSON (chunked).
 
-        return {"success": True, "transcription": gemini_result}
+    Local Whisper emits one {"type": "segment", ...} line per decoded segment,
+    with the symptoms found so far. The last line is always
+    {"type": "final", ...} with the same fields as the /transcribe response.
+    Without a local model, or when local decoding fails before any segment,
+    the final line comes from the Gemini fallback.
+    """
+    audio_bytes = await audio.read()
+    if len(audio_bytes) > MAX_AUDIO_SIZE:
+        raise HTTPException(status_code=413, detail="Audio file too large. Maximum size is 25 MB.")
+    mime_type = audio.content_type or "audio/wav"
+    model = get_model_for_task("text_extraction")
 
-    except Exception as e:
-        return {"success": False, "error": f"Transcription failed: {str(e)}"}
+    async def events():
+        local_error = None
+        streamed_segments = False
+        if model == "local":
+            async for event in stream_transcription_local(audio_bytes, mime_type):
+                if event["type"] == "segment":
+                    streamed_segments = True
+                    yield json.dumps(event) + "\n"
+                elif event["type"] == "final":
+                    yield json.dumps({"type": "final", "success": True, "transcription": event["transcription"]}) + "\n"
+                    return
+                else:
+                    local_error = event["error"]
+            if streamed_segments:
+                # Partial results were already sent; don't restart on another provider.
+                yield json.dumps({"type": "final", "success": False, "error": local_error}) + "\n"
+                return
+            print(f"Local Whisper streaming failed: {local_error}, falling back to Gemini")
+        result = await _transcribe_with_gemini(audio_bytes, mime_type, local_error)
+        yield json.dumps({"type": "final", **result}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 
 class TextTranscribeRequest(BaseModel):
@@ -137,7 +202,7 @@ async def transcribe_text(
 
     # Fallback to Gemini
     try:
-        from services.gemini_service import _get_client, _parse_json_response
+        from services.gemini_service import _get_client, _parse_json_response, generate_content
 
         client = _get_client()
         if not client:
@@ -155,13 +220,18 @@ async def transcribe_text(
 Patient's description (language: {language}):
 "{req.text}"
 """
-        response = client.models.generate_content(
-            model=model_name,
-            contents=prompt,
-        )
-        gemini_result = _parse_json_response(response.text)
-
-        if "error" in gemini_result and "raw" in gemini_result:
+        async def call_gemini() -> dict:
+            response = await generate_content(client, model_name, prompt)
+            return {"text": response.text}
+
+        reply = await guarded_call("gemini", call_gemini)
+        if reply.get("circuit_open"):
+            return {"success": False, "error": reply["error"]}
+        if "error" in reply:
+            return {"success": False, "error": f"Text analysis failed: {reply['error']}"}
+
+        gemini_result = _parse_json_response(reply["text"])
+        if "error" in gemini_result:
             return {"success": False, "error": gemini_result["error"]}
 
         return {"success": True, "transcription": gemini_result}
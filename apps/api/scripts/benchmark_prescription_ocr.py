@@ -0,0 +1,148 @@
+"""
+Benchmark the local prescription OCR pipeline with a per-stage timing breakdown.
+
+Uses the page-level integration set written by build_prescription_ocr_dataset.py
+(data/prescription_ocr/pages). When that set is missing, pages are rendered on
+the fly with the same generator.
+
+Stages:
+- preprocess:  draft decode + grayscale + bounded resize + contrast
+- segment:     line segmentation
+- recognize:   recognizer inference (only with --recognize)
+- parse:       structured parsing of the ground-truth lines
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from services.prescription_ocr_service import (  # noqa: E402
+    DEFAULT_OCR_ENGINE,
+    _recognize_lines,
+    parse_prescription_lines,
+    preprocess_prescription_page,
+    segment_prescription_lines,
+)
+
+DEFAULT_DATASET_DIR = BASE_DIR / "data" / "prescription_ocr"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark prescription OCR pipeline stages")
+    parser.add_argument("--dataset-dir", type=Path, default=DEFAULT_DATASET_DIR)
+    parser.add_argument("--limit", type=int, default=50, help="Number of pages to benchmark")
+    parser.add_argument("--format", choices=["png", "jpeg"], default="jpeg", help="Upload encoding to simulate")
+    parser.add_argument("--recognize", action="store_true", help="Include recognizer inference")
+    parser.add_argument("--engine", type=str, default=DEFAULT_OCR_ENGINE)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def load_pages(dataset_dir: Path, limit: int, seed: int) -> list[tuple[bytes, list[str]]]:
+    from PIL import Image
+
+    pages: list[tuple[object, list[str]]] = []
+    manifest = dataset_dir / "pages" / "pages.jsonl"
+    if manifest.exists():
+        for raw in manifest.read_text(encoding="utf-8").splitlines()[:limit]:
+            row = json.loads(raw)
+            pages.append((Image.open(dataset_dir / row["image_path"]).copy(), row["raw_text"].splitlines()))
+    else:
+        import numpy as np
+        from build_prescription_ocr_dataset import (
+            line_variants,
+            load_medicine_names,
+            make_doctor_name,
+            make_random_date,
+            render_page,
+        )
+
+        print(f"Page set not found at {manifest}; rendering {limit} synthetic pages.")
+        random.seed(seed)
+        np.random.seed(seed)
+        medicines = load_medicine_names()
+        for _ in range(limit):
+            lines = [make_doctor_name(), f"Date: {make_random_date()}"] + [
+                line_variants(random.choice(medicines)) for _ in range(random.randint(1, 6))
+            ]
+            pages.append((render_page(lines), lines))
+    return pages
+
+
+def encode(image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format=fmt.upper(), quality=90) if fmt == "jpeg" else image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def main() -> None:
+    args = parse_args()
+    pages = load_pages(args.dataset_dir, args.limit, args.seed)
+    if not pages:
+        raise RuntimeError("No pages to benchmark.")
+
+    timings: dict[str, list[float]] = {"preprocess": [], "segment": [], "parse": []}
+    if args.recognize:
+        timings["recognize"] = []
+    line_counts: list[int] = []
+
+    for image, gold_lines in pages:
+        payload = encode(image, args.format)
+
+        start = time.perf_counter()
+        preprocessed = preprocess_prescription_page(payload)
+        timings["preprocess"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        line_images = segment_prescription_lines(preprocessed)
+        timings["segment"].append(time.perf_counter() - start)
+        line_counts.append(len(line_images))
+
+        if args.recognize:
+            start = time.perf_counter()
+            _recognize_lines(line_images, args.engine, preprocessed_page=preprocessed)
+            timings["recognize"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        parse_prescription_lines(
+            gold_lines,
+            raw_text="\n".join(gold_lines),
+            ocr_engine="benchmark",
+            ocr_confidence=1.0,
+        )
+        timings["parse"].append(time.perf_counter() - start)
+
+    print("=" * 72)
+    print(f"Prescription OCR benchmark: {len(pages)} pages ({args.format}), "
+          f"avg {statistics.mean(line_counts):.1f} segmented lines/page")
+    print("=" * 72)
+    print(f"{'stage':<12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'share':>8}")
+    total = sum(sum(values) for values in timings.values())
+    for stage, values in timings.items():
+        print(
+            f"{stage:<12}{statistics.mean(values) * 1000:>10.2f}"
+            f"{percentile(values, 0.50) * 1000:>10.2f}"
+            f"{percentile(values, 0.95) * 1000:>10.2f}"
+            f"{(sum(values) / total * 100 if total else 0):>7.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,12 @@
 Export trained prescription OCR model to ONNX and apply int8 dynamic quantization.
 
 The script expects a trained TrOCR directory and attempts ONNX export via Optimum.
-Output artifact target (by default):
-  apps/api/models/prescription_ocr_trocr_int8.onnx
+Output artifacts (by default), loaded by the "onnx"/"trocr" OCR engines:
+  apps/api/models/prescription_ocr_trocr_int8.onnx                    (encoder)
+  apps/api/models/prescription_ocr_trocr_int8_decoder.onnx            (first decoder step)
+  apps/api/models/prescription_ocr_trocr_int8_decoder_with_past.onnx  (KV-cache decoder steps)
+
+Tokenizer and pre-processing config are still read from the trained model directory.
 """
 
 from __future__ import annotations
@@ -25,11 +29,24 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def find_primary_onnx(export_dir: Path) -> Path:
-    onnx_files = sorted(export_dir.rglob("*.onnx"), key=lambda p: p.stat().st_size, reverse=True)
-    if not onnx_files:
-        raise FileNotFoundError(f"No ONNX files found in {export_dir}")
-    return onnx_files[0]
+# Optimum export file name -> suffix appended to the output artifact stem.
+ONNX_COMPONENTS = {
+    "encoder_model.onnx": "",
+    "decoder_model.onnx": "_decoder",
+    "decoder_with_past_model.onnx": "_decoder_with_past",
+}
+
+
+def find_component_onnx(export_dir: Path, file_name: str) -> Path:
+    matches = sorted(export_dir.rglob(file_name))
+    if not matches:
+        raise FileNotFoundError(f"{file_name} not found in {export_dir}")
+    return matches[0]
+
+
+def component_output_path(output_file: Path, suffix: str) -> Path:
+    stem = output_file.with_suffix("")
+    return stem.with_name(f"{stem.name}{suffix}.onnx")
 
 
 def main() -> None:
@@ -57,15 +74,15 @@ def main() -> None:
             "pip install optimum[onnxruntime]"
         ) from exc
 
+    # Keep encoder, decoder and decoder-with-past as separate graphs (no merged decoder)
+    # so the runtime can feed the KV cache explicitly.
     main_export(
         model_name_or_path=str(args.model_dir),
         output=str(args.tmp_export_dir),
-        task="image-to-text",
+        task="image-to-text-with-past",
+        no_post_process=True,
     )
 
-    source_onnx = find_primary_onnx(args.tmp_export_dir)
-    print(f"Primary ONNX candidate: {source_onnx}")
-
     try:
         from onnxruntime.quantization import QuantType, quantize_dynamic  # type: ignore
     except Exception as exc:
@@ -73,14 +90,16 @@ def main() -> None:
             "onnxruntime quantization tools are required. Install with: pip install onnxruntime"
         ) from exc
 
-    quantize_dynamic(
-        model_input=str(source_onnx),
-        model_output=str(args.output_file),
-        weight_type=QuantType.QInt8,
-    )
-
-    size_mb = args.output_file.stat().st_size / (1024 * 1024)
-    print(f"Quantized model saved: {args.output_file} ({size_mb:.2f} MB)")
+    for file_name, suffix in ONNX_COMPONENTS.items():
+        source_onnx = find_component_onnx(args.tmp_export_dir, file_name)
+        target = component_output_path(args.output_file, suffix)
+        quantize_dynamic(
+            model_input=str(source_onnx),
+            model_output=str(target),
+            weight_type=QuantType.QInt8,
+        )
+        size_mb = target.stat().st_size / (1024 * 1024)
+        print(f"Quantized {file_name} saved: {target} ({size_mb:.2f} MB)")
 
 
 if __name__ == "__main__":
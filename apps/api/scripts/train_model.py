@@ -1,10 +1,17 @@
 """
 Train symptom prediction model using Kaggle Disease Prediction dataset.
 Run: cd apps/api && .venv/bin/python scripts/train_model.py
+
+Also exports models/symptom_model_compiled.npz, the import-light NumPy forest
+served by services/local_ml_service.py. To re-export an existing joblib model
+without retraining: .venv/bin/python scripts/train_model.py --export-only
 """
 
+import argparse
 import os
 import sys
+import time
+from pathlib import Path
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
@@ -20,6 +27,10 @@ MODELS_DIR = os.path.join(BASE_DIR, "models")
 TRAIN_CSV = os.path.join(DATA_DIR, "Training.csv")
 TEST_CSV = os.path.join(DATA_DIR, "Testing.csv")
 MODEL_PATH = os.path.join(MODELS_DIR, "symptom_model.joblib")
+COMPILED_MODEL_PATH = os.path.join(MODELS_DIR, "symptom_model_compiled.npz")
+
+sys.path.insert(0, BASE_DIR)
+from services.symptom_forest import load_compiled_model, save_compiled_model  # noqa: E402
 
 # Normalize disease names (Kaggle dataset has typos and trailing spaces)
 DISEASE_NAME_FIXES = {
@@ -36,7 +47,54 @@ def normalize_disease_name(name: str) -> str:
     return DISEASE_NAME_FIXES.get(name, DISEASE_NAME_FIXES.get(name + " ", name))
 
 
+def export_compiled_model(model_data: dict) -> None:
+    """Flatten the forest to NumPy arrays and verify it reproduces predict_proba."""
+    model = model_data["model"]
+    feature_names = model_data["feature_names"]
+    save_compiled_model(
+        Path(COMPILED_MODEL_PATH),
+        model,
+        model_data["label_encoder"].classes_,
+        feature_names,
+        version=str(model_data.get("version", "")),
+    )
+    compiled = load_compiled_model(Path(COMPILED_MODEL_PATH))["model"]
+
+    rng = np.random.default_rng(0)
+    probe = (rng.random((256, len(feature_names))) < 0.05).astype(np.uint8)
+    expected = model.predict_proba(probe)
+    actual = compiled.predict_proba(probe)
+    max_diff = float(np.abs(expected - actual).max())
+    if max_diff > 1e-5:
+        raise RuntimeError(f"Compiled forest diverges from scikit-learn (max diff {max_diff:.2e})")
+
+    single = probe[:1]
+    start = time.perf_counter()
+    for _ in range(100):
+        compiled.predict_proba(single)
+    per_call_ms = (time.perf_counter() - start) * 10
+
+    size_mb = os.path.getsize(COMPILED_MODEL_PATH) / (1024 * 1024)
+    print(f"Compiled model saved to: {COMPILED_MODEL_PATH} ({size_mb:.1f} MB)")
+    print(f"  {compiled.n_trees} trees, max depth {compiled.max_depth}, max diff {max_diff:.1e}")
+    print(f"  single-row predict_proba: {per_call_ms:.3f} ms")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Train the symptom Random Forest")
+    parser.add_argument(
+        "--export-only",
+        action="store_true",
+        help="Skip training and re-export the compiled model from the existing joblib file",
+    )
+    args = parser.parse_args()
+    if args.export_only:
+        if not os.path.exists(MODEL_PATH):
+            print(f"ERROR: Trained model not found at {MODEL_PATH}")
+            sys.exit(1)
+        export_compiled_model(joblib.load(MODEL_PATH))
+        return
+
     print("=" * 60)
     print("Training Symptom Prediction Model")
     print("=" * 60)
@@ -118,6 +176,7 @@ def main():
     joblib.dump(model_data, MODEL_PATH)
     model_size_mb = os.path.getsize(MODEL_PATH) / (1024 * 1024)
     print(f"\nModel saved to: {MODEL_PATH} ({model_size_mb:.1f} MB)")
+    export_compiled_model(model_data)
 
     # 8. Quick sanity check
     print("\n--- Sanity Check ---")
@@ -5,6 +5,10 @@ Centralizes model selection so we can switch models easily.
 
 import os
 import json
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
 
 # Google Gemini Models
 GEMINI_MODELS = {
@@ -57,6 +61,39 @@ def get_cloud_model_for_task(task: str, provider: str) -> str:
     return fallback.get(provider, "gemini-2.0-flash" if provider == "gemini" else "gpt-4o-mini")
 
 
+class ProviderLimiter:
+    """Bounds in-flight calls and wall time for one cloud provider.
+
+    Cloud calls share the worker's event loop with local-model requests, so a
+    burst of slow fallbacks is capped at ``max_concurrency`` in-flight calls,
+    and each call (including its wait for a slot) is cut off after ``timeout_s``.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, timeout_s: float):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout_s = timeout_s
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def call(self, factory: Callable[[], Awaitable[T]]) -> T:
+        async def limited() -> T:
+            async with self._slots():
+                return await factory()
+
+        try:
+            return await asyncio.wait_for(limited(), self.timeout_s)
+        except asyncio.TimeoutError:  # not the builtin TimeoutError before Python 3.11
+            raise TimeoutError(f"{self.name} request timed out after {self.timeout_s:g}s") from None
+
+
 def parse_json_response(text: str) -> dict:
     """Extract JSON from AI response (handles markdown code blocks).
     Shared by both OpenAI and Gemini services."""
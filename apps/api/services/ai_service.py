@@ -1,8 +1,20 @@
 """
 Unified AI Service — dispatches requests to local ML models (primary) or
 cloud providers (OpenAI/Gemini) as fallback. Includes automatic fallback on errors.
+
+Cloud fallbacks can be hedged with AI_HEDGE_DELAY_MS: unset, negative or invalid keeps
+the strict sequential chain, 0 starts every cloud provider at once, and a
+positive value starts the next provider when the current one has not answered
+within that many milliseconds. A failed provider always starts the next one
+immediately. The first valid result wins and the other calls are cancelled.
 """
 
+import asyncio
+import inspect
+import logging
+import os
+from typing import Awaitable, Callable
+
 from services.ai_models import get_model_for_task
 from services.local_ml_service import (
     analyze_symptoms_local,
@@ -16,18 +28,30 @@ from services.openai_service import (
     analyze_symptoms_openai,
     extract_prescription_openai,
 )
+from services.prompt_context import build_symptom_medicines_context
+from services.circuit_breaker import guarded_call, order_by_health
+from services.response_cache import get_symptom_response_cache, normalize_symptom_request
+
+logger = logging.getLogger(__name__)
+
+# Cloud providers share one parameter list; used to fingerprint requests for the response cache.
+_CLOUD_SYMPTOM_SIGNATURE = inspect.signature(analyze_symptoms_openai)
 
 
-def _is_quota_error(result: dict) -> bool:
-    """Check if an AI result indicates a quota/rate-limit error."""
-    err = result.get("error", "")
-    return any(
-        kw in err.lower()
-        for kw in [
-            "quota", "rate", "429", "resource_exhausted",
-            "insufficient_quota", "exceeded",
-        ]
-    )
+def _parse_hedge_delay(raw: str) -> float | None:
+    """Seconds before starting the next cloud provider; None means strictly sequential."""
+    raw = raw.strip()
+    if not raw:
+        return None
+    try:
+        delay_ms = int(raw)
+    except ValueError:
+        logger.warning("Ignoring invalid AI_HEDGE_DELAY_MS=%r (expected whole milliseconds); hedging disabled", raw)
+        return None
+    return delay_ms / 1000.0 if delay_ms >= 0 else None
+
+
+_HEDGE_DELAY_S = _parse_hedge_delay(os.getenv("AI_HEDGE_DELAY_MS", ""))
 
 
 def _collect_error(errors: list[str], provider: str, result: dict):
@@ -35,40 +59,93 @@ def _collect_error(errors: list[str], provider: str, result: dict):
         errors.append(f"{provider}: {result['error']}")
 
 
+async def _first_success(
+    providers: list[tuple[str, Callable[[], Awaitable[dict]]]], errors: list[str]
+) -> dict | None:
+    """Run (name, zero-arg coroutine function) providers in order, hedged per AI_HEDGE_DELAY_MS.
+
+    Returns the first result without an error (earlier providers win ties),
+    or None once every provider has failed; failures are added to ``errors``.
+    Calls go through each provider's circuit breaker, so a provider that is
+    known to be down fails instantly and unhealthy providers are tried last.
+    """
+    delay = _HEDGE_DELAY_S
+    calls = dict(providers)
+    remaining = list(enumerate((name, calls[name]) for name in order_by_health(list(calls))))
+    running: dict[asyncio.Task, tuple[int, str]] = {}
+
+    def launch_next():
+        order, (name, call) = remaining.pop(0)
+        running[asyncio.ensure_future(guarded_call(name, call))] = (order, name)
+
+    launch_next()
+    try:
+        while running:
+            timeout = delay if remaining else None
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch_next()  # hedge: current providers are slow, start the next one too
+                continue
+            for task in sorted(done, key=lambda t: running[t][0]):
+                _, name = running.pop(task)
+                result = task.result()
+                if "error" not in result:
+                    return result
+                _collect_error(errors, name, result)
+                print(f"{name} failed: {result.get('error')}")
+            if remaining and not running:
+                launch_next()
+        return None
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def _with_medicines_context(request: dict) -> dict:
+    """Cloud prompts list relevant medicines; build that context only when a cloud provider runs."""
+    if request.get("medicines_context") is None:
+        request["medicines_context"] = await build_symptom_medicines_context(request["symptoms"])
+    return request
+
+
 async def analyze_symptoms(*args, **kwargs) -> dict:
-    """Dispatch symptom analysis: local ML -> OpenAI -> Gemini fallback chain."""
+    """Dispatch symptom analysis: local ML -> OpenAI -> Gemini fallback chain.
+
+    ``medicines_context`` is optional; when omitted a compact list relevant to
+    the symptoms is built lazily for the cloud providers. The local model
+    filters against the catalog itself.
+    """
     model = get_model_for_task("symptom_analysis")
     provider_errors: list[str] = []
 
     # Try local model first
     if model == "local":
-        result = await analyze_symptoms_local(*args, **kwargs)
+        local_kwargs = {k: v for k, v in kwargs.items() if k != "medicines_context"}
+        result = await analyze_symptoms_local(*args, **local_kwargs)
         if "error" not in result:
             return result
         _collect_error(provider_errors, "local", result)
         print(f"Local ML failed for symptom_analysis: {result.get('error')}, falling back to cloud")
 
-    # Cloud fallback chain
-    if "gpt" in model or model == "local":
-        result = await analyze_symptoms_openai(*args, **kwargs)
-        if not _is_quota_error(result) and "error" not in result:
-            return result
-        _collect_error(provider_errors, "openai", result)
-        print(f"OpenAI failed for symptom_analysis, trying Gemini")
-        fallback = await analyze_symptoms_gemini(*args, **kwargs)
-        if not _is_quota_error(fallback) and "error" not in fallback:
-            return fallback
-        _collect_error(provider_errors, "gemini", fallback)
-    else:
-        result = await analyze_symptoms_gemini(*args, **kwargs)
-        if not _is_quota_error(result) and "error" not in result:
-            return result
-        _collect_error(provider_errors, "gemini", result)
-        print(f"Gemini failed for symptom_analysis, trying OpenAI")
-        fallback = await analyze_symptoms_openai(*args, **kwargs)
-        if not _is_quota_error(fallback) and "error" not in fallback:
-            return fallback
-        _collect_error(provider_errors, "openai", fallback)
+    request = await _with_medicines_context(_CLOUD_SYMPTOM_SIGNATURE.bind(*args, **kwargs).arguments)
+    # Repeat requests (same normalized symptoms, age band, duration bucket and
+    # medicine context) are answered from the cloud response cache.
+    cache = get_symptom_response_cache()
+    cache_key = cache.fingerprint(normalize_symptom_request(**request))
+    cached = await cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    providers = [
+        ("openai", lambda: analyze_symptoms_openai(**request)),
+        ("gemini", lambda: analyze_symptoms_gemini(**request)),
+    ]
+    if not ("gpt" in model or model == "local"):
+        providers.reverse()
+    result = await _first_success(providers, provider_errors)
+    if result is not None:
+        await cache.put(cache_key, result)
+        return result
 
     return {
         "error": "All AI providers failed. Please check your model files and API keys.",
@@ -80,7 +157,6 @@ async def extract_prescription(
     image_data: bytes = None, mime_type: str = "image/jpeg", **kwargs
 ) -> dict:
     """Dispatch prescription OCR: local first, cloud fallback if enabled."""
-    import os
     model = get_model_for_task("prescription_ocr")
     cloud_fallback = os.getenv("PRESCRIPTION_OCR_CLOUD_FALLBACK", "false").lower() == "true"
     provider_errors: list[str] = []
@@ -101,15 +177,15 @@ async def extract_prescription(
 
     # Cloud fallback chain (Gemini -> OpenAI)
     if cloud_fallback or model != "local":
-        result = await extract_prescription_gemini(image_data, mime_type)
-        if "error" not in result:
-            return result
-        _collect_error(provider_errors, "gemini", result)
-
-        result = await extract_prescription_openai(image_data=image_data, mime_type=mime_type)
-        if "error" not in result:
+        result = await _first_success(
+            [
+                ("gemini", lambda: extract_prescription_gemini(image_data, mime_type)),
+                ("openai", lambda: extract_prescription_openai(image_data=image_data, mime_type=mime_type)),
+            ],
+            provider_errors,
+        )
+        if result is not None:
             return result
-        _collect_error(provider_errors, "openai", result)
 
     return {
         "error": "All OCR providers failed.",
@@ -2,21 +2,42 @@
 Auth Service — validates Supabase JWT tokens and retrieves current user.
 
 Architecture:
-- get_supabase_client() returns a SERVICE ROLE client that bypasses RLS.
-  Use only for server-side operations that need admin access
-  (e.g., auto-creating patient records, cross-user reads).
-- Token validation in get_current_user_id() uses the Supabase Auth API
-  which validates JWTs independently of the client's key type.
+- get_supabase_client() returns a synchronous SERVICE ROLE client that
+  bypasses RLS. Routers query tables through the async client in services.db
+  (same key); this one is only used for the Supabase Auth API fallback.
+- Token validation in get_current_user_id() verifies the JWT locally:
+  HS256 tokens against SUPABASE_JWT_SECRET, asymmetric (RS/ES) tokens against
+  the project's JWKS, which is cached and refetched when an unknown key id
+  appears (key rotation). Verified tokens are cached briefly. Only when no
+  local key material applies does it fall back to the Supabase Auth API.
 """
 
+import asyncio
+import hashlib
 import os
 import threading
+import time
+
+import jwt
 from fastapi import Header, HTTPException, Depends
 from supabase import create_client, Client
 
+from services.cache import LRUCache
+
+JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWT_LEEWAY_SECONDS = int(os.getenv("SUPABASE_JWT_LEEWAY_SECONDS", "10"))
+JWKS_CACHE_TTL_SECONDS = int(os.getenv("SUPABASE_JWKS_CACHE_TTL_SECONDS", "600"))
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "60"))
+_ASYMMETRIC_ALGORITHMS = {"RS256", "RS384", "RS512", "ES256", "ES384", "ES512", "EdDSA"}
+
 _service_client: Client | None = None
 _service_client_key: str | None = None
 _client_lock = threading.Lock()
+_jwks_client: jwt.PyJWKClient | None = None
+_jwks_client_url: str | None = None
+_jwks_lock = threading.Lock()
+# sha256(token) -> (user_id, exp). Entries never outlive the token itself.
+_VERIFIED_TOKENS = LRUCache(max_size=4096, ttl_seconds=TOKEN_CACHE_TTL_SECONDS)
 
 
 def get_supabase_client() -> Client:
@@ -42,10 +63,67 @@ def get_supabase_client() -> Client:
     return _service_client
 
 
+def _get_jwks_client() -> jwt.PyJWKClient | None:
+    global _jwks_client, _jwks_client_url
+    base_url = os.getenv("SUPABASE_URL", "").rstrip("/")
+    if not base_url:
+        return None
+    url = os.getenv("SUPABASE_JWKS_URL", "") or f"{base_url}/auth/v1/.well-known/jwks.json"
+    with _jwks_lock:
+        if _jwks_client is None or _jwks_client_url != url:
+            _jwks_client = jwt.PyJWKClient(url, cache_keys=True, lifespan=JWKS_CACHE_TTL_SECONDS, timeout=5)
+            _jwks_client_url = url
+    return _jwks_client
+
+
+def _verify_token_locally(token: str) -> dict | None:
+    """Verify signature, expiry and audience; None when no local key can check this token.
+
+    Raises jwt.InvalidTokenError for tokens that are verifiably bad.
+    """
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+    if algorithm == "HS256":
+        key = os.getenv("SUPABASE_JWT_SECRET", "")
+        if not key:
+            return None
+    elif algorithm in _ASYMMETRIC_ALGORITHMS:
+        jwks_client = _get_jwks_client()
+        if jwks_client is None:
+            return None
+        try:
+            # Cached JWK set; an unknown kid triggers one refetch (key rotation).
+            key = jwks_client.get_signing_key(header.get("kid")).key
+        except jwt.PyJWKClientConnectionError:
+            return None
+    else:
+        raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {algorithm}")
+
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=JWT_AUDIENCE,
+        leeway=JWT_LEEWAY_SECONDS,
+        options={"require": ["exp", "sub"]},
+    )
+
+
+def _verify_token_remotely(token: str) -> str:
+    user = get_supabase_client().auth.get_user(token)
+    if not user or not user.user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user.user.id
+
+
+def clear_verified_token_cache() -> None:
+    _VERIFIED_TOKENS.clear()
+
+
 async def get_current_user_id(authorization: str = Header(None)) -> str:
     """
     Validate the Bearer token and return the user ID.
-    If Supabase validation fails, raises 401.
+    If validation fails, raises 401.
     """
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
@@ -54,12 +132,27 @@ async def get_current_user_id(authorization: str = Header(None)) -> str:
         raise HTTPException(status_code=401, detail="Invalid Authorization header format")
 
     token = authorization.split(" ")[1]
-    client = get_supabase_client()
+    cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+    cached = _VERIFIED_TOKENS.get(cache_key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
 
     try:
-        user = client.auth.get_user(token)
-        if not user or not user.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user.user.id
+        # Off the event loop: a JWKS (re)fetch or the remote fallback does network I/O.
+        claims = await asyncio.to_thread(_verify_token_locally, token)
+        if claims is not None:
+            user_id, expires_at = str(claims["sub"]), float(claims["exp"])
+        else:
+            user_id = await asyncio.to_thread(_verify_token_remotely, token)
+            expires_at = time.time() + TOKEN_CACHE_TTL_SECONDS
+    except HTTPException:
+        raise
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except jwt.InvalidTokenError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
+
+    _VERIFIED_TOKENS.put(cache_key, (user_id, expires_at))
+    return user_id
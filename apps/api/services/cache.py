@@ -0,0 +1,115 @@
+"""Shared in-process caches."""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional TTL and hit/miss/eviction counters.
+
+    Eviction drops only the least recently used entry, so a full cache never
+    loses its hot set at once.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float | None = None):
+        self.max_size = max(1, int(max_size))
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self._entries: OrderedDict[Hashable, tuple[Any, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def save(self, path: Path, meta: Any = None) -> int:
+        """Atomically write live entries (least recently used first) as JSON.
+
+        Only string keys and JSON-serializable values round-trip; TTLs are not persisted.
+        """
+        now = time.monotonic()
+        with self._lock:
+            items = [
+                [key, value]
+                for key, (value, expires_at) in self._entries.items()
+                if expires_at is None or expires_at > now
+            ]
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Per-process temp name: workers sharing the path save concurrently at shutdown.
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps({"meta": meta, "entries": items}), encoding="utf-8")
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return len(items)
+
+    def load(self, path: Path, meta: Any = None) -> int:
+        """Restore entries written by save(); a missing/corrupt file or different meta loads nothing."""
+        try:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(data, dict) or data.get("meta") != meta:
+            return 0
+        entries = [item for item in data.get("entries", []) if isinstance(item, list) and len(item) == 2]
+        entries = entries[-self.max_size :]
+        for key, value in entries:
+            self.put(key, value)
+        return len(entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,248 @@
+"""
+Circuit Breakers — per-provider health tracking for cloud AI calls.
+
+One breaker per provider ("openai", "gemini") is shared by symptom analysis,
+prescription OCR and voice, so a provider that is down or out of quota is
+skipped instantly instead of costing a network round trip per request:
+
+- Closed: calls go through; outcomes feed a rolling window. Once the window
+  holds AI_BREAKER_MIN_CALLS calls and the error rate reaches
+  AI_BREAKER_FAILURE_RATE, the breaker opens.
+- Open: calls are rejected until the cool-down ends. Each consecutive failed
+  probe doubles the cool-down, up to AI_BREAKER_MAX_OPEN_SECONDS.
+- Half-open: a single probe call is let through; success closes the breaker,
+  failure re-opens it.
+- Quota errors open the breaker immediately until the quota is expected to
+  reset: the provider's retry hint when the error carries one, midnight
+  Pacific time for daily (Gemini) quotas, otherwise AI_BREAKER_QUOTA_OPEN_SECONDS.
+
+Errors that say nothing about provider health (missing API key) are ignored.
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+_WINDOW_SECONDS = float(os.getenv("AI_BREAKER_WINDOW_SECONDS", "60"))
+_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "5"))
+_FAILURE_RATE = float(os.getenv("AI_BREAKER_FAILURE_RATE", "0.5"))
+_OPEN_SECONDS = float(os.getenv("AI_BREAKER_OPEN_SECONDS", "30"))
+_MAX_OPEN_SECONDS = float(os.getenv("AI_BREAKER_MAX_OPEN_SECONDS", "600"))
+_QUOTA_OPEN_SECONDS = float(os.getenv("AI_BREAKER_QUOTA_OPEN_SECONDS", "900"))
+# Providers scoring below this are tried after healthier ones.
+_HEALTHY_SCORE = 0.5
+
+_QUOTA_KEYWORDS = ("quota", "rate limit", "rate_limit", "429", "resource_exhausted", "too many requests")
+_NEUTRAL_KEYWORDS = ("not configured", "no image provided")
+_RETRY_HINT = re.compile(
+    r"(?:retry|try again)\D{0,20}?(\d+(?:\.\d+)?)\s*(ms|s|sec|seconds?)\b"
+    r"|retryDelay\W{1,4}(\d+(?:\.\d+)?)s",
+    re.IGNORECASE,
+)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+# Shared permit for calls made while closed; the half-open probe gets a unique one.
+_CALL_PERMIT = object()
+
+
+def is_quota_error(message: str) -> bool:
+    lowered = message.lower()
+    return any(kw in lowered for kw in _QUOTA_KEYWORDS)
+
+
+def _seconds_until_pacific_midnight(now: datetime | None = None) -> float:
+    try:
+        from zoneinfo import ZoneInfo
+
+        tz = ZoneInfo("America/Los_Angeles")
+    except Exception:
+        tz = timezone(timedelta(hours=-8))
+    local = (now or datetime.now(timezone.utc)).astimezone(tz)
+    midnight = (local + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - local).total_seconds()
+
+
+def quota_reset_seconds(message: str) -> float:
+    """How long a quota error is expected to last, from the error text."""
+    match = _RETRY_HINT.search(message)
+    if match:
+        if match.group(3):
+            return float(match.group(3))
+        value = float(match.group(1))
+        return value / 1000.0 if match.group(2).lower() == "ms" else value
+    lowered = message.lower()
+    if "daily" in lowered or "per day" in lowered or "perday" in lowered or "tomorrow" in lowered:
+        return _seconds_until_pacific_midnight()
+    return _QUOTA_OPEN_SECONDS
+
+
+class CircuitBreaker:
+    """Rolling-window breaker for one provider. Used from a single event loop."""
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = _WINDOW_SECONDS,
+        min_calls: int = _MIN_CALLS,
+        failure_rate: float = _FAILURE_RATE,
+        open_seconds: float = _OPEN_SECONDS,
+        max_open_seconds: float = _MAX_OPEN_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self._window_seconds = window_seconds
+        self._min_calls = min_calls
+        self._failure_rate = failure_rate
+        self._open_seconds = open_seconds
+        self._max_open_seconds = max_open_seconds
+        self._clock = clock
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self.state = CLOSED
+        self._open_until = 0.0
+        self._failed_probes = 0
+        # Permit held by the half-open probe in flight, if any.
+        self._probe: object | None = None
+        self.last_error: str | None = None
+        self.rejected = 0
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self._window_seconds:
+            self._outcomes.popleft()
+
+    def _open(self, now: float, seconds: float) -> None:
+        # Failures of calls already in flight must not cut short a longer (quota) window.
+        if self.state == OPEN:
+            self._open_until = max(self._open_until, now + seconds)
+        else:
+            self._open_until = now + seconds
+        self.state = OPEN
+        self._probe = None
+
+    def acquire(self) -> object | None:
+        """Permit for a call going out now, or None if rejected.
+
+        In half-open state only one probe is let through; it gets its own permit so
+        that only that call's release() frees the probe slot.
+        """
+        now = self._clock()
+        if self.state == OPEN and now >= self._open_until:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return _CALL_PERMIT
+        if self.state == HALF_OPEN and self._probe is None:
+            self._probe = object()
+            return self._probe
+        self.rejected += 1
+        return None
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state only one probe at a time."""
+        return self.acquire() is not None
+
+    def retry_in(self) -> float:
+        return max(0.0, self._open_until - self._clock()) if self.state == OPEN else 0.0
+
+    def release(self, permit: object | None) -> None:
+        """The call holding ``permit`` ended without telling us anything (cancelled, misconfigured)."""
+        if permit is not None and permit is self._probe:
+            self._probe = None
+
+    def record_success(self) -> None:
+        now = self._clock()
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+            self._failed_probes = 0
+            self._outcomes.clear()
+        self._probe = None
+        self._outcomes.append((now, True))
+        self._prune(now)
+
+    def record_failure(self, error: str) -> None:
+        now = self._clock()
+        self.last_error = error[:200]
+        self._outcomes.append((now, False))
+        self._prune(now)
+        if is_quota_error(error):
+            self._open(now, quota_reset_seconds(error))
+            return
+        if self.state == HALF_OPEN:
+            self._failed_probes += 1
+            self._open(now, min(self._max_open_seconds, self._open_seconds * 2 ** self._failed_probes))
+            return
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        if len(self._outcomes) >= self._min_calls and failures / len(self._outcomes) >= self._failure_rate:
+            self._open(now, self._open_seconds)
+
+    def record(self, result: dict, permit: object | None = None) -> None:
+        error = result.get("error")
+        if error is None:
+            self.record_success()
+        elif any(kw in str(error).lower() for kw in _NEUTRAL_KEYWORDS):
+            self.release(permit)
+        else:
+            self.record_failure(str(error))
+
+    def health_score(self) -> float:
+        """Success ratio over the window (1.0 without data, 0.0 while open)."""
+        if self.state == OPEN and self.retry_in() > 0:
+            return 0.0
+        self._prune(self._clock())
+        if not self._outcomes:
+            return 1.0
+        return sum(1 for _, ok in self._outcomes if ok) / len(self._outcomes)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "health_score": round(self.health_score(), 3),
+            "calls_in_window": len(self._outcomes),
+            "retry_in_seconds": round(self.retry_in(), 1),
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker(provider)
+    return _breakers[provider]
+
+
+def reset_breakers() -> None:
+    _breakers.clear()
+
+
+def order_by_health(providers: list[str]) -> list[str]:
+    """Keep the configured order, but move unhealthy providers behind healthy ones."""
+    return sorted(providers, key=lambda name: get_breaker(name).health_score() < _HEALTHY_SCORE)
+
+
+async def guarded_call(provider: str, call: Callable[[], Awaitable[dict]]) -> dict:
+    """Run a provider call that returns an ``{"error": ...}`` dict on failure, through its breaker."""
+    breaker = get_breaker(provider)
+    permit = breaker.acquire()
+    if permit is None:
+        return {
+            "error": f"{provider} temporarily unavailable (circuit open, retry in {breaker.retry_in():.0f}s)",
+            "circuit_open": True,
+        }
+    try:
+        result = await call()
+    except asyncio.CancelledError:
+        breaker.release(permit)
+        raise
+    except Exception as e:
+        result = {"error": str(e)}
+    breaker.record(result, permit)
+    return result
+
+
+def get_breaker_stats() -> dict:
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
@@ -0,0 +1,82 @@
+"""
+Async Data Access — shared PostgREST client for Supabase table queries.
+
+supabase-py's Client is synchronous, so calling it from ``async def`` handlers
+blocks the event loop for the whole round trip. get_db() returns an
+AsyncPostgrestClient backed by one pooled httpx.AsyncClient (keep-alive,
+HTTP/2) using the same service role key as get_supabase_client():
+
+    res = await get_db().table("health_logs").insert(row).execute()
+
+The query builder API is the same as supabase-py's ``client.table(...)``.
+"""
+
+import asyncio
+import os
+
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+
+_HTTP_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_HTTP_TIMEOUT_SECONDS", "10"))
+_HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "100"))
+_HTTP_MAX_KEEPALIVE = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "20"))
+_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+
+_db_client: AsyncPostgrestClient | None = None
+# (url, key, event loop id) the client was built for.
+_db_client_key: tuple[str, str, int] | None = None
+
+
+def _credentials() -> tuple[str, str]:
+    url = os.getenv("SUPABASE_URL", "")
+    # Prefer service role key for server-side ops (bypasses RLS)
+    key = os.getenv("SUPABASE_SERVICE_KEY", "") or os.getenv("SUPABASE_ANON_KEY", "")
+    if not url or not key:
+        raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_KEY (or SUPABASE_ANON_KEY) must be set")
+    return url.rstrip("/"), key
+
+
+def _build_client(url: str, key: str) -> AsyncPostgrestClient:
+    rest_url = f"{url}/rest/v1"
+    headers = {**DEFAULT_POSTGREST_CLIENT_HEADERS, "apikey": key, "Authorization": f"Bearer {key}"}
+    http_client = httpx.AsyncClient(
+        base_url=rest_url,
+        headers=headers,
+        timeout=_HTTP_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        http2=True,
+        follow_redirects=True,
+    )
+    return AsyncPostgrestClient(rest_url, headers=headers, http_client=http_client)
+
+
+def get_db() -> AsyncPostgrestClient:
+    """Return the shared async PostgREST client (service role key, bypasses RLS).
+
+    Must be called from a running event loop. The client is re-created when the
+    Supabase URL/key changes (key rotation) or the event loop changes, since
+    pooled connections are bound to the loop that opened them.
+    """
+    global _db_client, _db_client_key
+    url, key = _credentials()
+    client_key = (url, key, id(asyncio.get_running_loop()))
+    if _db_client is None or _db_client_key != client_key:
+        previous, previous_key = _db_client, _db_client_key
+        _db_client = _build_client(url, key)
+        _db_client_key = client_key
+        if previous is not None and previous_key is not None and previous_key[2] == client_key[2]:
+            asyncio.get_running_loop().create_task(previous.aclose())
+    return _db_client
+
+
+async def close_db() -> None:
+    """Close pooled connections (app shutdown)."""
+    global _db_client, _db_client_key
+    if _db_client is not None:
+        client, _db_client, _db_client_key = _db_client, None, None
+        await client.aclose()
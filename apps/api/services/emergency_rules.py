@@ -0,0 +1,197 @@
+"""
+Emergency Rules — json-logic rules from data/emergency_rules.json, compiled to
+bitmasks and checked before any AI call.
+
+Each rule's ``condition`` (and optional ``high_confidence``) is json-logic over
+``{"symptoms": [...], "modifiers": [...]}``. Supported operators: ``and``,
+``or``, ``!``, ``in`` (a literal in the ``symptoms``/``modifiers`` var) and
+boolean literals. At load time every (var, value) pair gets a bit and each
+condition is rewritten in disjunctive normal form as (required, forbidden)
+mask pairs, so a request is turned into one integer and each rule is checked
+with a few AND/compare operations instead of list scans.
+
+The file is re-read when its mtime changes; a file that fails to parse or
+compile is logged and the previous rule set stays active.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+_RULES_PATH = Path(os.getenv("EMERGENCY_RULES_PATH", str(BASE_DIR / "data" / "emergency_rules.json")))
+_VARS = ("symptoms", "modifiers")
+# Guard against DNF blow-up from deeply nested and/or trees.
+_MAX_CLAUSES = 256
+
+# A clause is (required bits, forbidden bits); a DNF is a list of clauses.
+Clause = tuple[int, int]
+
+
+class _Compiler:
+    def __init__(self):
+        self.bits: dict[tuple[str, str], int] = {}
+
+    def _bit(self, var: str, value: str) -> int:
+        key = (var, value)
+        if key not in self.bits:
+            self.bits[key] = 1 << len(self.bits)
+        return self.bits[key]
+
+    def compile(self, node) -> list[Clause]:
+        if isinstance(node, bool):
+            return [(0, 0)] if node else []
+        if not isinstance(node, dict) or len(node) != 1:
+            raise ValueError(f"Unsupported json-logic node: {node!r}")
+        op, args = next(iter(node.items()))
+        if op == "!":
+            arg = args[0] if isinstance(args, list) and len(args) == 1 else args
+            return self._negate(self.compile(arg))
+        if not isinstance(args, list):
+            raise ValueError(f"'{op}' expects a list of arguments")
+        if op == "in":
+            if len(args) != 2 or not isinstance(args[0], str) or not isinstance(args[1], dict):
+                raise ValueError(f"'in' expects [value, {{\"var\": ...}}], got {args!r}")
+            var = args[1].get("var")
+            if var not in _VARS:
+                raise ValueError(f"Unknown var {var!r}; expected one of {_VARS}")
+            return [(self._bit(var, args[0]), 0)]
+        if op == "or":
+            clauses = [clause for arg in args for clause in self.compile(arg)]
+            return self._checked(clauses)
+        if op == "and":
+            clauses = [(0, 0)]
+            for arg in args:
+                clauses = self._product(clauses, self.compile(arg))
+            return clauses
+        raise ValueError(f"Unsupported json-logic operator: {op!r}")
+
+    def _product(self, left: list[Clause], right: list[Clause]) -> list[Clause]:
+        clauses = []
+        for req_a, forbid_a in left:
+            for req_b, forbid_b in right:
+                req, forbid = req_a | req_b, forbid_a | forbid_b
+                if not req & forbid:  # drop contradictions (x and not x)
+                    clauses.append((req, forbid))
+        return self._checked(clauses)
+
+    def _negate(self, clauses: list[Clause]) -> list[Clause]:
+        # not (c1 or c2 ...) == (not c1) and (not c2) ...; each "not c" is an OR of negated literals.
+        result = [(0, 0)]
+        for req, forbid in clauses:
+            literals = [(0, bit) for bit in _split_bits(req)] + [(bit, 0) for bit in _split_bits(forbid)]
+            result = self._product(result, literals)
+        return result
+
+    @staticmethod
+    def _checked(clauses: list[Clause]) -> list[Clause]:
+        clauses = list(dict.fromkeys(clauses))
+        if len(clauses) > _MAX_CLAUSES:
+            raise ValueError(f"Rule expands to more than {_MAX_CLAUSES} clauses")
+        return clauses
+
+
+def _split_bits(mask: int) -> list[int]:
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low)
+        mask ^= low
+    return bits
+
+
+def _matches(mask: int, clauses: list[Clause]) -> bool:
+    return any(mask & req == req and not mask & forbid for req, forbid in clauses)
+
+
+class EmergencyRuleSet:
+    """Compiled, immutable rule set."""
+
+    def __init__(self, rules: list[dict]):
+        compiler = _Compiler()
+        self.rules: list[tuple[dict, list[Clause], list[Clause], int | None]] = []
+        for rule in rules:
+            try:
+                condition = compiler.compile(rule["condition"])
+                high_confidence = compiler.compile(rule.get("high_confidence", True))
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"Emergency rule {rule.get('id', '?')}: {e}") from e
+            # Rules that need at least one present symptom/modifier are skipped
+            # by one AND when none of their bits are set.
+            trigger = 0
+            for req, _ in condition:
+                if not req:
+                    trigger = None
+                    break
+                trigger |= req
+            alert = {
+                "rule_id": rule["id"],
+                "name": rule["name"],
+                "severity": rule["severity"],
+                "message": rule["message"],
+                "instructions": list(rule.get("instructions", [])),
+            }
+            self.rules.append((alert, condition, high_confidence, trigger))
+        self.bits = compiler.bits
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def mask(self, symptoms: list[str], modifiers: list[str]) -> int:
+        bits = self.bits
+        mask = 0
+        for var, values in (("symptoms", symptoms), ("modifiers", modifiers)):
+            for value in values:
+                mask |= bits.get((var, value), 0)
+        return mask
+
+    def evaluate(self, symptoms: list[str], modifiers: list[str]) -> list[dict]:
+        mask = self.mask(symptoms, modifiers)
+        alerts = []
+        for alert, condition, high_confidence, trigger in self.rules:
+            if trigger is not None and not mask & trigger:
+                continue
+            if not _matches(mask, condition):
+                continue
+            confidence = "high" if _matches(mask, high_confidence) else "medium"
+            alerts.append({**alert, "confidence": confidence, "instructions": list(alert["instructions"])})
+        return alerts
+
+
+def load_emergency_rules(path: Path) -> EmergencyRuleSet:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return EmergencyRuleSet(data["rules"] if isinstance(data, dict) else data)
+
+
+_rule_set: EmergencyRuleSet | None = None
+_rules_mtime_ns: int | None = None
+
+
+def get_emergency_rule_set() -> EmergencyRuleSet:
+    """Current rule set, recompiled when the rules file changes on disk."""
+    global _rule_set, _rules_mtime_ns
+    try:
+        mtime_ns = _RULES_PATH.stat().st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    if _rule_set is not None and mtime_ns == _rules_mtime_ns:
+        return _rule_set
+    try:
+        rule_set = load_emergency_rules(_RULES_PATH)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        if _rule_set is None:
+            raise
+        logger.error("Keeping previous emergency rules; reload of %s failed: %s", _RULES_PATH, e)
+        _rules_mtime_ns = mtime_ns  # don't retry until the file changes again
+        return _rule_set
+    _rule_set, _rules_mtime_ns = rule_set, mtime_ns
+    logger.info("Loaded %d emergency rules from %s", len(rule_set), _RULES_PATH)
+    return rule_set
+
+
+def check_emergency_rules(symptoms: list[str], modifiers: list[str]) -> list[dict]:
+    """Check symptoms against emergency rules (instant, no API call)."""
+    return get_emergency_rule_set().evaluate(symptoms, modifiers)
@@ -0,0 +1,83 @@
+"""
+Trigram inverted index for fuzzy lookups over short names (medicines, brands).
+
+Candidates are gathered from the postings of the query's trigrams and ranked by
+Dice overlap; only the best few are rescored with difflib's ratio, so a lookup
+touches a handful of entries instead of the whole catalog.
+"""
+
+from __future__ import annotations
+
+import heapq
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Callable, Iterable
+
+
+def trigrams(token: str) -> set[str]:
+    """Padded character trigrams; the leading pad makes the first letters count double."""
+    padded = f"  {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Immutable index over (value, normalized token) pairs."""
+
+    def __init__(self, entries: Iterable[tuple[str, str]]):
+        self.values: list[str] = []
+        self.tokens: list[str] = []
+        self._gram_counts: list[int] = []
+        postings: dict[str, list[int]] = defaultdict(list)
+        for value, token in entries:
+            if not token:
+                continue
+            idx = len(self.values)
+            grams = trigrams(token)
+            self.values.append(value)
+            self.tokens.append(token)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                postings[gram].append(idx)
+        self._postings = dict(postings)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def candidates(self, token: str, limit: int = 32) -> list[int]:
+        """Entry ids with the highest trigram Dice overlap, best first."""
+        grams = trigrams(token)
+        shared: dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for idx in self._postings.get(gram, ()):
+                shared[idx] += 1
+        if not shared:
+            return []
+        query_count = len(grams)
+        gram_counts = self._gram_counts
+        return heapq.nlargest(
+            limit,
+            shared,
+            key=lambda idx: (2 * shared[idx] / (query_count + gram_counts[idx]), -idx),
+        )
+
+    def search(
+        self,
+        token: str,
+        k: int = 5,
+        limit: int = 32,
+        candidate_filter: Callable[[str, str], bool] | None = None,
+    ) -> list[tuple[str, float]]:
+        """Top-k (value, SequenceMatcher ratio) pairs among the trigram-nearest entries.
+
+        Ties keep index order, matching a linear scan that keeps the first best.
+        """
+        if not token:
+            return []
+        scored: list[tuple[float, int]] = []
+        for idx in self.candidates(token, limit=limit):
+            candidate_token = self.tokens[idx]
+            if candidate_filter is not None and not candidate_filter(token, candidate_token):
+                continue
+            scored.append((SequenceMatcher(None, token, candidate_token).ratio(), idx))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(self.values[idx], score) for score, idx in scored[:k]]
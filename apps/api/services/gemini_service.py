@@ -6,10 +6,20 @@ Uses the new google.genai SDK.
 import os
 from google import genai
 from google.genai import types
-from services.ai_models import get_cloud_model_for_task, parse_json_response as _parse_json_response
+from services.ai_models import (
+    ProviderLimiter,
+    get_cloud_model_for_task,
+    parse_json_response as _parse_json_response,
+)
+from services.prompt_context import record_prompt_tokens
 
 _client = None
 _client_key = None
+_limiter = ProviderLimiter(
+    "Gemini",
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    timeout_s=float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30")),
+)
 
 
 def _get_client():
@@ -25,6 +35,11 @@ def _get_client():
     return _client
 
 
+async def generate_content(client, model: str, contents):
+    """Non-blocking generate_content (native async client) with timeout and concurrency limit."""
+    return await _limiter.call(lambda: client.aio.models.generate_content(model=model, contents=contents))
+
+
 async def analyze_symptoms(
     symptoms: list[str],
     modifiers: list[str],
@@ -95,10 +110,9 @@ Respond ONLY with valid JSON in this exact format:
 
     try:
         model_name = get_cloud_model_for_task("symptom_analysis", "gemini")
-        response = client.models.generate_content(
-            model=model_name,
-            contents=prompt,
-        )
+        response = await generate_content(client, model_name, prompt)
+        usage = getattr(response, "usage_metadata", None)
+        record_prompt_tokens("gemini", getattr(usage, "prompt_token_count", None))
         return _parse_json_response(response.text)
     except Exception as e:
         error_msg = str(e)
@@ -148,10 +162,7 @@ If you cannot read the prescription clearly, still try your best and add a "conf
     try:
         model_name = get_cloud_model_for_task("prescription_ocr", "gemini")
         image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[prompt, image_part],
-        )
+        response = await generate_content(client, model_name, [prompt, image_part])
         return _parse_json_response(response.text)
     except Exception as e:
         error_msg = str(e)
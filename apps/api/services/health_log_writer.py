@@ -0,0 +1,402 @@
+"""
+Health Log Writer — write-behind queue for health_logs inserts.
+
+Endpoints call enqueue_health_log() and respond as soon as the row is in a
+local SQLite spool, returning the row's id (a client-generated UUID, so the
+reference is valid before the row reaches Supabase). A single background
+flusher drains the spool with one multi-row upsert per batch:
+
+- Upserts use on_conflict=id with ignore_duplicates, so a retried batch that
+  already landed cannot create duplicates.
+- A row rejected because its self patient no longer exists (FK violation
+  after the patient was deleted/recreated while its id was cached) is moved
+  to the user's current self patient and re-sent once.
+- Failed rows are retried with exponential backoff; a batch rejected by
+  PostgREST is split so one bad row cannot block the others. Rows that keep
+  failing are kept in the spool, marked dead, for inspection.
+- Spooled rows survive restarts and are re-sent when the flusher starts.
+- The spool file is shared by every worker process on the host: a flusher
+  claims a batch (owner + lease) in an immediate transaction before sending
+  it, so workers do not send the same rows; a claim left by a crashed worker
+  expires after HEALTH_LOG_CLAIM_LEASE_SECONDS.
+- The spool is bounded: past HEALTH_LOG_MAX_PENDING rows, writes go straight
+  to the database again (backpressure instead of unbounded growth). The
+  limit and the pending count in /health are read from the spool, so they
+  cover all workers.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+
+from services.db import get_db
+from services.patient_utils import replace_stale_self_patient
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+_SPOOL_PATH = Path(os.getenv("HEALTH_LOG_SPOOL_PATH", str(BASE_DIR / "data" / "health_log_spool.sqlite3")))
+_BATCH_SIZE = max(1, int(os.getenv("HEALTH_LOG_BATCH_SIZE", "50")))
+_FLUSH_INTERVAL_S = max(0, int(os.getenv("HEALTH_LOG_FLUSH_INTERVAL_MS", "200"))) / 1000.0
+_MAX_PENDING = max(1, int(os.getenv("HEALTH_LOG_MAX_PENDING", "10000")))
+_MAX_ATTEMPTS = max(1, int(os.getenv("HEALTH_LOG_MAX_ATTEMPTS", "10")))
+_CLAIM_LEASE_S = max(1.0, float(os.getenv("HEALTH_LOG_CLAIM_LEASE_SECONDS", "60")))
+_RETRY_BASE_S = 1.0
+_RETRY_MAX_S = 300.0
+_IDLE_POLL_S = 5.0
+_FK_VIOLATION = "23503"
+
+
+class _Spool:
+    """Durable pending-row store (SQLite, WAL), shared across processes. All methods are blocking."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pending_health_logs (
+                    id TEXT PRIMARY KEY,
+                    recorded_by TEXT,
+                    log_type TEXT,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    dead INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    claimed_by TEXT,
+                    claimed_until REAL NOT NULL DEFAULT 0
+                )
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pending_health_logs)")}
+            if "claimed_by" not in columns:  # spool created before claims existed
+                self._conn.execute("ALTER TABLE pending_health_logs ADD COLUMN claimed_by TEXT")
+                self._conn.execute("ALTER TABLE pending_health_logs ADD COLUMN claimed_until REAL NOT NULL DEFAULT 0")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS pending_health_logs_due ON pending_health_logs (dead, next_attempt_at)"
+            )
+
+    @contextmanager
+    def _transaction(self):
+        """Serialize against this process's threads and, via the SQLite write lock, other workers."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _pending_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM pending_health_logs WHERE dead = 0").fetchone()[0]
+
+    def add(self, record: dict, max_pending: int) -> tuple[bool, int]:
+        """Spool the row unless max_pending rows are already waiting; returns (added, pending)."""
+        with self._transaction() as conn:
+            pending = self._pending_count()
+            if pending >= max_pending:
+                return False, pending
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO pending_health_logs (id, recorded_by, log_type, payload) VALUES (?, ?, ?, ?)",
+                (record["id"], record.get("recorded_by"), record.get("log_type"), json.dumps(record)),
+            )
+            return True, pending + cursor.rowcount
+
+    def counts(self) -> tuple[int, int]:
+        """(pending, dead) rows across all workers."""
+        with self._lock:
+            pending, dead = self._conn.execute(
+                "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM pending_health_logs"
+            ).fetchone()
+        return pending, dead
+
+    def claim(self, owner: str, limit: int, now: float, lease_s: float) -> list[tuple[str, str, int]]:
+        """Due rows not claimed by another flusher, claimed for ``owner`` until now + lease_s."""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, payload, attempts FROM pending_health_logs "
+                "WHERE dead = 0 AND next_attempt_at <= ? AND claimed_until <= ? ORDER BY rowid LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE pending_health_logs SET claimed_by = ?, claimed_until = ? WHERE id = ?",
+                [(owner, now + lease_s, record_id) for record_id, _, _ in rows],
+            )
+        return rows
+
+    def next_due_at(self) -> float | None:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MIN(MAX(next_attempt_at, claimed_until)) FROM pending_health_logs WHERE dead = 0"
+            ).fetchone()[0]
+
+    def release(self, owner: str) -> None:
+        """Drop owner's claims (a batch interrupted before it was sent or deferred)."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE pending_health_logs SET claimed_by = NULL, claimed_until = 0 WHERE claimed_by = ?", (owner,)
+            )
+
+    def update_payload(self, record_id: str, payload: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("UPDATE pending_health_logs SET payload = ? WHERE id = ?", (payload, record_id))
+
+    def remove(self, ids: list[str]) -> None:
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM pending_health_logs WHERE id = ?", [(i,) for i in ids])
+
+    def defer(self, updates: list[tuple[int, float, int, str, str]]) -> None:
+        """updates: (attempts, next_attempt_at, dead, last_error, id); releases the claim."""
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE pending_health_logs SET attempts = ?, next_attempt_at = ?, dead = ?, last_error = ?, "
+                "claimed_by = NULL, claimed_until = 0 WHERE id = ?",
+                updates,
+            )
+
+    def pending_for(self, recorded_by: str, log_type: str | None = None) -> list[dict]:
+        query = "SELECT payload FROM pending_health_logs WHERE dead = 0 AND recorded_by = ?"
+        params: list = [recorded_by]
+        if log_type:
+            query += " AND log_type = ?"
+            params.append(log_type)
+        with self._lock:
+            return [json.loads(row[0]) for row in self._conn.execute(query, params).fetchall()]
+
+
+async def _upsert_health_logs(rows: list[dict]) -> None:
+    # Nothing is read back: minimal return keeps PostgREST from echoing every row.
+    await get_db().table("health_logs").upsert(
+        rows, on_conflict="id", ignore_duplicates=True, returning=ReturnMethod.minimal
+    ).execute()
+
+
+async def _replace_self_patient(record: dict) -> str | None:
+    return await replace_stale_self_patient(get_db(), record["recorded_by"], record["patient_id"])
+
+
+class HealthLogWriter:
+    """Spools health_logs rows and drains them in batches from one background task."""
+
+    def __init__(
+        self,
+        spool_path: Path,
+        batch_size: int = _BATCH_SIZE,
+        flush_interval_s: float = _FLUSH_INTERVAL_S,
+        max_pending: int = _MAX_PENDING,
+        max_attempts: int = _MAX_ATTEMPTS,
+        insert_batch: Callable[[list[dict]], Awaitable[None]] = _upsert_health_logs,
+        replace_patient: Callable[[dict], Awaitable[str | None]] = _replace_self_patient,
+    ):
+        self._spool = _Spool(spool_path)
+        self._batch_size = batch_size
+        self._flush_interval_s = flush_interval_s
+        self._max_pending = max_pending
+        self._max_attempts = max_attempts
+        self._insert_batch = insert_batch
+        self._replace_patient = replace_patient
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        # Spool-wide counts as of this worker's last spool operation (kept off the event loop).
+        self._pending, self._dead = self._spool.counts()
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopping = False
+        self.written = 0
+        self.retries = 0
+        self.direct_writes = 0
+
+    async def enqueue(self, entry: dict) -> str:
+        """Persist a row for background insertion and return its id."""
+        record = dict(entry)
+        record.setdefault("id", str(uuid.uuid4()))
+        # Stamp the request time; the database default would record the flush time.
+        record.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+
+        added, self._pending = await asyncio.to_thread(self._spool.add, record, self._max_pending)
+        if not added:
+            await self._insert_batch([record])
+            self.direct_writes += 1
+            return record["id"]
+
+        self.start()
+        self._wake.set()
+        return record["id"]
+
+    def start(self) -> None:
+        """Start the flusher on the running loop (no-op if already running there)."""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._run())
+        if self._pending:
+            self._wake.set()
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Stop the flusher after a final best-effort drain; unsent rows stay spooled."""
+        task, self._task = self._task, None
+        if task is None or task.done():
+            return
+        # Let the flusher finish the batch it is sending (cancelling it between the upsert
+        # and the spool delete would get the rows sent again), then drain once more.
+        self._stopping = True
+        self._wake.set()
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+        if not done:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            # The interrupted batch's claims would otherwise wait out their lease.
+            await asyncio.to_thread(self._spool.release, self._owner)
+        try:
+            await asyncio.wait_for(self.flush(), timeout=timeout)
+        except Exception as e:
+            logger.warning("Health log flush on shutdown incomplete: %s", e)
+
+    async def _idle_timeout(self) -> float:
+        next_due = await asyncio.to_thread(self._spool.next_due_at)
+        if next_due is None:
+            return _IDLE_POLL_S
+        return min(_IDLE_POLL_S, max(0.0, next_due - time.time()))
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            timeout = await self._idle_timeout()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._flush_interval_s:
+                # Let concurrent requests accumulate into one batch.
+                await asyncio.sleep(self._flush_interval_s)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Health log flusher error: %s", e)
+
+    async def flush(self) -> int:
+        """Write every row that is due for an attempt; returns rows written."""
+        written = 0
+        while True:
+            rows = await asyncio.to_thread(
+                self._spool.claim, self._owner, self._batch_size, time.time(), _CLAIM_LEASE_S
+            )
+            if not rows:
+                self._pending, self._dead = await asyncio.to_thread(self._spool.counts)
+                return written
+            written += await self._write(rows)
+
+    async def _write(self, rows: list[tuple[str, str, int]], patient_replaced: bool = False) -> int:
+        try:
+            await self._insert_batch([json.loads(payload) for _, payload, _ in rows])
+        except Exception as e:
+            if len(rows) > 1 and isinstance(e, APIError):
+                # PostgREST rejected the batch; isolate the offending row(s).
+                written = 0
+                for row in rows:
+                    written += await self._write([row])
+                return written
+            if isinstance(e, APIError) and e.code == _FK_VIOLATION and not patient_replaced:
+                repaired = await self._repair_patient(rows[0])
+                if repaired is not None:
+                    return await self._write([repaired], patient_replaced=True)
+            await asyncio.to_thread(self._defer, rows, e)
+            self.retries += len(rows)
+            return 0
+
+        await asyncio.to_thread(self._spool.remove, [record_id for record_id, _, _ in rows])
+        self.written += len(rows)
+        return len(rows)
+
+    async def _repair_patient(self, row: tuple[str, str, int]) -> tuple[str, str, int] | None:
+        """Point a row at the user's current self patient if its cached one was deleted."""
+        record_id, payload, attempts = row
+        record = json.loads(payload)
+        if not record.get("patient_id") or not record.get("recorded_by"):
+            return None
+        try:
+            patient_id = await self._replace_patient(record)
+        except Exception as e:
+            logger.warning("Could not re-resolve self patient for health log %s: %s", record_id, e)
+            return None
+        if not patient_id:
+            return None
+        logger.warning(
+            "Health log %s: patient %s no longer exists, re-sending for self patient %s",
+            record_id, record["patient_id"], patient_id,
+        )
+        record["patient_id"] = patient_id
+        payload = json.dumps(record)
+        await asyncio.to_thread(self._spool.update_payload, record_id, payload)
+        return record_id, payload, attempts
+
+    def _defer(self, rows: list[tuple[str, str, int]], error: Exception) -> None:
+        """Schedule retries with exponential backoff; rows past max_attempts are marked dead."""
+        now = time.time()
+        updates = []
+        for record_id, _, attempts in rows:
+            attempts += 1
+            dead = int(attempts >= self._max_attempts)
+            delay = min(_RETRY_MAX_S, _RETRY_BASE_S * 2 ** (attempts - 1))
+            updates.append((attempts, now + delay, dead, str(error)[:500], record_id))
+            if dead:
+                logger.error("Giving up on health log %s after %d attempts: %s", record_id, attempts, error)
+        self._spool.defer(updates)
+
+    def pending_for(self, recorded_by: str, log_type: str | None = None) -> list[dict]:
+        return self._spool.pending_for(recorded_by, log_type)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "dead": self._dead,
+            "written": self.written,
+            "retries": self.retries,
+            "direct_writes": self.direct_writes,
+            "max_pending": self._max_pending,
+        }
+
+
+_writer: HealthLogWriter | None = None
+
+
+def get_health_log_writer() -> HealthLogWriter:
+    global _writer
+    if _writer is None:
+        _writer = HealthLogWriter(_SPOOL_PATH)
+    return _writer
+
+
+async def enqueue_health_log(entry: dict) -> str:
+    """Queue a health_logs row (write-behind) and return its record id."""
+    return await get_health_log_writer().enqueue(entry)
+
+
+async def get_pending_health_logs(recorded_by: str, log_type: str | None = None) -> list[dict]:
+    """Rows accepted but not yet written, so readers see their own recent writes."""
+    return await asyncio.to_thread(get_health_log_writer().pending_for, recorded_by, log_type)
@@ -7,15 +7,22 @@ Replaces cloud AI (GPT/Gemini) for all tasks.
 import os
 import io
 import re
+import copy
 import json
 import asyncio
+import threading
+import time
 import numpy as np
 from pathlib import Path
+from typing import AsyncIterator
 from services.prescription_ocr_service import (
     preprocess_prescription_page,
     parse_prescription_text,
     extract_prescription_with_local_model,
 )
+from services.cache import LRUCache
+from services.medicine_db import get_available_generic_names
+from services.symptom_forest import load_compiled_model
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 MODELS_DIR = BASE_DIR / "models"
@@ -33,15 +40,23 @@ _whisper_model = None
 
 
 def _load_symptom_model():
+    """Load the compiled NumPy forest, falling back to the scikit-learn joblib bundle."""
     global _symptom_model
     if _symptom_model is None:
+        compiled_path = MODELS_DIR / "symptom_model_compiled.npz"
+        if compiled_path.exists():
+            _symptom_model = load_compiled_model(compiled_path)
+            return _symptom_model
+
         import joblib
         model_path = MODELS_DIR / "symptom_model.joblib"
         if not model_path.exists():
             raise FileNotFoundError(
                 f"Symptom model not found at {model_path}. Run: python scripts/train_model.py"
             )
-        _symptom_model = joblib.load(model_path)
+        model_data = joblib.load(model_path)
+        model_data.setdefault("classes", model_data["label_encoder"].classes_)
+        _symptom_model = model_data
     return _symptom_model
 
 
@@ -103,41 +118,133 @@ def _get_feature_index(feature_names: list[str]) -> dict[str, int]:
     return _feature_index
 
 
-def _predict_diseases_sync(symptoms: list[str], top_k: int = 5) -> list[dict]:
-    """Convert frontend symptom IDs to feature vector, predict top-k diseases."""
-    model_data = _load_symptom_model()
+def _build_feature_matrix(symptom_sets: list[list[str]], feature_names: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Map frontend symptom IDs to one binary feature row per request.
+
+    Returns the matrix and a boolean mask of rows that matched at least one feature.
+    """
     mapping = _load_symptom_mapping()
+    feat_idx = _get_feature_index(feature_names)
+
+    features = np.zeros((len(symptom_sets), len(feature_names)), dtype=np.uint8)
+    for row, symptoms in enumerate(symptom_sets):
+        for symptom_id in symptoms:
+            for col_name in mapping.get(symptom_id, []):
+                idx = feat_idx.get(col_name)
+                if idx is not None:
+                    features[row, idx] = 1
+    return features, features.any(axis=1)
+
 
+def _predict_diseases_batch_sync(symptom_sets: list[list[str]], top_k: int = 5) -> list[list[dict]]:
+    """Predict top-k diseases for many symptom sets with a single predict_proba call."""
+    model_data = _load_symptom_model()
     model = model_data["model"]
-    label_encoder = model_data["label_encoder"]
-    feature_names = model_data["feature_names"]
-    feat_idx = _get_feature_index(feature_names)
+    classes = model_data["classes"]
+
+    features, matched = _build_feature_matrix(symptom_sets, model_data["feature_names"])
+    results: list[list[dict]] = [[] for _ in symptom_sets]
+    if not matched.any():
+        return results
+
+    rows = np.flatnonzero(matched)
+    probas = model.predict_proba(features[rows])
+    top_indices = np.argsort(probas, axis=1)[:, ::-1][:, :top_k]
+
+    for row, row_probas, row_top in zip(rows, probas, top_indices):
+        results[row] = [
+            {"name": str(classes[idx]), "probability": float(row_probas[idx])}
+            for idx in row_top
+            if row_probas[idx] >= 0.05
+        ]
+    return results
 
-    features = np.zeros(len(feature_names), dtype=int)
-    matched_features = 0
 
-    for symptom_id in symptoms:
-        kaggle_columns = mapping.get(symptom_id, [])
-        for col_name in kaggle_columns:
-            idx = feat_idx.get(col_name)
-            if idx is not None:
-                features[idx] = 1
-                matched_features += 1
+def _predict_diseases_sync(symptoms: list[str], top_k: int = 5) -> list[dict]:
+    """Convert frontend symptom IDs to feature vector, predict top-k diseases."""
+    return _predict_diseases_batch_sync([symptoms], top_k)[0]
+
+
+_SYMPTOM_BATCH_WINDOW_S = max(0.0, float(os.getenv("SYMPTOM_BATCH_WINDOW_MS", "3")) / 1000.0)
+_SYMPTOM_BATCH_MAX_SIZE = max(1, int(os.getenv("SYMPTOM_BATCH_MAX_SIZE", "64")))
+
+
+class _PredictionCoalescer:
+    """Gathers concurrent predictions for a few milliseconds and runs them as one matrix.
+
+    Bound to the event loop it was created on; all bookkeeping happens on that loop,
+    only the batched model call is offloaded to a worker thread.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._pending: list[tuple[list[str], int, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # The loop keeps only weak references to tasks; hold in-flight batches here.
+        self._tasks: set[asyncio.Task] = set()
+
+    async def predict(self, symptoms: list[str], top_k: int) -> list[dict]:
+        future = self.loop.create_future()
+        self._pending.append((symptoms, top_k, future))
+        if len(self._pending) >= _SYMPTOM_BATCH_MAX_SIZE:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(_SYMPTOM_BATCH_WINDOW_S, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self.loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[list[str], int, asyncio.Future]]) -> None:
+        top_k = max(k for _, k, _ in batch)
+        try:
+            results = await asyncio.to_thread(
+                _predict_diseases_batch_sync, [symptoms for symptoms, _, _ in batch], top_k
+            )
+        except Exception as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, k, future), predictions in zip(batch, results):
+            if not future.done():
+                future.set_result(predictions[:k])
 
-    if matched_features == 0:
-        return []
 
-    probas = model.predict_proba(features.reshape(1, -1))[0]
-    top_indices = np.argsort(probas)[::-1][:top_k]
+_prediction_coalescer: _PredictionCoalescer | None = None
 
-    results = []
-    for idx in top_indices:
-        if probas[idx] < 0.05:
-            continue
-        disease_name = label_encoder.inverse_transform([idx])[0]
-        results.append({"name": disease_name, "probability": float(probas[idx])})
 
-    return results
+async def _predict_diseases(symptoms: list[str], top_k: int = 5) -> list[dict]:
+    """Predict via the request coalescer (or directly when SYMPTOM_BATCH_WINDOW_MS=0)."""
+    global _prediction_coalescer
+    if _SYMPTOM_BATCH_WINDOW_S <= 0:
+        return await asyncio.to_thread(_predict_diseases_sync, symptoms, top_k)
+
+    loop = asyncio.get_running_loop()
+    if _prediction_coalescer is None or _prediction_coalescer.loop is not loop:
+        _prediction_coalescer = _PredictionCoalescer(loop)
+    return await _prediction_coalescer.predict(symptoms, top_k)
+
+
+async def predict_recommended_generics(symptoms: list[str], top_k: int = 3) -> list[str]:
+    """Generic names recommended for the top predicted conditions ([] if the model is unavailable)."""
+    try:
+        predictions = await _predict_diseases(sorted(set(symptoms)), top_k)
+        metadata = _load_disease_metadata()
+    except Exception:
+        return []
+    generics = []
+    for pred in predictions:
+        for med in _find_metadata(pred["name"], metadata).get("recommended_medicines", []):
+            generics.append(med["generic_name"])
+    return generics
 
 
 def _find_metadata(disease_name: str, metadata: dict) -> dict:
@@ -154,6 +261,74 @@ def _find_metadata(disease_name: str, metadata: dict) -> dict:
     return {}
 
 
+_SYMPTOM_RESULT_CACHE = LRUCache(
+    max_size=int(os.getenv("SYMPTOM_CACHE_MAX_ENTRIES", "2048")),
+    ttl_seconds=float(os.getenv("SYMPTOM_CACHE_TTL_SECONDS", "3600")),
+)
+_symptom_sources_signature: tuple | None = None
+# Model/metadata files are stat()ed at most this often, not on every request.
+_SOURCES_CHECK_INTERVAL_S = float(os.getenv("SYMPTOM_MODEL_CHECK_INTERVAL_SECONDS", "5"))
+_sources_checked_at: float | None = None
+
+
+def _symptom_sources_changed() -> bool:
+    """Detect a retrained model or edited disease metadata (by mtime) since the last check."""
+    global _symptom_sources_signature, _sources_checked_at
+    now = time.monotonic()
+    if _sources_checked_at is not None and now - _sources_checked_at < _SOURCES_CHECK_INTERVAL_S:
+        return False
+    _sources_checked_at = now
+    signature = []
+    for path in (
+        MODELS_DIR / "symptom_model_compiled.npz",
+        MODELS_DIR / "symptom_model.joblib",
+        DATA_DIR / "disease_metadata.json",
+    ):
+        try:
+            signature.append(path.stat().st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    current = tuple(signature)
+    if current == _symptom_sources_signature:
+        return False
+    changed = _symptom_sources_signature is not None
+    _symptom_sources_signature = current
+    return changed
+
+
+def _invalidate_symptom_model() -> None:
+    """Drop loaded model/metadata and every cached result so the next request reloads them."""
+    global _symptom_model, _disease_metadata, _feature_index
+    _symptom_model = None
+    _disease_metadata = None
+    _feature_index = None
+    _SYMPTOM_RESULT_CACHE.clear()
+
+
+def _duration_bucket(duration_days: int) -> int:
+    """Collapse durations to the thresholds the escalation rules actually look at."""
+    if duration_days >= 7:
+        return 2
+    if duration_days >= 5:
+        return 1
+    return 0
+
+
+def get_symptom_cache_stats() -> dict:
+    return _SYMPTOM_RESULT_CACHE.stats()
+
+
+def _filter_available_medicines(result: dict, available: frozenset[str] | None) -> dict:
+    """Keep recommended medicines stocked in the catalog (all of them if none match)."""
+    recommended = result.get("recommended_medicines")
+    if not available or not recommended:
+        return result
+    filtered = [m for m in recommended if m["generic_name"].strip().lower() in available]
+    if filtered:
+        result["recommended_medicines"] = filtered
+    return result
+
+
 async def analyze_symptoms_local(
     symptoms: list[str],
     modifiers: list[str],
@@ -162,11 +337,51 @@ async def analyze_symptoms_local(
     gender: str | None = None,
     medical_history: list[str] | None = None,
     current_medications: list[str] | None = None,
-    medicines_context: str = "",
 ) -> dict:
-    """Local ML symptom analysis. Returns same JSON schema as OpenAI/Gemini."""
+    """Local ML symptom analysis. Returns same JSON schema as OpenAI/Gemini.
+
+    The result depends only on the symptom set, onset modifier and duration
+    bucket, so it is served from an LRU/TTL cache when possible. Recommended
+    medicines are filtered against the catalog's generic names afterwards, so
+    catalog updates never invalidate cached predictions and the request never
+    waits for the catalog.
+    """
+    if _symptom_sources_changed():
+        _invalidate_symptom_model()
+
+    canonical_symptoms = sorted(set(symptoms))
+    cache_key = (
+        tuple(canonical_symptoms),
+        "sudden_onset" in modifiers,
+        _duration_bucket(duration_days),
+    )
+    cached = _SYMPTOM_RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        result, lists_symptoms = copy.deepcopy(cached[0]), cached[1]
+    else:
+        result = await _analyze_symptoms_uncached(canonical_symptoms, modifiers, duration_days)
+        if "error" in result:
+            return result
+        lists_symptoms = result["summary"] == _inconclusive_summary(canonical_symptoms)
+        _SYMPTOM_RESULT_CACHE.put(cache_key, (copy.deepcopy(result), lists_symptoms))
+    if lists_symptoms:
+        # The canonical order is only for the cache key; name symptoms as the caller gave them.
+        result["summary"] = _inconclusive_summary(symptoms)
+    return _filter_available_medicines(result, get_available_generic_names())
+
+
+def _inconclusive_summary(symptoms: list[str]) -> str:
+    symptom_names = ", ".join(s.replace("_", " ") for s in symptoms)
+    return f"Your symptoms ({symptom_names}) are common and could have many causes. With just {'one symptom' if len(symptoms) == 1 else 'few symptoms'}, a specific diagnosis is difficult. Please add more symptoms for better accuracy, or visit your nearest PHC."
+
+
+async def _analyze_symptoms_uncached(
+    symptoms: list[str],
+    modifiers: list[str],
+    duration_days: int,
+) -> dict:
     try:
-        predictions = await asyncio.to_thread(_predict_diseases_sync, symptoms, 3)
+        predictions = await _predict_diseases(symptoms, 3)
 
         if not predictions:
             return {
@@ -192,11 +407,10 @@ async def analyze_symptoms_local(
 
         # If top prediction is very weak, treat as inconclusive
         if predictions[0]["probability"] < 0.15:
-            symptom_names = ", ".join(s.replace("_", " ") for s in symptoms)
             return {
                 "possible_conditions": [],
                 "severity": "info",
-                "summary": f"Your symptoms ({symptom_names}) are common and could have many causes. With just {'one symptom' if len(symptoms) == 1 else 'few symptoms'}, a specific diagnosis is difficult. Please add more symptoms for better accuracy, or visit your nearest PHC.",
+                "summary": _inconclusive_summary(symptoms),
                 "recommended_medicines": [],
                 "home_care": [
                     "Rest and stay hydrated",
@@ -250,16 +464,7 @@ async def analyze_symptoms_local(
         if duration_days >= 7 and urgency in ("monitor", "within_week"):
             urgency = "within_24h"
 
-        # Filter medicines against available DB if possible
         recommended_meds = disease_info.get("recommended_medicines", [])
-        if medicines_context and recommended_meds:
-            context_lower = medicines_context.lower()
-            filtered = [
-                m for m in recommended_meds
-                if m["generic_name"].lower() in context_lower
-            ]
-            if filtered:
-                recommended_meds = filtered
 
         return {
             "possible_conditions": possible_conditions,
@@ -303,43 +508,98 @@ async def extract_prescription_local(
 # ─── Voice Transcription ─────────────────────────────────────────────
 
 
+_WHISPER_SAMPLE_RATE = 16000
+_WHISPER_BEAM_SIZE = int(os.getenv("WHISPER_BEAM_SIZE", "5"))
+# Greedy decoding for the streaming endpoint: the first segment arrives sooner.
+_WHISPER_STREAM_BEAM_SIZE = int(os.getenv("WHISPER_STREAM_BEAM_SIZE", "1"))
+
+
+def _decode_audio(audio_bytes: bytes) -> np.ndarray:
+    """Decode an upload to 16 kHz mono float32 PCM in memory (PyAV demuxer, no temp file).
+
+    The container format is detected from the bytes, so the upload's MIME
+    type is not needed.
+    """
+    from faster_whisper import decode_audio
+
+    return decode_audio(io.BytesIO(audio_bytes), sampling_rate=_WHISPER_SAMPLE_RATE)
+
+
+def _is_hindi_text(text: str, detected_lang: str | None) -> bool:
+    return (detected_lang or "en") in ("hi", "ur") or any(0x0900 <= ord(c) <= 0x097F for c in text)
+
+
 def _transcribe_audio_sync(audio_bytes: bytes, mime_type: str) -> dict:
     """Transcribe audio using Whisper, then extract medical terms."""
-    import tempfile
-
     model = _load_whisper_model()
     keywords_data = _load_medical_keywords()
 
-    suffix = ".wav"
-    if "m4a" in mime_type:
-        suffix = ".m4a"
-    elif "mp3" in mime_type:
-        suffix = ".mp3"
-    elif "ogg" in mime_type:
-        suffix = ".ogg"
-    elif "webm" in mime_type:
-        suffix = ".webm"
-
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=True) as tmp:
-        tmp.write(audio_bytes)
-        tmp.flush()
-
-        segments, info = model.transcribe(
-            tmp.name, beam_size=5, language=None, task="transcribe"
-        )
-        full_text = " ".join(seg.text for seg in segments).strip()
+    try:
+        audio = _decode_audio(audio_bytes)
+    except Exception as e:
+        return {"error": f"Could not decode audio: {e}"}
+
+    segments, info = model.transcribe(
+        audio, beam_size=_WHISPER_BEAM_SIZE, language=None, task="transcribe"
+    )
+    full_text = " ".join(seg.text for seg in segments).strip()
 
     if not full_text:
         return {"error": "Could not transcribe any speech from the audio."}
 
-    detected_lang = info.language if info.language else "en"
-    is_hindi = detected_lang in ("hi", "ur") or any(
-        0x0900 <= ord(c) <= 0x097F for c in full_text
+    return _extract_terms_from_text(
+        full_text, keywords_data, is_hindi=_is_hindi_text(full_text, info.language)
     )
 
-    return _extract_terms_from_text(
-        full_text, keywords_data, is_hindi=is_hindi
+
+def _stream_transcription_sync(audio_bytes: bytes, emit, stop: threading.Event) -> None:
+    """Emit one event per decoded Whisper segment, then a final transcription event.
+
+    Segment events carry the symptoms found in the text so far (keywords can
+    span segment boundaries) and which of them are new.
+    """
+    model = _load_whisper_model()
+    keywords_data = _load_medical_keywords()
+
+    try:
+        audio = _decode_audio(audio_bytes)
+    except Exception as e:
+        emit({"type": "error", "error": f"Could not decode audio: {e}"})
+        return
+
+    segments, info = model.transcribe(
+        audio, beam_size=_WHISPER_STREAM_BEAM_SIZE, language=None, task="transcribe"
     )
+    texts: list[str] = []
+    seen: set[str] = set()
+    for seg in segments:  # lazy: each segment is decoded on iteration
+        if stop.is_set():
+            return
+        texts.append(seg.text.strip())
+        text = " ".join(texts)
+        terms = _extract_terms_from_text(text, keywords_data, is_hindi=_is_hindi_text(text, info.language))
+        new_symptoms = [s for s in terms["suggested_symptoms"] if s not in seen]
+        seen.update(new_symptoms)
+        emit({
+            "type": "segment",
+            "start": round(seg.start, 2),
+            "end": round(seg.end, 2),
+            "text": texts[-1],
+            "language": info.language,
+            "new_symptoms": new_symptoms,
+            "suggested_symptoms": terms["suggested_symptoms"],
+        })
+
+    full_text = " ".join(t for t in texts if t)
+    if not full_text:
+        emit({"type": "error", "error": "Could not transcribe any speech from the audio."})
+        return
+    emit({
+        "type": "final",
+        "transcription": _extract_terms_from_text(
+            full_text, keywords_data, is_hindi=_is_hindi_text(full_text, info.language)
+        ),
+    })
 
 
 def _extract_terms_from_text(
@@ -390,6 +650,44 @@ async def transcribe_audio_local(
     return await asyncio.to_thread(_transcribe_audio_sync, audio_bytes, mime_type)
 
 
+async def stream_transcription_local(
+    audio_bytes: bytes, mime_type: str = "audio/wav"
+) -> AsyncIterator[dict]:
+    """Yield transcription events as Whisper decodes segments (see _stream_transcription_sync).
+
+    Decoding runs in a worker thread; closing the iterator (client gone)
+    stops it after the current segment.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def emit(event) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        except RuntimeError:  # loop closed
+            stop.set()
+
+    def run() -> None:
+        try:
+            _stream_transcription_sync(audio_bytes, emit, stop)
+        except Exception as e:
+            emit({"type": "error", "error": f"Local transcription failed: {e}"})
+        finally:
+            emit(finished)
+
+    loop.run_in_executor(None, run)
+    try:
+        while True:
+            event = await queue.get()
+            if event is finished:
+                return
+            yield event
+    finally:
+        stop.set()
+
+
 async def extract_medical_terms_local(text: str, language: str = "hi") -> dict:
     """Extract medical terms from text input (no audio needed)."""
     keywords_data = _load_medical_keywords()
@@ -0,0 +1,207 @@
+"""
+Medicine Catalog — in-process copy of the Supabase medicines table with a
+local search index.
+
+The table is small (thousands of rows) and read-mostly, so it is loaded once
+and searched in memory instead of sending ``ilike '%q%'`` OR-filters to
+Postgres on every lookup:
+
+- Index: substring trigrams over brand, generic, salt and Hindi names. A query
+  of 3+ characters only scans rows containing all of its trigrams; shorter
+  queries scan the (small) catalog directly.
+- Ranking: exact name > name prefix > word prefix > substring, then generic
+  and brand name order.
+- Refresh: stale-while-revalidate. After MEDICINE_CATALOG_REFRESH_SECONDS the
+  current catalog keeps serving while one background task fetches rows with
+  updated_at newer than the last seen value (migration
+  add_medicines_updated_at.sql). Deletions are picked up by a periodic full
+  reload, which is also used when the column does not exist yet.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import os
+import time
+
+from services.db import get_db
+
+logger = logging.getLogger(__name__)
+
+_REFRESH_SECONDS = int(os.getenv("MEDICINE_CATALOG_REFRESH_SECONDS", "300"))
+_FULL_RELOAD_SECONDS = int(os.getenv("MEDICINE_CATALOG_FULL_RELOAD_SECONDS", "3600"))
+_RETRY_SECONDS = 30
+_PAGE_SIZE = 1000
+
+SEARCH_FIELDS = ("brand_name", "generic_name", "salt_composition", "hindi_name")
+_FIELD_POSITION = {field: i for i, field in enumerate(SEARCH_FIELDS)}
+
+
+def _grams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _match_rank(text: str, query: str) -> int | None:
+    if not text or query not in text:
+        return None
+    if text == query:
+        return 0
+    if text.startswith(query):
+        return 1
+    if f" {query}" in text:
+        return 2
+    return 3
+
+
+class MedicineCatalog:
+    """Immutable snapshot of the medicines table. Returned rows are shared; do not mutate."""
+
+    def __init__(self, rows: list[dict]):
+        self.rows = sorted(
+            rows,
+            key=lambda r: ((r.get("generic_name") or "").lower(), (r.get("brand_name") or "").lower()),
+        )
+        self.by_id = {row["id"]: row for row in self.rows if row.get("id") is not None}
+        self._texts = [
+            tuple((row.get(field) or "").strip().lower() for field in SEARCH_FIELDS) for row in self.rows
+        ]
+        postings: dict[str, set[int]] = {}
+        for idx, texts in enumerate(self._texts):
+            for text in texts:
+                for gram in _grams(text):
+                    postings.setdefault(gram, set()).add(idx)
+        self._postings = postings
+        self.generic_names = frozenset(texts[1] for texts in self._texts if texts[1])
+        self.updated_at_high_water = max((str(r["updated_at"]) for r in rows if r.get("updated_at")), default=None)
+        digest = hashlib.sha1()
+        for row in sorted(rows, key=lambda r: str(r.get("id"))):
+            digest.update(json.dumps(row, sort_keys=True, default=str).encode("utf-8"))
+        # Content fingerprint: unchanged data keeps the same version across refreshes.
+        self.version = digest.hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def search(self, query: str, limit: int = 20, fields: tuple[str, ...] = SEARCH_FIELDS) -> list[dict]:
+        """Case-insensitive substring search (same matches as ilike '%query%'), best matches first."""
+        q = query.strip().lower()
+        if not q:
+            return self.rows[:limit]
+        positions = [_FIELD_POSITION[field] for field in fields]
+
+        if len(q) >= 3:
+            posting_sets = sorted((self._postings.get(gram, set()) for gram in _grams(q)), key=len)
+            candidates = set.intersection(*posting_sets) if posting_sets else set()
+        else:
+            candidates = range(len(self.rows))
+
+        ranked: list[tuple[int, int]] = []
+        for idx in candidates:
+            texts = self._texts[idx]
+            ranks = [r for r in (_match_rank(texts[p], q) for p in positions) if r is not None]
+            if ranks:
+                ranked.append((min(ranks), idx))
+        return [self.rows[idx] for _, idx in heapq.nsmallest(limit, ranked)]
+
+    def by_category(self, category: str, limit: int = 50) -> list[dict]:
+        return [row for row in self.rows if row.get("category") == category][:limit]
+
+
+_catalog: MedicineCatalog | None = None
+_checked_at = 0.0
+_full_loaded_at = 0.0
+_next_attempt_at = 0.0
+_refresh_task: asyncio.Task | None = None
+
+
+async def _fetch_rows(updated_since: str | None = None) -> list[dict]:
+    rows: list[dict] = []
+    offset = 0
+    while True:
+        query = get_db().table("medicines").select("*")
+        if updated_since:
+            query = query.gt("updated_at", updated_since)
+        result = await query.order("id").range(offset, offset + _PAGE_SIZE - 1).execute()
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < _PAGE_SIZE:
+            return rows
+        offset += _PAGE_SIZE
+
+
+async def _refresh_catalog() -> None:
+    global _catalog, _checked_at, _full_loaded_at, _next_attempt_at
+    now = time.monotonic()
+    current = _catalog
+    full = (
+        current is None
+        or current.updated_at_high_water is None
+        or now - _full_loaded_at >= _FULL_RELOAD_SECONDS
+    )
+    try:
+        if full:
+            rows = await _fetch_rows()
+        else:
+            changed = await _fetch_rows(updated_since=current.updated_at_high_water)
+            if not changed:
+                _checked_at = now
+                return
+            merged = dict(current.by_id)
+            merged.update({row["id"]: row for row in changed})
+            rows = list(merged.values())
+        catalog = await asyncio.to_thread(MedicineCatalog, rows)
+    except Exception as e:
+        logger.warning("Medicine catalog refresh failed: %s", e)
+        _next_attempt_at = now + _RETRY_SECONDS
+        return
+
+    _catalog = catalog
+    _checked_at = now
+    if full:
+        _full_loaded_at = now
+    logger.info("Medicine catalog %s: %d rows (version %s)", "loaded" if full else "updated", len(catalog), catalog.version)
+
+
+def _start_refresh() -> asyncio.Task:
+    """Single-flight: at most one refresh task runs per event loop."""
+    global _refresh_task
+    loop = asyncio.get_running_loop()
+    if _refresh_task is None or _refresh_task.done() or _refresh_task.get_loop() is not loop:
+        _refresh_task = loop.create_task(_refresh_catalog())
+    return _refresh_task
+
+
+async def get_medicine_catalog() -> MedicineCatalog | None:
+    """Current catalog, or None while it cannot be loaded (callers fall back to DB queries).
+
+    Only the very first load is awaited; later refreshes run in the background.
+    """
+    now = time.monotonic()
+    if _catalog is None:
+        if now < _next_attempt_at:
+            return None
+        await asyncio.shield(_start_refresh())
+        return _catalog
+    if now - _checked_at >= _REFRESH_SECONDS and now >= _next_attempt_at:
+        _start_refresh()
+    return _catalog
+
+
+def peek_medicine_catalog() -> MedicineCatalog | None:
+    """Current catalog without waiting for a load; a missing or stale one is refreshed in the background."""
+    now = time.monotonic()
+    if (_catalog is None or now - _checked_at >= _REFRESH_SECONDS) and now >= _next_attempt_at:
+        _start_refresh()
+    return _catalog
+
+
+def get_catalog_stats() -> dict:
+    catalog = _catalog
+    return {
+        "loaded": catalog is not None,
+        "rows": len(catalog) if catalog is not None else 0,
+        "version": catalog.version if catalog is not None else None,
+        "age_seconds": round(time.monotonic() - _checked_at, 1) if catalog is not None else None,
+    }
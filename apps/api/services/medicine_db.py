@@ -1,23 +1,35 @@
 """
 Medicine Database Service — queries Supabase medicines table.
 
-All public functions are async. Since supabase-py is synchronous,
-DB calls are offloaded via asyncio.to_thread to avoid blocking the event loop.
+All public functions are async. Lookups are served from the in-memory
+catalog (services.medicine_catalog); while it is unavailable they query
+through the shared async PostgREST client (services.db) instead.
 """
 
 import asyncio
+import hashlib
+import logging
 import os
-import threading
 import time
-from services.auth import get_supabase_client
+from services.db import get_db
+from services.medicine_catalog import get_medicine_catalog, peek_medicine_catalog
 
-_MEDICINE_CACHE_LOCK = threading.Lock()
-_MEDICINE_NAMES_CACHE: dict[str, str | float | None] = {"value": None, "expires_at": 0.0}
-_MEDICINE_NAMES_TTL_SECONDS = int(os.getenv("MEDICINE_NAMES_CACHE_TTL_SECONDS", "600"))
+# Per-name result cap for batch lookups against the local catalog.
+_NAME_LOOKUP_LIMIT = 10
+_NAME_LOOKUP_FIELDS = ("brand_name", "generic_name", "salt_composition")
 
+logger = logging.getLogger(__name__)
 
-def _get_client():
-    return get_supabase_client()
+_MEDICINE_NAMES_CACHE: dict[str, str | float | None] = {
+    "value": None,
+    "version": None,
+    "catalog_version": None,
+    "fetched_at": 0.0,
+}
+_MEDICINE_NAMES_TTL_SECONDS = int(os.getenv("MEDICINE_NAMES_CACHE_TTL_SECONDS", "600"))
+_MEDICINE_NAMES_LIMIT = 500
+_names_refresh_task: asyncio.Task | None = None
+_prewarm_task: asyncio.Task | None = None
 
 
 def _escape_ilike(s: str) -> str:
@@ -25,11 +37,15 @@ def _escape_ilike(s: str) -> str:
     return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 
-def _search_medicines_sync(query: str, limit: int) -> list[dict]:
-    client = _get_client()
+async def search_medicines(query: str, limit: int = 20) -> list[dict]:
+    """Search medicines by brand name, generic name, or salt composition."""
+    catalog = await get_medicine_catalog()
+    if catalog is not None:
+        return catalog.search(query, limit)
+
     q = _escape_ilike(query.strip().lower())
-    result = (
-        client.table("medicines")
+    result = await (
+        get_db().table("medicines")
         .select("*")
         .or_(
             f"brand_name.ilike.%{q}%,"
@@ -43,25 +59,28 @@ def _search_medicines_sync(query: str, limit: int) -> list[dict]:
     return result.data or []
 
 
-async def search_medicines(query: str, limit: int = 20) -> list[dict]:
-    """Search medicines by brand name, generic name, or salt composition."""
-    return await asyncio.to_thread(_search_medicines_sync, query, limit)
-
+async def get_medicine_by_id(medicine_id: str) -> dict | None:
+    """Get a single medicine by ID."""
+    catalog = await get_medicine_catalog()
+    if catalog is not None:
+        return catalog.by_id.get(medicine_id)
 
-def _get_medicine_by_id_sync(medicine_id: str) -> dict | None:
-    client = _get_client()
-    result = client.table("medicines").select("*").eq("id", medicine_id).single().execute()
+    result = await get_db().table("medicines").select("*").eq("id", medicine_id).single().execute()
     return result.data
 
 
-async def get_medicine_by_id(medicine_id: str) -> dict | None:
-    """Get a single medicine by ID."""
-    return await asyncio.to_thread(_get_medicine_by_id_sync, medicine_id)
-
+async def get_medicines_by_names(names: list[str]) -> list[dict]:
+    """Look up medicines by a list of brand/generic names (local catalog, else one batch query)."""
+    catalog = await get_medicine_catalog()
+    if catalog is not None:
+        matches: dict[str, dict] = {}
+        for name in names:
+            if not name.strip():
+                continue
+            for row in catalog.search(name, _NAME_LOOKUP_LIMIT, fields=_NAME_LOOKUP_FIELDS):
+                matches.setdefault(row["id"], row)
+        return list(matches.values())
 
-def _get_medicines_by_names_sync(names: list[str]) -> list[dict]:
-    """Single-query batch lookup instead of N sequential queries."""
-    client = _get_client()
     # Build a single OR filter for all names
     conditions = []
     for name in names:
@@ -74,8 +93,8 @@ def _get_medicines_by_names_sync(names: list[str]) -> list[dict]:
     if not conditions:
         return []
 
-    result = (
-        client.table("medicines")
+    result = await (
+        get_db().table("medicines")
         .select("*")
         .or_(",".join(conditions))
         .limit(50)
@@ -84,15 +103,14 @@ def _get_medicines_by_names_sync(names: list[str]) -> list[dict]:
     return result.data or []
 
 
-async def get_medicines_by_names(names: list[str]) -> list[dict]:
-    """Look up medicines by a list of brand/generic names (single batch query)."""
-    return await asyncio.to_thread(_get_medicines_by_names_sync, names)
-
+async def get_medicines_by_category(category: str, limit: int = 50) -> list[dict]:
+    """Get medicines filtered by category."""
+    catalog = await get_medicine_catalog()
+    if catalog is not None:
+        return catalog.by_category(category, limit)
 
-def _get_medicines_by_category_sync(category: str, limit: int) -> list[dict]:
-    client = _get_client()
-    result = (
-        client.table("medicines")
+    result = await (
+        get_db().table("medicines")
         .select("*")
         .eq("category", category)
         .order("generic_name")
@@ -102,46 +120,92 @@ def _get_medicines_by_category_sync(category: str, limit: int) -> list[dict]:
     return result.data or []
 
 
-async def get_medicines_by_category(category: str, limit: int = 50) -> list[dict]:
-    """Get medicines filtered by category."""
-    return await asyncio.to_thread(_get_medicines_by_category_sync, category, limit)
+def _format_medicine_names(rows: list[dict]) -> str:
+    if not rows:
+        return "No medicines in database"
+    lines = []
+    for m in rows[:_MEDICINE_NAMES_LIMIT]:
+        line = f"- {m['generic_name']} ({m['brand_name']}) {m.get('strength', '')} {m.get('dosage_form', '')} [{m.get('category', '')}]"
+        lines.append(line)
+    return "\n".join(lines)
 
 
-def _get_all_medicine_names_sync() -> str:
-    client = _get_client()
-    result = (
-        client.table("medicines")
+async def _fetch_all_medicine_names() -> str:
+    result = await (
+        get_db().table("medicines")
         .select("generic_name, brand_name, strength, dosage_form, category")
         .order("generic_name")
-        .limit(500)
+        .limit(_MEDICINE_NAMES_LIMIT)
         .execute()
     )
-    if not result.data:
-        return "No medicines in database"
+    return _format_medicine_names(result.data or [])
 
-    lines = []
-    for m in result.data:
-        line = f"- {m['generic_name']} ({m['brand_name']}) {m.get('strength', '')} {m.get('dosage_form', '')} [{m.get('category', '')}]"
-        lines.append(line)
-    return "\n".join(lines)
+
+async def _refresh_medicine_names() -> None:
+    try:
+        value = await _fetch_all_medicine_names()
+    except Exception as e:
+        logger.warning("Medicine prompt context refresh failed: %s", e)
+        _MEDICINE_NAMES_CACHE["fetched_at"] = time.monotonic()  # retry after the TTL, keep serving stale
+        return
+    _store_medicine_names(value)
+
+
+def _store_medicine_names(value: str, catalog_version: str | None = None) -> None:
+    if value != _MEDICINE_NAMES_CACHE["value"]:
+        _MEDICINE_NAMES_CACHE["value"] = value
+        _MEDICINE_NAMES_CACHE["version"] = hashlib.sha1(value.encode("utf-8")).hexdigest()[:16]
+    _MEDICINE_NAMES_CACHE["catalog_version"] = catalog_version
+    _MEDICINE_NAMES_CACHE["fetched_at"] = time.monotonic()
+
+
+def _start_names_refresh() -> asyncio.Task:
+    global _names_refresh_task
+    loop = asyncio.get_running_loop()
+    if _names_refresh_task is None or _names_refresh_task.done() or _names_refresh_task.get_loop() is not loop:
+        _names_refresh_task = loop.create_task(_refresh_medicine_names())
+    return _names_refresh_task
 
 
 async def get_all_medicine_names() -> str:
-    """Get a compact list of all medicines for Gemini prompt context."""
-    now = time.time()
-    with _MEDICINE_CACHE_LOCK:
-        cached_value = _MEDICINE_NAMES_CACHE.get("value")
-        expires_at = float(_MEDICINE_NAMES_CACHE.get("expires_at") or 0.0)
-        if isinstance(cached_value, str) and now < expires_at:
-            return cached_value
-
-    value = await asyncio.to_thread(_get_all_medicine_names_sync)
-
-    with _MEDICINE_CACHE_LOCK:
-        # Double-check: another thread may have refreshed while we waited
-        expires_at = float(_MEDICINE_NAMES_CACHE.get("expires_at") or 0.0)
-        if now >= expires_at:
-            _MEDICINE_NAMES_CACHE["value"] = value
-            _MEDICINE_NAMES_CACHE["expires_at"] = time.time() + _MEDICINE_NAMES_TTL_SECONDS
-
-    return value
+    """Get a compact list of all medicines for Gemini prompt context.
+
+    Built from the in-memory catalog and re-rendered only when the catalog
+    version changes; the returned text (and its version) only changes when
+    the rendered medicines do. Without a catalog, the remote query result is served
+    stale-while-revalidate: one background refresh after the TTL, and only
+    the very first call waits for the fetch.
+    """
+    catalog = await get_medicine_catalog()
+    if catalog is not None:
+        if _MEDICINE_NAMES_CACHE["catalog_version"] != catalog.version:
+            _store_medicine_names(_format_medicine_names(catalog.rows), catalog.version)
+        return _MEDICINE_NAMES_CACHE["value"]
+
+    if _MEDICINE_NAMES_CACHE["value"] is None:
+        await asyncio.shield(_start_names_refresh())
+        return _MEDICINE_NAMES_CACHE["value"] or "No medicines in database"
+    if time.monotonic() - _MEDICINE_NAMES_CACHE["fetched_at"] >= _MEDICINE_NAMES_TTL_SECONDS:
+        _start_names_refresh()
+    return _MEDICINE_NAMES_CACHE["value"]
+
+
+def get_available_generic_names() -> frozenset[str] | None:
+    """Lower-cased generic names in the catalog, or None until it has loaded.
+
+    Never waits on the database: the local symptom model uses this on its
+    request path and skips filtering while the catalog is unavailable.
+    """
+    catalog = peek_medicine_catalog()
+    return catalog.generic_names if catalog is not None else None
+
+
+def prewarm_medicine_context() -> None:
+    """Load the catalog and render the prompt context in the background (app startup)."""
+    global _prewarm_task
+    _prewarm_task = asyncio.get_running_loop().create_task(get_all_medicine_names())
+
+
+def get_medicine_names_version() -> str | None:
+    """Version of the current prompt context; changes only when its text changes."""
+    return _MEDICINE_NAMES_CACHE["version"]
@@ -4,10 +4,20 @@ OpenAI Service — handles symptom analysis and prescription OCR via OpenAI (GPT
 
 import os
 from openai import AsyncOpenAI
-from services.ai_models import get_cloud_model_for_task, parse_json_response as _parse_json_response
+from services.ai_models import (
+    ProviderLimiter,
+    get_cloud_model_for_task,
+    parse_json_response as _parse_json_response,
+)
+from services.prompt_context import record_prompt_tokens
 
 _client = None
 _client_key = None
+_limiter = ProviderLimiter(
+    "OpenAI",
+    max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "8")),
+    timeout_s=float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30")),
+)
 
 
 def _get_client():
@@ -18,7 +28,7 @@ def _get_client():
         _client_key = None
         return None
     if _client is None or _client_key != key:
-        _client = AsyncOpenAI(api_key=key)
+        _client = AsyncOpenAI(api_key=key, timeout=_limiter.timeout_s)
         _client_key = key
     return _client
 
@@ -94,7 +104,7 @@ Respond ONLY with valid JSON in this exact format:
     try:
         model_name = get_cloud_model_for_task("symptom_analysis", "openai")
 
-        response = await client.chat.completions.create(
+        response = await _limiter.call(lambda: client.chat.completions.create(
             model=model_name,
             messages=[
                 {"role": "system", "content": "You are a helpful medical assistant for rural India. You output only valid JSON."},
@@ -102,7 +112,8 @@ Respond ONLY with valid JSON in this exact format:
             ],
             response_format={"type": "json_object"},
             temperature=0.2,
-        )
+        ))
+        record_prompt_tokens("openai", getattr(getattr(response, "usage", None), "prompt_tokens", None))
         content = response.choices[0].message.content
         return _parse_json_response(content)
     except Exception as e:
@@ -169,7 +180,7 @@ If you cannot read the prescription clearly, still try your best and add a "conf
     try:
         model_name = get_cloud_model_for_task("prescription_ocr", "openai")
 
-        response = await client.chat.completions.create(
+        response = await _limiter.call(lambda: client.chat.completions.create(
             model=model_name,
             messages=[
                 {
@@ -181,7 +192,7 @@ If you cannot read the prescription clearly, still try your best and add a "conf
                 }
             ],
             max_tokens=1000,
-        )
+        ))
         content = response.choices[0].message.content
         return _parse_json_response(content)
     except Exception as e:
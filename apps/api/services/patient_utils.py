@@ -1,22 +1,122 @@
 """Shared patient lookup utilities."""
 
-from supabase import Client
+import asyncio
+import os
 
+from postgrest import AsyncPostgrestClient
+from postgrest.exceptions import APIError
 
-def get_or_create_self_patient(
-    supabase: Client,
+from services.cache import LRUCache
+
+_SELF_PATIENT_CACHE = LRUCache(
+    max_size=int(os.getenv("SELF_PATIENT_CACHE_MAX_ENTRIES", "10000")),
+    ttl_seconds=int(os.getenv("SELF_PATIENT_CACHE_TTL_SECONDS", "3600")),
+)
+# Self-patient ids found stale (row deleted/recreated) -> the id that replaced them,
+# so every queued write still carrying the old id can be repaired.
+_REPLACED_SELF_PATIENTS = LRUCache(max_size=1000, ttl_seconds=_SELF_PATIENT_CACHE.ttl_seconds)
+_inflight: dict[str, asyncio.Future] = {}
+# None until the first call tells us whether the upsert RPC migration is applied.
+_upsert_rpc_available: bool | None = None
+
+
+async def get_or_create_self_patient(
+    db: AsyncPostgrestClient,
     user_id: str,
     age: int | None = None,
     gender: str | None = None,
 ) -> str | None:
     """Find or create a 'self' patient record for the given user.
 
-    Returns the patient_id, or None if creation failed.
+    Returns the patient_id, or None if creation failed. Ids are cached per user;
+    concurrent first calls for the same user share one lookup (single-flight).
+    """
+    cached = _SELF_PATIENT_CACHE.get(user_id)
+    if cached is not None:
+        return cached
+
+    pending = _inflight.get(user_id)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[user_id] = future
+    try:
+        patient_id = await _resolve_self_patient(db, user_id, age, gender)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Mark retrieved when no other caller is waiting.
+        raise
+    finally:
+        _inflight.pop(user_id, None)
+
+    if patient_id:
+        _SELF_PATIENT_CACHE.put(user_id, patient_id)
+    future.set_result(patient_id)
+    return patient_id
+
+
+def invalidate_self_patient(user_id: str) -> None:
+    """Forget a cached id (e.g. after the patient row was deleted)."""
+    _SELF_PATIENT_CACHE.pop(user_id)
+
+
+async def replace_stale_self_patient(db: AsyncPostgrestClient, user_id: str, stale_patient_id: str) -> str | None:
+    """New self-patient id for a write rejected because ``stale_patient_id`` no longer exists.
+
+    Only ids this process handed out as the user's self patient are replaced; any
+    other patient id (a family member's) returns None so the write is not moved.
     """
+    replacement = _REPLACED_SELF_PATIENTS.get(stale_patient_id)
+    if replacement is not None:
+        return replacement
+    if _SELF_PATIENT_CACHE.get(user_id) != stale_patient_id:
+        return None
+    invalidate_self_patient(user_id)
+    patient_id = await get_or_create_self_patient(db, user_id)
+    if not patient_id or patient_id == stale_patient_id:
+        return None
+    _REPLACED_SELF_PATIENTS.put(stale_patient_id, patient_id)
+    return patient_id
+
+
+async def _resolve_self_patient(
+    db: AsyncPostgrestClient,
+    user_id: str,
+    age: int | None,
+    gender: str | None,
+) -> str | None:
+    global _upsert_rpc_available
+    if _upsert_rpc_available is not False:
+        try:
+            # Insert-or-select in one round trip (migration add_self_patient_upsert.sql).
+            res = await db.rpc(
+                "get_or_create_self_patient",
+                {"p_user_id": user_id, "p_age": age, "p_gender": gender},
+            ).execute()
+            _upsert_rpc_available = True
+            return res.data or None
+        except APIError as e:
+            if e.code != "PGRST202":  # PostgREST: function not found
+                raise
+            _upsert_rpc_available = False
+    return await _find_or_create_self_patient(db, user_id, age, gender)
+
+
+async def _find_or_create_self_patient(
+    db: AsyncPostgrestClient,
+    user_id: str,
+    age: int | None,
+    gender: str | None,
+) -> str | None:
+    """Multi-query path for databases without the upsert function."""
     # Preferred lookup: explicit self-profile marker.
     try:
-        res = (
-            supabase.table("patients")
+        res = await (
+            db.table("patients")
             .select("id")
             .eq("created_by", user_id)
             .eq("is_self_profile", True)
@@ -30,8 +130,8 @@ def get_or_create_self_patient(
         pass
 
     # Backward compatibility: promote legacy rows named "My Health Profile".
-    legacy_res = (
-        supabase.table("patients")
+    legacy_res = await (
+        db.table("patients")
         .select("id")
         .eq("created_by", user_id)
         .eq("name", "My Health Profile")
@@ -41,7 +141,7 @@ def get_or_create_self_patient(
     if legacy_res.data:
         patient_id = legacy_res.data[0]["id"]
         try:
-            supabase.table("patients").update(
+            await db.table("patients").update(
                 {"is_self_profile": True, "user_id": user_id}
             ).eq("id", patient_id).execute()
         except Exception:
@@ -61,7 +161,7 @@ def get_or_create_self_patient(
         new_patient["gender"] = gender
 
     try:
-        create_res = supabase.table("patients").insert(new_patient).execute()
+        create_res = await db.table("patients").insert(new_patient).execute()
     except Exception:
         # Backward compatibility before self-profile migration is applied.
         fallback_payload = {
@@ -72,7 +172,7 @@ def get_or_create_self_patient(
             fallback_payload["age"] = age
         if gender is not None:
             fallback_payload["gender"] = gender
-        create_res = supabase.table("patients").insert(fallback_payload).execute()
+        create_res = await db.table("patients").insert(fallback_payload).execute()
     if create_res.data:
         return create_res.data[0]["id"]
     return None
@@ -4,24 +4,33 @@ Prescription OCR Service
 Local OCR pipeline for prescriptions:
 1) page pre-processing
 2) line segmentation
-3) recognizer inference (TrOCR when available, Tesseract fallback)
+3) recognizer inference (TrOCR via ONNX Runtime or PyTorch when available, Tesseract fallback)
 4) structured parsing + medicine normalization
 """
 
 from __future__ import annotations
 
+import bisect
+import hashlib
 import io
 import json
+import logging
+import math
 import os
 import re
 import shutil
+import threading
 from dataclasses import dataclass
-from difflib import SequenceMatcher
 from pathlib import Path
 
 import numpy as np
 from PIL import Image, ImageEnhance, ImageOps
 
+from services.cache import LRUCache
+from services.fuzzy_index import TrigramIndex
+
+logger = logging.getLogger(__name__)
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 ROOT_DIR = BASE_DIR.parent.parent
 SEED_MEDICINES_SQL = ROOT_DIR / "supabase" / "seed-medicines.sql"
@@ -39,15 +48,27 @@ DEFAULT_MIN_CONFIDENCE = float(os.getenv("PRESCRIPTION_OCR_MIN_CONFIDENCE", "0.4
 DEFAULT_TROCR_MIN_EPOCHS = int(os.getenv("PRESCRIPTION_OCR_MIN_TROCR_EPOCHS", "5"))
 DEFAULT_TROCR_BATCH_SIZE = max(1, int(os.getenv("PRESCRIPTION_OCR_BATCH_SIZE", "8")))
 DEFAULT_TROCR_MAX_NEW_TOKENS = int(os.getenv("PRESCRIPTION_OCR_MAX_NEW_TOKENS", "48"))
+DEFAULT_ONNX_THREADS = max(0, int(os.getenv("PRESCRIPTION_OCR_ONNX_THREADS", "0")))
+DEFAULT_NAME_CACHE_SIZE = max(1, int(os.getenv("PRESCRIPTION_OCR_NAME_CACHE_SIZE", "10000")))
+DEFAULT_NAME_CACHE_PATH = os.getenv("PRESCRIPTION_OCR_NAME_CACHE_PATH", "").strip()
+DEFAULT_MIN_SIDE = 1600
+DEFAULT_MAX_SIDE = max(DEFAULT_MIN_SIDE, int(os.getenv("PRESCRIPTION_OCR_MAX_SIDE", "2400")))
+DEFAULT_SEGMENT_MAX_SIDE = max(400, int(os.getenv("PRESCRIPTION_OCR_SEGMENT_MAX_SIDE", "1200")))
 
 _MEDICINE_LEXICON: list[str] | None = None
 _MEDICINE_NORMALIZED: dict[str, str] | None = None
-_MEDICINE_CANONICAL_PAIRS: list[tuple[str, str]] | None = None
-_NAME_NORMALIZATION_CACHE: dict[str, str] = {}
+_MEDICINE_INDEX: TrigramIndex | None = None
+_MEDICINE_LEXICON_FINGERPRINT: str | None = None
+# Fuzzy-match results keyed by normalized token; exact lexicon hits never enter it.
+_NAME_NORMALIZATION_CACHE = LRUCache(DEFAULT_NAME_CACHE_SIZE)
 _TROCR_PROCESSOR = None
 _TROCR_MODEL = None
 _TROCR_MODEL_ID = None
 _TROCR_DEVICE = None
+_TROCR_ONNX_RUNTIME = None
+_TROCR_ONNX_RUNTIME_ID = None
+_TESSEROCR_AVAILABLE: bool | None = None
+_TESSERACT_ENGINES = threading.local()
 
 
 def _resolve_path(path_value: str) -> Path:
@@ -57,6 +78,20 @@ def _resolve_path(path_value: str) -> Path:
     return BASE_DIR / candidate
 
 
+def _onnx_component_paths(model_artifact: Path) -> tuple[Path, Path, Path]:
+    """Encoder artifact plus the sibling decoder graphs written by the ONNX export script."""
+    stem = model_artifact.with_suffix("")
+    return (
+        model_artifact,
+        stem.with_name(f"{stem.name}_decoder.onnx"),
+        stem.with_name(f"{stem.name}_decoder_with_past.onnx"),
+    )
+
+
+def _onnx_artifacts_present() -> bool:
+    return all(path.exists() for path in _onnx_component_paths(_resolve_path(DEFAULT_OCR_MODEL_PATH)))
+
+
 def get_ocr_model_status() -> dict:
     model_artifact = _resolve_path(DEFAULT_OCR_MODEL_PATH)
     model_dir = _resolve_path(DEFAULT_OCR_MODEL_DIR)
@@ -64,9 +99,11 @@ def get_ocr_model_status() -> dict:
         "preferred_engine": DEFAULT_OCR_ENGINE,
         "model_artifact_path": str(model_artifact),
         "model_artifact_exists": model_artifact.exists(),
+        "onnx_decoder_exists": _onnx_artifacts_present(),
         "model_dir_path": str(model_dir),
         "model_dir_exists": model_dir.exists(),
-        "tesseract_available": shutil.which("tesseract") is not None,
+        "tesseract_available": shutil.which("tesseract") is not None or _tesserocr_available(),
+        "tesseract_persistent_engine": _tesserocr_available(),
     }
 
 
@@ -74,14 +111,14 @@ def _normalize_token(value: str) -> str:
     return re.sub(r"[^a-z0-9]+", " ", value.lower()).strip()
 
 
-def _load_medicine_lexicon() -> tuple[list[str], dict[str, str], list[tuple[str, str]]]:
-    global _MEDICINE_LEXICON, _MEDICINE_NORMALIZED, _MEDICINE_CANONICAL_PAIRS
+def _load_medicine_lexicon() -> tuple[list[str], dict[str, str], TrigramIndex]:
+    global _MEDICINE_LEXICON, _MEDICINE_NORMALIZED, _MEDICINE_INDEX, _MEDICINE_LEXICON_FINGERPRINT
     if (
         _MEDICINE_LEXICON is not None
         and _MEDICINE_NORMALIZED is not None
-        and _MEDICINE_CANONICAL_PAIRS is not None
+        and _MEDICINE_INDEX is not None
     ):
-        return _MEDICINE_LEXICON, _MEDICINE_NORMALIZED, _MEDICINE_CANONICAL_PAIRS
+        return _MEDICINE_LEXICON, _MEDICINE_NORMALIZED, _MEDICINE_INDEX
 
     names: list[str] = []
     normalized: dict[str, str] = {}
@@ -103,113 +140,188 @@ def _load_medicine_lexicon() -> tuple[list[str], dict[str, str], list[tuple[str,
 
     _MEDICINE_LEXICON = sorted(set(names))
     _MEDICINE_NORMALIZED = normalized
-    _MEDICINE_CANONICAL_PAIRS = [
+    _MEDICINE_INDEX = TrigramIndex(
         (candidate, _normalize_token(candidate)) for candidate in _MEDICINE_LEXICON
-    ]
-    return _MEDICINE_LEXICON, _MEDICINE_NORMALIZED, _MEDICINE_CANONICAL_PAIRS
+    )
+    _MEDICINE_LEXICON_FINGERPRINT = hashlib.sha1("\n".join(_MEDICINE_LEXICON).encode("utf-8")).hexdigest()
+    if DEFAULT_NAME_CACHE_PATH:
+        # Persisted matches are only valid for the lexicon they were computed against.
+        _NAME_NORMALIZATION_CACHE.load(_resolve_path(DEFAULT_NAME_CACHE_PATH), meta=_MEDICINE_LEXICON_FINGERPRINT)
+    return _MEDICINE_LEXICON, _MEDICINE_NORMALIZED, _MEDICINE_INDEX
+
+
+def save_name_normalization_cache() -> int:
+    """Persist the name normalization cache to PRESCRIPTION_OCR_NAME_CACHE_PATH (if configured)."""
+    if not DEFAULT_NAME_CACHE_PATH or _MEDICINE_LEXICON_FINGERPRINT is None:
+        return 0
+    try:
+        return _NAME_NORMALIZATION_CACHE.save(
+            _resolve_path(DEFAULT_NAME_CACHE_PATH), meta=_MEDICINE_LEXICON_FINGERPRINT
+        )
+    except OSError:
+        return 0
+
+
+def get_name_cache_stats() -> dict:
+    return _NAME_NORMALIZATION_CACHE.stats()
+
+
+def _plausible_medicine_match(token: str, candidate_token: str) -> bool:
+    if token[0] != candidate_token[0]:
+        return False
+    return abs(len(candidate_token) - len(token)) <= max(6, int(len(candidate_token) * 0.45))
+
+
+def suggest_medicine_names(name: str, k: int = 5) -> list[tuple[str, float]]:
+    """Top-k lexicon entries for a (possibly misspelled) medicine name, with similarity scores."""
+    _, _, index = _load_medicine_lexicon()
+    return index.search(_normalize_token(name or ""), k=k, candidate_filter=_plausible_medicine_match)
 
 
 def _normalize_medicine_name(name: str) -> str:
-    _, normalized, canonical_pairs = _load_medicine_lexicon()
+    _, normalized, index = _load_medicine_lexicon()
     if not name:
         return name
 
     token = _normalize_token(name)
-    if token in _NAME_NORMALIZATION_CACHE:
-        return _NAME_NORMALIZATION_CACHE[token]
     if token in normalized:
-        result = normalized[token]
-        _NAME_NORMALIZATION_CACHE[token] = result
-        return result
+        return normalized[token]
+    cached = _NAME_NORMALIZATION_CACHE.get(token)
+    if cached is not None:
+        return cached
 
-    best = ""
-    best_score = 0.0
-    for candidate, candidate_token in canonical_pairs:
-        if not candidate_token:
-            continue
-        if token and candidate_token and token[0] != candidate_token[0]:
-            continue
-        if abs(len(candidate_token) - len(token)) > max(6, int(len(candidate_token) * 0.45)):
-            continue
-        score = SequenceMatcher(None, token, candidate_token).ratio()
-        if score > best_score:
-            best = candidate
-            best_score = score
+    matches = index.search(token, k=1, candidate_filter=_plausible_medicine_match)
+    best, best_score = matches[0] if matches else ("", 0.0)
     token_count = len(token.split())
     threshold = 0.74 if token_count == 1 else 0.82
     result = best if best_score >= threshold else name.strip()
-    if len(_NAME_NORMALIZATION_CACHE) >= 10_000:
-        _NAME_NORMALIZATION_CACHE.clear()
-    _NAME_NORMALIZATION_CACHE[token] = result
+    _NAME_NORMALIZATION_CACHE.put(token, result)
     return result
 
 
 def preprocess_prescription_page(image_bytes: bytes) -> Image.Image:
-    """Prepare page image for line segmentation and OCR."""
+    """Prepare page image for line segmentation and OCR.
+
+    The longest side is kept between DEFAULT_MIN_SIDE and DEFAULT_MAX_SIDE. Large
+    JPEGs are decoded directly at a reduced scale (DCT draft mode) in grayscale,
+    so full-resolution phone photos are never materialized.
+    """
     img = Image.open(io.BytesIO(image_bytes))
+    width, height = img.size
+    if img.format == "JPEG" and max(width, height) > DEFAULT_MAX_SIDE:
+        ratio = DEFAULT_MAX_SIDE / max(width, height)
+        # Draft picks the smallest 1/2, 1/4 or 1/8 scale that is still >= the requested size.
+        img.draft("L", (math.ceil(width * ratio), math.ceil(height * ratio)))
     img = ImageOps.exif_transpose(img).convert("L")
 
-    # Upscale low-resolution images for better OCR.
     width, height = img.size
-    if max(width, height) < 1600:
-        scale = 1600 / max(width, height)
+    longest = max(width, height)
+    if longest < DEFAULT_MIN_SIDE:
+        # Upscale low-resolution images for better OCR.
+        scale = DEFAULT_MIN_SIDE / longest
         img = img.resize((int(width * scale), int(height * scale)))
+    elif longest > DEFAULT_MAX_SIDE:
+        scale = DEFAULT_MAX_SIDE / longest
+        img = img.resize(
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            Image.BILINEAR,
+            reducing_gap=2.0,
+        )
 
     # Mild contrast boost preserves character edges better than aggressive denoising.
     img = ImageEnhance.Contrast(img).enhance(1.15)
     return img
 
 
+def _segmentation_working_image(page: Image.Image) -> tuple[Image.Image, int]:
+    """Integer-reduced copy of the page for segmentation, plus the reduction factor."""
+    factor = max(1, max(page.size) // DEFAULT_SEGMENT_MAX_SIDE)
+    if factor == 1:
+        return page, 1
+    return page.reduce(factor), factor
+
+
+def _ink_threshold(arr: np.ndarray) -> int:
+    """mean + 0.5*std of the page (capped at 220), using exact integer sums for uint8 input."""
+    if arr.dtype != np.uint8:
+        return min(220, int(float(arr.mean()) + float(arr.std()) * 0.5))
+    squares = arr.astype(np.uint16)
+    squares *= squares
+    mean = int(arr.sum(dtype=np.uint64)) / arr.size
+    variance = max(0.0, int(squares.sum(dtype=np.uint64)) / arr.size - mean * mean)
+    return min(220, int(mean + variance ** 0.5 * 0.5))
+
+
+def _active_runs(active: np.ndarray, min_length: int) -> tuple[np.ndarray, np.ndarray]:
+    """Start/end (exclusive) indices of True runs at least `min_length` long."""
+    edges = np.diff(np.concatenate(([0], active.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = (ends - starts) >= min_length
+    return starts[keep], ends[keep]
+
+
+def _merge_close_runs(starts: np.ndarray, ends: np.ndarray, max_gap: int) -> tuple[np.ndarray, np.ndarray]:
+    """Merge consecutive runs separated by at most `max_gap` inactive rows."""
+    if len(starts) <= 1:
+        return starts, ends
+    breaks = (starts[1:] - ends[:-1]) > max_gap
+    return starts[np.concatenate(([True], breaks))], ends[np.concatenate((breaks, [True]))]
+
+
+def _line_column_bounds(
+    text_mask: np.ndarray,
+    y0: np.ndarray,
+    y1: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-line horizontal text extent [first, last] from column counts inside each line band."""
+    mask_u8 = text_mask.view(np.uint8)
+    band_counts = np.stack(
+        [mask_u8[top:bottom].sum(axis=0, dtype=np.uint32) for top, bottom in zip(y0, y1)]
+    )
+    min_pixels = np.maximum(1, ((y1 - y0) * 0.02).astype(np.int64))[:, None]
+    text_cols = band_counts >= min_pixels
+
+    has_text = text_cols.any(axis=1)
+    first = text_cols.argmax(axis=1)
+    last = text_mask.shape[1] - 1 - text_cols[:, ::-1].argmax(axis=1)
+    return has_text, first, last
+
+
 def segment_prescription_lines(preprocessed: Image.Image) -> list[Image.Image]:
-    """Segment a prescription page into line crops using projection profiles."""
-    arr = np.array(preprocessed)
+    """Segment a prescription page into line crops using projection profiles.
+
+    Profiles are computed on a reduced working copy; line boxes are scaled back
+    by the reduction factor so crops keep the page's recognition resolution.
+    """
+    working, factor = _segmentation_working_image(preprocessed)
+    arr = np.asarray(working)
     if arr.ndim == 3:
         arr = arr[:, :, 0]
 
-    threshold = min(220, int(float(arr.mean()) + float(arr.std()) * 0.5))
+    threshold = _ink_threshold(arr)
     text_mask = arr < threshold
-    row_density = text_mask.mean(axis=1)
-    active = row_density > 0.01
-
-    segments: list[tuple[int, int]] = []
-    start = None
-    for i, is_active in enumerate(active):
-        if is_active and start is None:
-            start = i
-        elif not is_active and start is not None:
-            if i - start >= 8:
-                segments.append((start, i))
-            start = None
-    if start is not None and len(active) - start >= 8:
-        segments.append((start, len(active)))
-
-    merged: list[tuple[int, int]] = []
-    for seg in segments:
-        if not merged:
-            merged.append(seg)
-            continue
-        prev_s, prev_e = merged[-1]
-        s, e = seg
-        if s - prev_e <= 8:
-            merged[-1] = (prev_s, e)
-        else:
-            merged.append(seg)
-
-    if not merged:
+    active = np.count_nonzero(text_mask, axis=1) > arr.shape[1] * 0.01
+
+    # Run-length limits are defined in page pixels (8px) and converted to working pixels.
+    min_run = max(2, 8 // factor)
+    starts, ends = _active_runs(active, min_length=min_run)
+    starts, ends = _merge_close_runs(starts, ends, max_gap=min_run)
+    if not len(starts):
         return [preprocessed]
 
-    line_images: list[Image.Image] = []
-    col_density = text_mask.mean(axis=0)
-    cols = np.where(col_density > 0.002)[0]
-    x0 = int(max(0, cols[0] - 10)) if len(cols) else 0
-    x1 = int(min(arr.shape[1], cols[-1] + 10)) if len(cols) else arr.shape[1]
+    has_text, first, last = _line_column_bounds(text_mask, starts, ends)
 
-    for s, e in merged:
-        y0 = max(0, s - 4)
-        y1 = min(arr.shape[0], e + 4)
-        line_images.append(preprocessed.crop((x0, y0, x1, y1)))
+    page_width, page_height = preprocessed.size
+    y0 = np.maximum(0, starts * factor - 4)
+    y1 = np.minimum(page_height, ends * factor + 4)
+    x0 = np.where(has_text, np.maximum(0, first * factor - 10), 0)
+    x1 = np.where(has_text, np.minimum(page_width, (last + 1) * factor + 9), page_width)
 
-    return line_images
+    return [
+        preprocessed.crop((int(left), int(top), int(right), int(bottom)))
+        for left, top, right, bottom in zip(x0, y0, x1, y1)
+    ]
 
 
 def _clean_line(line: str) -> str:
@@ -466,18 +578,193 @@ class OCRRecognitionResult:
     warnings: list[str]
 
 
-def _recognize_lines_tesseract(
-    line_images: list[Image.Image],
-    preprocessed_page: Image.Image | None = None,
-) -> OCRRecognitionResult:
+def _tesserocr_available() -> bool:
+    global _TESSEROCR_AVAILABLE
+    if _TESSEROCR_AVAILABLE is None:
+        try:
+            import tesserocr  # type: ignore  # noqa: F401
+
+            _TESSEROCR_AVAILABLE = True
+        except ImportError:
+            _TESSEROCR_AVAILABLE = False
+    return _TESSEROCR_AVAILABLE
+
+
+def _get_tesseract_engine():
+    """Return this worker thread's initialized Tesseract engine (tesserocr), or None.
+
+    Engines are created once per thread and kept for the process lifetime, so
+    traineddata is loaded once instead of on every call.
+    """
+    if not _tesserocr_available():
+        return None
+    engine = getattr(_TESSERACT_ENGINES, "api", None)
+    if engine is None:
+        import tesserocr  # type: ignore
+
+        engine = tesserocr.PyTessBaseAPI(lang="eng", oem=tesserocr.OEM.DEFAULT)
+        _TESSERACT_ENGINES.api = engine
+    return engine
+
+
+def _tesseract_run_engine(engine, image: Image.Image, psm: int, timeout_s: float) -> None:
+    engine.SetPageSegMode(psm)
+    engine.SetImage(image)
+    if not engine.Recognize(int(timeout_s * 1000)):
+        raise RuntimeError("Tesseract recognition timeout")
+
+
+def _tesseract_image_to_string(image: Image.Image, psm: int, timeout_s: float) -> str:
+    """OCR text for an image; raises RuntimeError on timeout like pytesseract."""
+    engine = _get_tesseract_engine()
+    if engine is not None:
+        _tesseract_run_engine(engine, image, psm, timeout_s)
+        return engine.GetUTF8Text()
+
+    import pytesseract
+
+    return pytesseract.image_to_string(image, config=f"--oem 3 --psm {psm} -l eng", timeout=timeout_s)
+
+
+@dataclass
+class _OCRWord:
+    text: str
+    confidence: float
+    left: int
+    top: int
+    height: int
+
+
+def _tesseract_words(image: Image.Image, psm: int, timeout_s: float) -> list[_OCRWord]:
+    """Single recognition pass returning every word with its box and confidence (0..1, -1 if unknown).
+
+    Raises RuntimeError on timeout like pytesseract.
+    """
+    engine = _get_tesseract_engine()
+    if engine is not None:
+        from tesserocr import RIL, iterate_level  # type: ignore
+
+        _tesseract_run_engine(engine, image, psm, timeout_s)
+        words: list[_OCRWord] = []
+        for word in iterate_level(engine.GetIterator(), RIL.WORD):
+            text = (word.GetUTF8Text(RIL.WORD) or "").strip()
+            box = word.BoundingBox(RIL.WORD)
+            if not text or not box:
+                continue
+            x1, y1, _x2, y2 = box
+            words.append(_OCRWord(text, word.Confidence(RIL.WORD) / 100.0, x1, y1, y2 - y1))
+        return words
+
     import pytesseract
 
+    data = pytesseract.image_to_data(
+        image,
+        config=f"--oem 3 --psm {psm} -l eng",
+        output_type=pytesseract.Output.DICT,
+        timeout=timeout_s,
+    )
+    words = []
+    for text, conf, left, top, height in zip(
+        data.get("text", []), data.get("conf", []), data.get("left", []), data.get("top", []), data.get("height", [])
+    ):
+        text = str(text).strip()
+        if not text:
+            continue
+        try:
+            score = float(conf)
+        except ValueError:
+            score = -1.0
+        words.append(_OCRWord(text, score / 100.0 if score >= 0 else -1.0, int(left), int(top), int(height)))
+    return words
+
+
+_LINE_STITCH_GAP = 24
+
+
+def _stitch_line_images(line_images: list[Image.Image]) -> tuple[Image.Image, list[int]]:
+    """Stack line crops into one white page; returns the page and each line's top offset."""
+    crops = [img.convert("L") for img in line_images]
+    width = max(crop.width for crop in crops)
+    height = sum(crop.height for crop in crops) + _LINE_STITCH_GAP * (len(crops) + 1)
+    page = Image.new("L", (width + 2 * _LINE_STITCH_GAP, height), 255)
+    tops: list[int] = []
+    y = _LINE_STITCH_GAP
+    for crop in crops:
+        page.paste(crop, (_LINE_STITCH_GAP, y))
+        tops.append(y)
+        y += crop.height + _LINE_STITCH_GAP
+    return page, tops
+
+
+def _words_to_line(words: list[_OCRWord]) -> tuple[str, float | None]:
+    """Left-to-right text of one line's words and their mean confidence (None without scores)."""
+    words = sorted(words, key=lambda w: w.left)
+    scores = [w.confidence for w in words if w.confidence >= 0]
+    return _clean_line(" ".join(w.text for w in words)), (sum(scores) / len(scores) if scores else None)
+
+
+def _recognize_line_crops_tesseract(
+    line_images: list[Image.Image],
+    timeout_s: float,
+) -> tuple[list[str], list[float]]:
+    """Recognize all line crops with one Tesseract call on a stitched page.
+
+    Words are mapped back to their source line by vertical center, and each line's
+    text and confidence come from the same pass. If the stitched pass times out or
+    fails, each crop is retried on its own (single-line mode, own budget) so one bad
+    region costs one line rather than the page.
+    """
+    if not line_images:
+        return [], []
+    page, tops = _stitch_line_images(line_images)
+    try:
+        words = _tesseract_words(page, 6, timeout_s)
+    except RuntimeError:
+        return _recognize_each_line_crop_tesseract(line_images, timeout_s / len(line_images))
+
+    per_line: list[list[_OCRWord]] = [[] for _ in line_images]
+    for word in words:
+        center = word.top + word.height / 2
+        idx = max(0, bisect.bisect_right(tops, center) - 1)
+        per_line[idx].append(word)
+
     lines: list[str] = []
     confidences: list[float] = []
+    for line_words in per_line:
+        text, confidence = _words_to_line(line_words)
+        if text:
+            lines.append(text)
+        if confidence is not None:
+            confidences.append(confidence)
+    return lines, confidences
+
 
-    def _safe_page_ocr(page: Image.Image, config: str, timeout_s: float) -> list[str]:
+def _recognize_each_line_crop_tesseract(
+    line_images: list[Image.Image],
+    timeout_s: float,
+) -> tuple[list[str], list[float]]:
+    lines: list[str] = []
+    confidences: list[float] = []
+    for line_img in line_images:
         try:
-            raw_text = pytesseract.image_to_string(page, config=config, timeout=timeout_s)
+            words = _tesseract_words(line_img.convert("L"), 7, timeout_s)
+        except RuntimeError:
+            continue
+        text, confidence = _words_to_line(words)
+        if text:
+            lines.append(text)
+        if confidence is not None:
+            confidences.append(confidence)
+    return lines, confidences
+
+
+def _recognize_lines_tesseract(
+    line_images: list[Image.Image],
+    preprocessed_page: Image.Image | None = None,
+) -> OCRRecognitionResult:
+    def _safe_page_ocr(page: Image.Image, psm: int, timeout_s: float) -> list[str]:
+        try:
+            raw_text = _tesseract_image_to_string(page, psm, timeout_s)
         except RuntimeError:
             return []
         out: list[str] = []
@@ -489,11 +776,11 @@ def _recognize_lines_tesseract(
 
     if preprocessed_page is not None:
         page = preprocessed_page
-        page_lines = _safe_page_ocr(page, "--oem 3 --psm 6 -l eng", timeout_s=0.6)
+        page_lines = _safe_page_ocr(page, 6, timeout_s=0.6)
         page_score = _recognition_quality_score(page_lines)
 
         if page_score < 1.0:
-            sparse_lines = _safe_page_ocr(page, "--oem 3 --psm 11 -l eng", timeout_s=0.5)
+            sparse_lines = _safe_page_ocr(page, 11, timeout_s=0.5)
             sparse_score = _recognition_quality_score(sparse_lines)
             if sparse_score > page_score:
                 page_lines = sparse_lines
@@ -509,35 +796,9 @@ def _recognize_lines_tesseract(
                 warnings=[],
             )
 
-    for line_img in line_images:
-        try:
-            text = pytesseract.image_to_string(line_img, config="--oem 3 --psm 7 -l eng", timeout=0.35).strip()
-        except RuntimeError:
-            continue
-        text = _clean_line(text)
-        if text:
-            lines.append(text)
-
-        try:
-            data = pytesseract.image_to_data(
-                line_img,
-                config="--oem 3 --psm 7 -l eng",
-                output_type=pytesseract.Output.DICT,
-                timeout=0.35,
-            )
-        except RuntimeError:
-            continue
-        scores = []
-        for conf in data.get("conf", []):
-            try:
-                score = float(conf)
-            except ValueError:
-                continue
-            if score >= 0:
-                scores.append(score / 100.0)
-        if scores:
-            confidences.append(sum(scores) / len(scores))
-
+    lines, confidences = _recognize_line_crops_tesseract(
+        line_images, timeout_s=0.35 * max(1, len(line_images))
+    )
     confidence = float(sum(confidences) / len(confidences)) if confidences else 0.0
     return OCRRecognitionResult(lines=lines, confidence=confidence, engine="local-tesseract", warnings=[])
 
@@ -570,10 +831,8 @@ def _recognition_quality_score(lines: list[str]) -> float:
     return meds + unique_ratio + header_bonus
 
 
-def _try_load_trocr_runtime() -> tuple[object, object, str]:
-    global _TROCR_MODEL, _TROCR_PROCESSOR, _TROCR_MODEL_ID, _TROCR_DEVICE
+def _check_trocr_model_dir() -> Path:
     model_dir = _resolve_path(DEFAULT_OCR_MODEL_DIR)
-    model_id = str(model_dir)
     if not model_dir.exists():
         raise FileNotFoundError(f"TrOCR model directory not found: {model_dir}")
 
@@ -583,6 +842,13 @@ def _try_load_trocr_runtime() -> tuple[object, object, str]:
             "TrOCR model is undertrained for production use "
             f"(epochs={trained_epochs}, required>={DEFAULT_TROCR_MIN_EPOCHS})"
         )
+    return model_dir
+
+
+def _try_load_trocr_runtime() -> tuple[object, object, str]:
+    global _TROCR_MODEL, _TROCR_PROCESSOR, _TROCR_MODEL_ID, _TROCR_DEVICE
+    model_dir = _check_trocr_model_dir()
+    model_id = str(model_dir)
 
     if _TROCR_MODEL is not None and _TROCR_PROCESSOR is not None and _TROCR_MODEL_ID == model_id and _TROCR_DEVICE:
         return _TROCR_PROCESSOR, _TROCR_MODEL, _TROCR_DEVICE
@@ -604,7 +870,206 @@ def _try_load_trocr_runtime() -> tuple[object, object, str]:
     return processor, model, device
 
 
-def _recognize_lines_trocr(line_images: list[Image.Image]) -> OCRRecognitionResult:
+@dataclass
+class _OnnxTrOCRRuntime:
+    encoder: object
+    decoder: object
+    decoder_with_past: object
+    tokenizer: object
+    image_size: tuple[int, int]
+    resample: int
+    rescale_factor: float
+    image_mean: np.ndarray
+    image_std: np.ndarray
+    decoder_start_token_id: int
+    eos_token_id: int
+    pad_token_id: int
+    special_token_ids: frozenset[int]
+
+
+def _read_json_file(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    try:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+def _load_trocr_tokenizer(model_dir: Path):
+    from tokenizers import ByteLevelBPETokenizer, Tokenizer  # type: ignore
+
+    tokenizer_json = model_dir / "tokenizer.json"
+    if tokenizer_json.exists():
+        return Tokenizer.from_file(str(tokenizer_json))
+    vocab, merges = model_dir / "vocab.json", model_dir / "merges.txt"
+    if not vocab.exists() or not merges.exists():
+        raise FileNotFoundError(f"TrOCR tokenizer files not found in {model_dir}")
+    # TrOCR ships a RoBERTa byte-level BPE vocabulary.
+    return ByteLevelBPETokenizer(str(vocab), str(merges))
+
+
+def _try_load_trocr_onnx_runtime() -> _OnnxTrOCRRuntime:
+    global _TROCR_ONNX_RUNTIME, _TROCR_ONNX_RUNTIME_ID
+    encoder_path, decoder_path, decoder_with_past_path = _onnx_component_paths(
+        _resolve_path(DEFAULT_OCR_MODEL_PATH)
+    )
+    for path in (encoder_path, decoder_path, decoder_with_past_path):
+        if not path.exists():
+            raise FileNotFoundError(f"ONNX OCR artifact not found: {path}")
+    model_dir = _check_trocr_model_dir()
+
+    runtime_id = f"{encoder_path}|{model_dir}"
+    if _TROCR_ONNX_RUNTIME is not None and _TROCR_ONNX_RUNTIME_ID == runtime_id:
+        return _TROCR_ONNX_RUNTIME
+
+    import onnxruntime as ort  # type: ignore
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if DEFAULT_ONNX_THREADS:
+        options.intra_op_num_threads = DEFAULT_ONNX_THREADS
+
+    def _session(path: Path):
+        return ort.InferenceSession(str(path), sess_options=options, providers=["CPUExecutionProvider"])
+
+    config = _read_json_file(model_dir / "config.json")
+    config.update(_read_json_file(model_dir / "generation_config.json"))
+    decoder_config = config.get("decoder") if isinstance(config.get("decoder"), dict) else {}
+    preprocessor = _read_json_file(model_dir / "preprocessor_config.json")
+
+    def _token_id(key: str, default: int) -> int:
+        value = config.get(key)
+        if value is None:
+            value = decoder_config.get(key)
+        return int(value) if value is not None else default
+
+    size = preprocessor.get("size", 384)
+    if isinstance(size, dict):
+        width = int(size.get("width", size.get("shortest_edge", 384)))
+        height = int(size.get("height", size.get("shortest_edge", 384)))
+    else:
+        width = height = int(size)
+
+    decoder_start_token_id = _token_id("decoder_start_token_id", 0)
+    eos_token_id = _token_id("eos_token_id", 2)
+    pad_token_id = _token_id("pad_token_id", 1)
+    bos_token_id = _token_id("bos_token_id", decoder_start_token_id)
+
+    runtime = _OnnxTrOCRRuntime(
+        encoder=_session(encoder_path),
+        decoder=_session(decoder_path),
+        decoder_with_past=_session(decoder_with_past_path),
+        tokenizer=_load_trocr_tokenizer(model_dir),
+        image_size=(width, height),
+        resample=int(preprocessor.get("resample", Image.BILINEAR)),
+        rescale_factor=float(preprocessor.get("rescale_factor", 1 / 255)),
+        image_mean=np.asarray(preprocessor.get("image_mean", [0.5, 0.5, 0.5]), dtype=np.float32),
+        image_std=np.asarray(preprocessor.get("image_std", [0.5, 0.5, 0.5]), dtype=np.float32),
+        decoder_start_token_id=decoder_start_token_id,
+        eos_token_id=eos_token_id,
+        pad_token_id=pad_token_id,
+        special_token_ids=frozenset({decoder_start_token_id, eos_token_id, pad_token_id, bos_token_id}),
+    )
+    _TROCR_ONNX_RUNTIME = runtime
+    _TROCR_ONNX_RUNTIME_ID = runtime_id
+    return runtime
+
+
+def _trocr_pixel_values(runtime: _OnnxTrOCRRuntime, images: list[Image.Image]) -> np.ndarray:
+    """NumPy port of the ViT image processor TrOCR was trained with (resize, rescale, normalize)."""
+    batch = np.empty((len(images), 3, runtime.image_size[1], runtime.image_size[0]), dtype=np.float32)
+    for i, img in enumerate(images):
+        resized = img.convert("RGB").resize(runtime.image_size, resample=runtime.resample)
+        arr = np.asarray(resized, dtype=np.float32) * runtime.rescale_factor
+        arr = (arr - runtime.image_mean) / runtime.image_std
+        batch[i] = arr.transpose(2, 0, 1)
+    return batch
+
+
+def _run_onnx_session(session, available: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    feeds = {}
+    for model_input in session.get_inputs():
+        if model_input.name not in available:
+            raise RuntimeError(f"ONNX graph expects unsupported input '{model_input.name}'")
+        feeds[model_input.name] = available[model_input.name]
+    output_names = [output.name for output in session.get_outputs()]
+    return dict(zip(output_names, session.run(output_names, feeds)))
+
+
+def _greedy_decode_onnx(
+    runtime: _OnnxTrOCRRuntime,
+    pixel_values: np.ndarray,
+    max_new_tokens: int,
+) -> tuple[list[list[int]], list[float]]:
+    """Greedy decoding that re-feeds `present.*` outputs as `past_key_values.*` inputs."""
+    batch_size = pixel_values.shape[0]
+    encoder_hidden_states = _run_onnx_session(runtime.encoder, {"pixel_values": pixel_values})[
+        "last_hidden_state"
+    ]
+    shared = {
+        "encoder_hidden_states": encoder_hidden_states,
+        "encoder_attention_mask": np.ones(encoder_hidden_states.shape[:2], dtype=np.int64),
+    }
+    input_ids = np.full((batch_size, 1), runtime.decoder_start_token_id, dtype=np.int64)
+    outputs = _run_onnx_session(runtime.decoder, {**shared, "input_ids": input_ids})
+
+    past: dict[str, np.ndarray] = {}
+    generated: list[list[int]] = [[] for _ in range(batch_size)]
+    token_scores: list[list[float]] = [[] for _ in range(batch_size)]
+    finished = np.zeros(batch_size, dtype=bool)
+
+    for step in range(max_new_tokens):
+        logits = outputs["logits"][:, -1, :].astype(np.float32)
+        next_tokens = logits.argmax(axis=-1)
+        # Max softmax probability of the chosen token, computed stably.
+        shifted = logits - logits.max(axis=-1, keepdims=True)
+        probs = 1.0 / np.exp(shifted).sum(axis=-1)
+        next_tokens = np.where(finished, runtime.pad_token_id, next_tokens)
+
+        for i in np.flatnonzero(~finished):
+            token_scores[i].append(float(probs[i]))
+            if int(next_tokens[i]) != runtime.eos_token_id:
+                generated[i].append(int(next_tokens[i]))
+        finished |= next_tokens == runtime.eos_token_id
+        if finished.all() or step == max_new_tokens - 1:
+            break
+
+        for name, value in outputs.items():
+            if name.startswith("present."):
+                past["past_key_values." + name[len("present."):]] = value
+        outputs = _run_onnx_session(
+            runtime.decoder_with_past,
+            {**shared, **past, "input_ids": next_tokens.reshape(batch_size, 1).astype(np.int64)},
+        )
+
+    confidences = [sum(scores) / len(scores) if scores else 0.0 for scores in token_scores]
+    return generated, confidences
+
+
+def _recognize_lines_trocr_onnx(line_images: list[Image.Image]) -> OCRRecognitionResult:
+    runtime = _try_load_trocr_onnx_runtime()
+
+    lines: list[str] = []
+    confidences: list[float] = []
+    for i in range(0, len(line_images), DEFAULT_TROCR_BATCH_SIZE):
+        pixel_values = _trocr_pixel_values(runtime, line_images[i : i + DEFAULT_TROCR_BATCH_SIZE])
+        sequences, sequence_confidences = _greedy_decode_onnx(
+            runtime, pixel_values, DEFAULT_TROCR_MAX_NEW_TOKENS
+        )
+        for token_ids, confidence in zip(sequences, sequence_confidences):
+            text = runtime.tokenizer.decode([t for t in token_ids if t not in runtime.special_token_ids])
+            cleaned = _clean_line(text)
+            if cleaned:
+                lines.append(cleaned)
+                confidences.append(confidence)
+
+    confidence = float(sum(confidences) / len(confidences)) if confidences else 0.0
+    return OCRRecognitionResult(lines=lines, confidence=confidence, engine="local-trocr-onnx", warnings=[])
+
+
+def _recognize_lines_trocr_torch(line_images: list[Image.Image]) -> OCRRecognitionResult:
     processor, model, device = _try_load_trocr_runtime()
 
     import torch  # type: ignore
@@ -629,6 +1094,24 @@ def _recognize_lines_trocr(line_images: list[Image.Image]) -> OCRRecognitionResu
     return OCRRecognitionResult(lines=lines, confidence=0.78, engine="local-trocr", warnings=[])
 
 
+def _recognize_lines_trocr(line_images: list[Image.Image], preferred_engine: str = "trocr") -> OCRRecognitionResult:
+    # ONNX Runtime is preferred when the exported graphs exist (or "onnx" is requested);
+    # if it cannot load, the PyTorch model is tried before giving up on TrOCR.
+    if preferred_engine != "onnx" and not _onnx_artifacts_present():
+        return _recognize_lines_trocr_torch(line_images)
+
+    try:
+        return _recognize_lines_trocr_onnx(line_images)
+    except Exception as onnx_exc:
+        try:
+            result = _recognize_lines_trocr_torch(line_images)
+        except Exception as torch_exc:
+            raise RuntimeError(f"ONNX TrOCR failed ({onnx_exc}); PyTorch TrOCR failed ({torch_exc})") from torch_exc
+        logger.warning("ONNX TrOCR unavailable, recognized with PyTorch TrOCR: %s", onnx_exc)
+        result.warnings.append(f"ONNX TrOCR unavailable, used PyTorch TrOCR: {onnx_exc}")
+        return result
+
+
 def _recognize_lines(
     line_images: list[Image.Image],
     preferred_engine: str,
@@ -638,9 +1121,9 @@ def _recognize_lines(
     preferred_engine = preferred_engine.strip().lower()
     warnings: list[str] = []
 
-    if preferred_engine == "trocr":
+    if preferred_engine in ("trocr", "onnx"):
         try:
-            trocr_result = _recognize_lines_trocr(line_images)
+            trocr_result = _recognize_lines_trocr(line_images, preferred_engine)
             model_artifact = _resolve_path(DEFAULT_OCR_MODEL_PATH)
             if not model_artifact.exists():
                 trocr_result.warnings.append(
@@ -665,6 +1148,7 @@ def _recognize_lines(
 
             return trocr_result
         except Exception as exc:
+            logger.warning("TrOCR unavailable, recognized with Tesseract: %s", exc)
             warnings.append(f"TrOCR unavailable, fallback to Tesseract: {exc}")
 
     tesseract_result = _recognize_lines_tesseract(line_images, preprocessed_page=preprocessed_page)
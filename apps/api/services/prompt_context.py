@@ -0,0 +1,148 @@
+"""
+Prompt Context — builds the compact medicine list pasted into cloud symptom
+prompts.
+
+Instead of the full catalog (up to 500 verbose lines), the context holds:
+- medicines whose generic matches one recommended (disease_metadata.json) for
+  the local model's top predicted conditions, compared by ingredient so
+  "Calamine lotion" matches "Calamine" and combinations match their parts;
+- the rest of those medicines' catalog categories, plus a few first-aid
+  categories that are always useful;
+- one line per generic (strengths and up to two brands merged).
+
+Without predictions (model unavailable) the whole catalog is used, still
+deduplicated. Contexts are cached per (catalog version, predicted generics).
+Token counts use tiktoken when installed and a 4-characters-per-token estimate
+otherwise; provider-reported prompt sizes are recorded by the cloud services.
+"""
+
+import re
+from functools import lru_cache
+
+from services.cache import LRUCache
+from services.local_ml_service import predict_recommended_generics
+from services.medicine_catalog import MedicineCatalog, get_medicine_catalog
+from services.medicine_db import get_all_medicine_names
+
+_CONTEXT_LINE_LIMIT = 500
+_BRANDS_PER_LINE = 2
+_ALWAYS_INCLUDED_CATEGORIES = frozenset({"analgesic", "ors_supplements"})
+_DOSAGE_FORM_WORDS = frozenset({
+    "capsule", "capsules", "cream", "drops", "gel", "husk", "inhaler", "injection", "kit",
+    "lotion", "ointment", "powder", "shampoo", "solution", "suspension", "syrup", "tablet", "tablets",
+})
+_COMPONENT_SPLIT = re.compile(r"\s*(?:\+|/|,| - |-)\s*")
+
+_CONTEXT_CACHE = LRUCache(256)
+_stats = {"contexts": 0, "context_tokens": 0, "full_context_tokens": None, "full_context_version": None}
+_prompt_tokens: dict[str, dict[str, int]] = {}
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+@lru_cache(maxsize=4096)
+def generic_components(name: str) -> frozenset[str]:
+    """Ingredient names in a generic name, without dosage forms or parenthetical notes."""
+    lowered = (name or "").lower()
+    parts = re.findall(r"\(([^)]*)\)", lowered) + [re.sub(r"\([^)]*\)", "", lowered)]
+    components = set()
+    for part in parts:
+        for piece in _COMPONENT_SPLIT.split(part):
+            words = [w for w in re.findall(r"[a-z0-9]+", piece) if w not in _DOSAGE_FORM_WORDS]
+            if words:
+                components.add(" ".join(words))
+    return frozenset(components)
+
+
+def select_relevant_rows(catalog: MedicineCatalog, generics: frozenset[str]) -> list[dict]:
+    wanted = frozenset().union(*(generic_components(g) for g in generics)) if generics else frozenset()
+    matched = [row for row in catalog.rows if generic_components(row.get("generic_name")) & wanted]
+    categories = {row.get("category") for row in matched} | _ALWAYS_INCLUDED_CATEGORIES
+    matched_ids = {id(row) for row in matched}
+    return [row for row in catalog.rows if id(row) in matched_ids or row.get("category") in categories]
+
+
+def render_compact(rows: list[dict]) -> str:
+    """One line per generic: '- Generic strength/strength (Brand, Brand) [category]'."""
+    grouped: dict[str, dict] = {}
+    for row in rows:
+        generic = (row.get("generic_name") or "").strip()
+        if not generic:
+            continue
+        entry = grouped.setdefault(generic.lower(), {"name": generic, "strengths": [], "brands": [], "category": row.get("category", "")})
+        strength = (row.get("strength") or "").strip()
+        if strength and strength not in entry["strengths"]:
+            entry["strengths"].append(strength)
+        brand = (row.get("brand_name") or "").strip()
+        if brand and brand not in entry["brands"] and len(entry["brands"]) < _BRANDS_PER_LINE:
+            entry["brands"].append(brand)
+    if not grouped:
+        return "No medicines in database"
+    lines = []
+    for entry in list(grouped.values())[:_CONTEXT_LINE_LIMIT]:
+        line = f"- {entry['name']}"
+        if entry["strengths"]:
+            line += " " + "/".join(entry["strengths"])
+        if entry["brands"]:
+            line += f" ({', '.join(entry['brands'])})"
+        lines.append(f"{line} [{entry['category']}]")
+    return "\n".join(lines)
+
+
+async def build_symptom_medicines_context(symptoms: list[str]) -> str:
+    """Compact medicine list for a cloud symptom prompt (falls back to the remote full list without a catalog)."""
+    catalog = await get_medicine_catalog()
+    if catalog is None:
+        return await get_all_medicine_names()
+
+    generics = frozenset(await predict_recommended_generics(symptoms))
+    key = (catalog.version, generics)
+    cached = _CONTEXT_CACHE.get(key)
+    if cached is None:
+        rows = select_relevant_rows(catalog, generics) if generics else catalog.rows
+        text = render_compact(rows)
+        cached = (text, count_tokens(text))
+        _CONTEXT_CACHE.put(key, cached)
+    if _stats["full_context_version"] != catalog.version:
+        # Baseline for the stats: what the uncompacted context costs.
+        _stats["full_context_tokens"] = count_tokens(await get_all_medicine_names())
+        _stats["full_context_version"] = catalog.version
+
+    text, tokens = cached
+    _stats["contexts"] += 1
+    _stats["context_tokens"] += tokens
+    return text
+
+
+def record_prompt_tokens(provider: str, tokens: int | None) -> None:
+    """Prompt size reported by a provider's usage metadata."""
+    if not tokens:
+        return
+    entry = _prompt_tokens.setdefault(provider, {"prompts": 0, "tokens": 0})
+    entry["prompts"] += 1
+    entry["tokens"] += int(tokens)
+
+
+def get_prompt_context_stats() -> dict:
+    contexts = _stats["contexts"]
+    return {
+        "contexts": contexts,
+        "avg_context_tokens": round(_stats["context_tokens"] / contexts, 1) if contexts else None,
+        "full_context_tokens": _stats["full_context_tokens"],
+        "token_counter": "tiktoken" if _ENCODING is not None else "estimate",
+        "avg_prompt_tokens": {
+            provider: round(entry["tokens"] / entry["prompts"], 1)
+            for provider, entry in _prompt_tokens.items()
+        },
+    }
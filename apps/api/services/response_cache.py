@@ -0,0 +1,219 @@
+"""
+Cloud Response Cache — reuses cloud LLM symptom analyses for repeat requests.
+
+Answers are keyed by a fingerprint of the normalized request: symptom and
+modifier sets, age band, duration bucket, gender, history/medication lists
+(lower-cased, sorted) and a hash of the exact medicine context in the prompt.
+The fingerprint is an HMAC-SHA256, so neither tier stores patient inputs and
+low-entropy combinations cannot be brute-forced from the keys without the
+salt (CLOUD_RESPONSE_CACHE_SALT, or a random one kept next to the disk tier).
+
+Tiers:
+- memory: LRUCache with TTL (always on).
+- disk: optional SQLite file (CLOUD_RESPONSE_CACHE_PATH) shared by the
+  workers on a host and kept across restarts; expired and excess rows are
+  pruned on write.
+"""
+
+import asyncio
+import copy
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from services.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+_TTL_SECONDS = float(os.getenv("CLOUD_RESPONSE_CACHE_TTL_SECONDS", "21600"))
+_MEMORY_ENTRIES = int(os.getenv("CLOUD_RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+_DISK_ENTRIES = int(os.getenv("CLOUD_RESPONSE_CACHE_DISK_MAX_ENTRIES", "50000"))
+_DISK_PATH = os.getenv("CLOUD_RESPONSE_CACHE_PATH", "")
+# Prune the disk tier every N writes rather than on each one.
+_PRUNE_EVERY = 100
+
+
+def _age_band(age: int | None) -> str:
+    if age is None:
+        return "unknown"
+    for upper, band in ((5, "0-4"), (13, "5-12"), (18, "13-17"), (40, "18-39"), (60, "40-59")):
+        if age < upper:
+            return band
+    return "60+"
+
+
+def _duration_bucket(duration_days: int) -> str:
+    for upper, bucket in ((3, "<3"), (5, "3-4"), (7, "5-6"), (14, "7-13")):
+        if duration_days < upper:
+            return bucket
+    return "14+"
+
+
+def _normalized(values: list[str] | None) -> list[str]:
+    return sorted({v.strip().lower() for v in values or [] if v and v.strip()})
+
+
+def normalize_symptom_request(
+    symptoms: list[str],
+    modifiers: list[str],
+    duration_days: int,
+    age: int | None = None,
+    gender: str | None = None,
+    medical_history: list[str] | None = None,
+    current_medications: list[str] | None = None,
+    medicines_context: str = "",
+) -> dict:
+    """The request fields a cached answer must agree on, in canonical form."""
+    return {
+        "symptoms": _normalized(symptoms),
+        "modifiers": _normalized(modifiers),
+        "duration": _duration_bucket(duration_days),
+        "age": _age_band(age),
+        "gender": (gender or "").strip().lower(),
+        "history": _normalized(medical_history),
+        "medications": _normalized(current_medications),
+        "context": hashlib.sha256((medicines_context or "").encode("utf-8")).hexdigest(),
+    }
+
+
+class _DiskTier:
+    """SQLite key/value store with per-row expiry. All methods are blocking.
+
+    ``size`` is an approximate row count for stats: exact after each prune,
+    incremented per write in between, so reading it never touches the file.
+    """
+
+    def __init__(self, path: Path, max_entries: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._writes = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.size = self._count()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: dict, ttl_seconds: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl_seconds),
+            )
+            self._writes += 1
+            self.size += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                self._prune()
+                self.size = self._count()
+
+    def _prune(self) -> None:
+        self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self._max_entries,),
+        )
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def _load_salt(disk_path: Path | None) -> bytes:
+    configured = os.getenv("CLOUD_RESPONSE_CACHE_SALT", "")
+    if configured:
+        return configured.encode("utf-8")
+    if disk_path is None:
+        return secrets.token_bytes(32)
+    # Keys on disk must stay valid across restarts and workers: keep the salt beside the file.
+    salt_path = disk_path.with_name(disk_path.name + ".salt")
+    if not salt_path.exists():
+        salt_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = salt_path.with_name(f"{salt_path.name}.{os.getpid()}.tmp")
+        fd = os.open(str(tmp_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, salt_path)  # atomic; the first worker's salt wins
+        except FileExistsError:
+            pass
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    return bytes.fromhex(salt_path.read_text(encoding="utf-8").strip())
+
+
+class ResponseCache:
+    """Two-tier (memory, optional disk) cache of successful cloud responses."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = _TTL_SECONDS,
+        max_entries: int = _MEMORY_ENTRIES,
+        disk_path: Path | None = None,
+        disk_max_entries: int = _DISK_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self._memory = LRUCache(max_entries, ttl_seconds)
+        self._disk = _DiskTier(disk_path, disk_max_entries) if disk_path else None
+        self._salt = _load_salt(disk_path)
+        self.disk_hits = 0
+
+    def fingerprint(self, request: dict) -> str:
+        payload = json.dumps(request, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return hmac.new(self._salt, payload, hashlib.sha256).hexdigest()
+
+    async def get(self, key: str) -> dict | None:
+        value = self._memory.get(key)
+        if value is None and self._disk is not None:
+            try:
+                value = await asyncio.to_thread(self._disk.get, key)
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning("Cloud response disk cache read failed: %s", e)
+                value = None
+            if value is not None:
+                self.disk_hits += 1
+                self._memory.put(key, value)
+        return copy.deepcopy(value) if value is not None else None
+
+    async def put(self, key: str, value: dict) -> None:
+        self._memory.put(key, copy.deepcopy(value))
+        if self._disk is not None:
+            try:
+                await asyncio.to_thread(self._disk.put, key, value, self.ttl_seconds)
+            except sqlite3.Error as e:
+                logger.warning("Cloud response disk cache write failed: %s", e)
+
+    def clear(self) -> None:
+        self._memory.clear()
+
+    def stats(self) -> dict:
+        stats = self._memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_size"] = self._disk.size if self._disk is not None else None
+        return stats
+
+
+_cache: ResponseCache | None = None
+
+
+def get_symptom_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(disk_path=Path(_DISK_PATH) if _DISK_PATH else None)
+    return _cache
@@ -0,0 +1,166 @@
+"""
+Compiled Symptom Forest — flattens the trained scikit-learn Random Forest into
+contiguous NumPy arrays and evaluates it without importing scikit-learn/joblib.
+
+Layout (all trees concatenated, child indices are global):
+- feature:     split feature per node, -1 for leaves
+- threshold:   split threshold per node
+- left/right:  child node indices
+- leaf_index:  row into leaf_values for leaves, -1 for internal nodes
+- leaf_values: normalized class distribution per leaf
+- roots:       root node index of every tree
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+COMPILED_FORMAT_VERSION = 1
+
+
+class CompiledForest:
+    """Pure-NumPy Random Forest evaluator with a predict_proba compatible API."""
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        leaf_index: np.ndarray,
+        leaf_values: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_index = leaf_index
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.max_depth = max_depth
+        # Binary symptom features are split at 0.5, so a node test reduces to a bit lookup.
+        internal = feature >= 0
+        self.binary_splits = bool(np.all((threshold[internal] >= 0.0) & (threshold[internal] < 1.0)))
+        # Leaves point to themselves so finished rows stay put while others descend.
+        self._left_or_self = np.where(internal, left, np.arange(len(feature)))
+        self._right_or_self = np.where(internal, right, np.arange(len(feature)))
+        self._safe_feature = np.where(internal, feature, 0)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        features = np.asarray(features)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        n_samples = features.shape[0]
+
+        if self.binary_splits:
+            go_right_table = features.astype(bool)
+        else:
+            go_right_table = None
+
+        rows = np.arange(n_samples)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_samples, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            split_feature = self._safe_feature[nodes]
+            if go_right_table is not None:
+                go_right = go_right_table[rows, split_feature]
+            else:
+                go_right = features[rows, split_feature] > self.threshold[nodes]
+            next_nodes = np.where(go_right, self._right_or_self[nodes], self._left_or_self[nodes])
+            if np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+
+        leaf_rows = self.leaf_index[nodes]
+        return self.leaf_values[leaf_rows].mean(axis=1)
+
+
+def compile_forest(model) -> dict[str, np.ndarray]:
+    """Flatten a fitted RandomForestClassifier into the compiled array layout."""
+    features, thresholds, lefts, rights, leaf_indexes, leaf_values, roots = [], [], [], [], [], [], []
+    node_offset = 0
+    leaf_offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        is_leaf = tree.children_left < 0
+
+        values = tree.value[:, 0, :].astype(np.float64)
+        totals = values.sum(axis=1, keepdims=True)
+        values = np.divide(values, totals, out=np.zeros_like(values), where=totals > 0)
+
+        leaf_index = np.full(n_nodes, -1, dtype=np.int32)
+        leaf_index[is_leaf] = leaf_offset + np.arange(int(is_leaf.sum()), dtype=np.int32)
+
+        features.append(np.where(is_leaf, -1, tree.feature).astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float32))
+        lefts.append(np.where(is_leaf, -1, tree.children_left + node_offset).astype(np.int32))
+        rights.append(np.where(is_leaf, -1, tree.children_right + node_offset).astype(np.int32))
+        leaf_indexes.append(leaf_index)
+        leaf_values.append(values[is_leaf].astype(np.float32))
+        roots.append(node_offset)
+
+        node_offset += n_nodes
+        leaf_offset += int(is_leaf.sum())
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    return {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "leaf_index": np.concatenate(leaf_indexes),
+        "leaf_values": np.concatenate(leaf_values),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": np.asarray(max_depth, dtype=np.int32),
+    }
+
+
+def save_compiled_model(path: Path, model, classes, feature_names: list[str], version: str = "") -> None:
+    """Write the compiled forest plus label/feature metadata as an uncompressed .npz."""
+    arrays = compile_forest(model)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        path,
+        format_version=np.asarray(COMPILED_FORMAT_VERSION, dtype=np.int32),
+        classes=np.asarray([str(c) for c in classes]),
+        feature_names=np.asarray(feature_names),
+        model_version=np.asarray(version),
+        **arrays,
+    )
+
+
+def load_compiled_model(path: Path) -> dict:
+    """Load a compiled artifact into the same dict shape as the joblib model bundle."""
+    with np.load(path, allow_pickle=False) as data:
+        format_version = int(data["format_version"])
+        if format_version != COMPILED_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported compiled symptom model format {format_version} "
+                f"(expected {COMPILED_FORMAT_VERSION}). Re-run: python scripts/train_model.py --export-only"
+            )
+        forest = CompiledForest(
+            feature=data["feature"],
+            threshold=data["threshold"],
+            left=data["left"],
+            right=data["right"],
+            leaf_index=data["leaf_index"],
+            leaf_values=data["leaf_values"],
+            roots=data["roots"],
+            max_depth=int(data["max_depth"]),
+        )
+        return {
+            "model": forest,
+            "classes": data["classes"],
+            "feature_names": data["feature_names"].tolist(),
+            "version": str(data["model_version"]),
+        }
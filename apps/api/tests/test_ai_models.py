@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import services.ai_models as ai_models
+import services.gemini_service as gemini_service
+from services.ai_models import ProviderLimiter
+
+
+def test_limiter_caps_concurrency_and_times_out():
+    limiter = ProviderLimiter("Test", max_concurrency=2, timeout_s=0.2)
+    active = {"now": 0, "peak": 0}
+
+    async def call():
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        return "ok"
+
+    async def _run():
+        results = await asyncio.gather(*[limiter.call(call) for _ in range(6)])
+        with pytest.raises(TimeoutError, match="Test request timed out after 0.2s"):
+            await limiter.call(lambda: asyncio.sleep(5))
+        return results
+
+    assert asyncio.run(_run()) == ["ok"] * 6
+    assert active["peak"] == 2
+
+
+def test_limiter_reports_asyncio_timeouts_with_the_provider_name(monkeypatch):
+    class LegacyTimeout(asyncio.TimeoutError):
+        """Stands in for Python 3.10, where wait_for raises asyncio.TimeoutError."""
+
+    async def expired(awaitable, _timeout):
+        awaitable.close()
+        raise LegacyTimeout()
+
+    monkeypatch.setattr(ai_models.asyncio, "wait_for", expired)
+    limiter = ProviderLimiter("Gemini", max_concurrency=1, timeout_s=30)
+
+    with pytest.raises(TimeoutError, match="^Gemini request timed out after 30s$"):
+        asyncio.run(limiter.call(lambda: asyncio.sleep(0)))
+
+
+def test_gemini_calls_do_not_block_the_event_loop(monkeypatch):
+    async def slow_generate(model, contents):
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(text='{"possible_conditions": []}')
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=slow_generate)))
+    monkeypatch.setattr(gemini_service, "_get_client", lambda: client)
+    ticks = []
+
+    async def ticker():
+        for _ in range(3):
+            ticks.append(1)
+            await asyncio.sleep(0.005)
+
+    async def _run():
+        return await asyncio.gather(gemini_service.analyze_symptoms(["cough"], [], 1), ticker())
+
+    result, _ = asyncio.run(_run())
+
+    assert result == {"possible_conditions": []}
+    assert len(ticks) == 3
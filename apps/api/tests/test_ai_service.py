@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+import services.ai_service as ai_service
+from services.circuit_breaker import get_breaker, reset_breakers
+
+
+@pytest.fixture(autouse=True)
+def _fresh_breakers():
+    reset_breakers()
+    yield
+    reset_breakers()
+
+
+def _provider(result: dict, delay: float, log: list[str], name: str):
+    async def call():
+        log.append(f"start:{name}")
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(f"cancel:{name}")
+            raise
+        return result
+
+    return name, call
+
+
+def test_hedge_delay_parsing_falls_back_to_sequential_on_bad_values():
+    assert ai_service._parse_hedge_delay("") is None
+    assert ai_service._parse_hedge_delay("-1") is None
+    assert ai_service._parse_hedge_delay(" 150 ") == 0.15
+    assert ai_service._parse_hedge_delay("0") == 0.0
+    assert ai_service._parse_hedge_delay("150ms") is None
+    assert ai_service._parse_hedge_delay("0.2") is None
+
+
+def test_sequential_chain_without_hedging(monkeypatch):
+    monkeypatch.setattr(ai_service, "_HEDGE_DELAY_S", None)
+    log: list[str] = []
+    errors: list[str] = []
+    providers = [
+        _provider({"error": "quota"}, 0.01, log, "openai"),
+        _provider({"ok": 2}, 0.01, log, "gemini"),
+    ]
+
+    result = asyncio.run(ai_service._first_success(providers, errors))
+
+    assert result == {"ok": 2}
+    assert log == ["start:openai", "start:gemini"]
+    assert errors == ["openai: quota"]
+
+
+def test_hedged_provider_starts_after_delay_and_slow_one_is_cancelled(monkeypatch):
+    monkeypatch.setattr(ai_service, "_HEDGE_DELAY_S", 0.02)
+    log: list[str] = []
+    providers = [
+        _provider({"ok": 1}, 5.0, log, "openai"),
+        _provider({"ok": 2}, 0.01, log, "gemini"),
+    ]
+
+    async def _run():
+        start = time.perf_counter()
+        result = await ai_service._first_success(providers, [])
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0)  # let the cancellation land
+        return result, elapsed
+
+    result, elapsed = asyncio.run(_run())
+
+    assert result == {"ok": 2}
+    assert elapsed < 1.0
+    assert log == ["start:openai", "start:gemini", "cancel:openai"]
+
+
+def test_parallel_mode_prefers_earlier_provider_on_tie(monkeypatch):
+    monkeypatch.setattr(ai_service, "_HEDGE_DELAY_S", 0.0)
+    errors: list[str] = []
+    log: list[str] = []
+    providers = [
+        _provider({"ok": 1}, 0.0, log, "openai"),
+        _provider({"ok": 2}, 0.0, log, "gemini"),
+    ]
+    assert asyncio.run(ai_service._first_success(providers, errors)) == {"ok": 1}
+
+    failing = [_provider({"error": "down"}, 0.0, log, "openai"), _provider({"error": "down"}, 0.0, log, "gemini")]
+    assert asyncio.run(ai_service._first_success(failing, errors)) is None
+    assert errors == ["openai: down", "gemini: down"]
+
+
+def test_provider_with_open_circuit_is_skipped_without_a_call(monkeypatch):
+    monkeypatch.setattr(ai_service, "_HEDGE_DELAY_S", None)
+    get_breaker("openai").record_failure("OpenAI quota exceeded: Error code: 429. Please try again in 20s.")
+    log: list[str] = []
+    errors: list[str] = []
+    healthy_backup = [
+        _provider({"ok": 1}, 0.0, log, "openai"),
+        _provider({"ok": 2}, 0.0, log, "gemini"),
+    ]
+    failing_backup = [
+        _provider({"ok": 1}, 0.0, log, "openai"),
+        _provider({"error": "Gemini API error: 503"}, 0.0, log, "gemini"),
+    ]
+
+    # The unhealthy provider moves behind the healthy one...
+    assert asyncio.run(ai_service._first_success(healthy_backup, errors)) == {"ok": 2}
+    # ...and is rejected by its breaker without being called.
+    assert asyncio.run(ai_service._first_success(failing_backup, errors)) is None
+    assert log == ["start:gemini", "start:gemini"]
+    assert "circuit open" in errors[-1]
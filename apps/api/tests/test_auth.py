@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+import services.auth as auth
+
+_SECRET = "test-secret-with-at-least-32-bytes!!"
+
+
+def _token(**overrides) -> str:
+    claims = {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 3600}
+    claims.update(overrides)
+    return jwt.encode(claims, _SECRET, algorithm="HS256")
+
+
+def _authenticate(token: str) -> str:
+    return asyncio.run(auth.get_current_user_id(f"Bearer {token}"))
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache():
+    auth.clear_verified_token_cache()
+    yield
+    auth.clear_verified_token_cache()
+
+
+def test_hs256_tokens_are_verified_locally_and_cached(monkeypatch):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", _SECRET)
+    monkeypatch.setattr(auth, "_verify_token_remotely", lambda _token: pytest.fail("remote call"))
+    calls = []
+    verify = auth._verify_token_locally
+    monkeypatch.setattr(auth, "_verify_token_locally", lambda token: calls.append(token) or verify(token))
+
+    token = _token()
+    assert _authenticate(token) == "user-1"
+    assert _authenticate(token) == "user-1"
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize(
+    ("overrides", "detail"),
+    [
+        ({"exp": int(time.time()) - 60}, "Token expired"),
+        ({"aud": "anon"}, "Invalid token"),
+    ],
+)
+def test_expired_or_wrong_audience_tokens_are_rejected(monkeypatch, overrides, detail):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", _SECRET)
+
+    with pytest.raises(HTTPException) as exc:
+        _authenticate(_token(**overrides))
+
+    assert exc.value.status_code == 401
+    assert exc.value.detail.startswith(detail)
+
+
+def test_falls_back_to_supabase_auth_without_local_key(monkeypatch):
+    monkeypatch.delenv("SUPABASE_JWT_SECRET", raising=False)
+    monkeypatch.setattr(auth, "_verify_token_remotely", lambda _token: "user-remote")
+
+    assert _authenticate(_token()) == "user-remote"
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from services.cache import LRUCache
+
+
+def test_lru_evicts_only_least_recently_used_entry():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_lru_persists_entries_for_matching_meta(tmp_path):
+    path = tmp_path / "names.json"
+    cache = LRUCache(max_size=3)
+    for key in ("paracetmol", "amoxicilin", "azithro"):
+        cache.put(key, key.title())
+    cache.get("paracetmol")
+    assert cache.save(path, meta="lexicon-v1") == 3
+
+    restored = LRUCache(max_size=2)
+    assert restored.load(path, meta="lexicon-v2") == 0
+    assert restored.load(path, meta="lexicon-v1") == 2
+    # The most recently used entries survive a smaller restore.
+    assert restored.get("amoxicilin") is None
+    assert restored.get("paracetmol") == "Paracetmol"
+    assert LRUCache(4).load(tmp_path / "missing.json") == 0
+
+
+def test_save_uses_a_per_process_temp_file(tmp_path):
+    path = tmp_path / "names.json"
+    other_worker_tmp = tmp_path / "names.json.99999999.tmp"
+    other_worker_tmp.write_text("half-written by another worker", encoding="utf-8")
+    cache = LRUCache(max_size=2)
+    cache.put("paracetmol", "Paracetamol")
+
+    assert cache.save(path) == 1
+
+    assert other_worker_tmp.read_text(encoding="utf-8") == "half-written by another worker"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["names.json", "names.json.99999999.tmp"]
+    assert LRUCache(2).load(path) == 1
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import services.circuit_breaker as circuit_breaker
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(clock: _Clock) -> CircuitBreaker:
+    return CircuitBreaker("test", window_seconds=60, min_calls=4, failure_rate=0.5, open_seconds=30,
+                          max_open_seconds=100, clock=clock)
+
+
+def test_opens_on_error_rate_and_probes_half_open():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    for ok in (True, True, False):
+        breaker.record({"ok": 1} if ok else {"error": "Gemini API error: 503"})
+    assert breaker.state == CLOSED
+    breaker.record({"error": "Gemini API error: 503"})
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now += 31
+    assert breaker.allow()  # the probe
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # only one probe in flight
+    breaker.record({"error": "timeout"})
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == 60  # doubled cool-down
+
+    clock.now += 61
+    assert breaker.allow()
+    breaker.record({"ok": 1})
+    assert breaker.state == CLOSED
+    assert breaker.health_score() == 1.0
+
+
+def test_quota_errors_open_until_the_reset_hint():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    breaker.record({"error": "OpenAI quota exceeded: Rate limit reached. Please try again in 20s."})
+
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == 20
+    assert breaker.health_score() == 0.0
+
+
+def test_in_flight_failures_do_not_shorten_a_quota_window():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    for _ in range(3):
+        breaker.record({"ok": 1})
+    breaker.record({"error": "Gemini quota exceeded. Please try again in 300s."})
+    for _ in range(4):  # calls that were already in flight fail afterwards
+        breaker.record({"error": "Gemini API error: 503"})
+
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == 300
+
+
+def test_missing_key_does_not_count_against_the_provider():
+    breaker = _breaker(_Clock())
+    for _ in range(10):
+        assert breaker.allow()
+        breaker.record({"error": "Gemini API key not configured"})
+    assert breaker.state == CLOSED
+
+
+def test_only_the_probe_releases_the_probe_slot():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    straggler = breaker.acquire()  # started while closed, still in flight
+    breaker.record({"error": "Gemini quota exceeded. Please try again in 10s."})
+    clock.now += 11
+
+    probe = breaker.acquire()
+    assert probe is not None and breaker.state == HALF_OPEN
+    breaker.release(straggler)  # e.g. cancelled by a hedged race
+    assert breaker.acquire() is None  # the probe is still running
+
+    breaker.release(probe)
+    assert breaker.acquire() is not None
+
+
+def test_daily_quota_resets_at_pacific_midnight():
+    # 20:00 UTC on a January day is 12:00 in Los Angeles (PST).
+    noon_pacific = datetime(2026, 1, 15, 20, 0, tzinfo=timezone.utc)
+    assert circuit_breaker._seconds_until_pacific_midnight(noon_pacific) == 12 * 3600
+    assert circuit_breaker.quota_reset_seconds("Daily AI quota exceeded. Please try again tomorrow.") > 0
+    assert circuit_breaker.quota_reset_seconds("retryDelay': '41s'") == 41
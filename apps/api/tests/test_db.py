@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import asyncio
+
+import services.db as db
+
+
+def test_db_client_is_shared_and_rebuilt_on_key_rotation(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "https://example.supabase.co/")
+    monkeypatch.setenv("SUPABASE_SERVICE_KEY", "service-key-1")
+
+    async def _run():
+        first = db.get_db()
+        assert db.get_db() is first
+        assert first.session.headers["apikey"] == "service-key-1"
+        assert str(first.base_url) == "https://example.supabase.co/rest/v1"
+
+        monkeypatch.setenv("SUPABASE_SERVICE_KEY", "service-key-2")
+        rotated = db.get_db()
+        assert rotated is not first
+        assert rotated.session.headers["Authorization"] == "Bearer service-key-2"
+        await db.close_db()
+        assert db._db_client is None
+
+    asyncio.run(_run())
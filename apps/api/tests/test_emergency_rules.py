@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+
+import services.emergency_rules as emergency_rules
+from services.emergency_rules import EmergencyRuleSet
+
+
+def _rule(rule_id: str, condition: dict, **extra) -> dict:
+    return {"id": rule_id, "name": rule_id, "severity": "critical", "message": "", "condition": condition, **extra}
+
+
+def _has(symptom: str) -> dict:
+    return {"in": [symptom, {"var": "symptoms"}]}
+
+
+def test_shipped_rules_match_expected_alerts():
+    rules = emergency_rules.load_emergency_rules(emergency_rules._RULES_PATH)
+
+    cardiac = rules.evaluate(["chest_pain", "sweating"], [])
+    stroke = rules.evaluate(["face_drooping"], [])
+    stroke_sudden = rules.evaluate(["face_drooping"], ["sudden_onset"])
+
+    assert [a["rule_id"] for a in cardiac] == ["cardiac_emergency"]
+    assert cardiac[0]["confidence"] == "high"
+    assert stroke[0]["confidence"] == "medium"
+    assert stroke_sudden[0]["confidence"] == "high"
+    assert rules.evaluate(["chest_pain"], []) == []
+    assert {a["rule_id"] for a in rules.evaluate(["chest_pain", "breathlessness"], [])} == {
+        "cardiac_emergency", "severe_breathing",
+    }
+
+
+def test_negation_and_nesting_compile_to_equivalent_masks():
+    rules = EmergencyRuleSet([
+        _rule("fever_no_rash", {"and": [_has("high_fever"), {"!": {"or": [_has("rash"), _has("cough")]}}]}),
+    ])
+
+    assert len(rules.evaluate(["high_fever"], [])) == 1
+    assert rules.evaluate(["high_fever", "rash"], []) == []
+    assert rules.evaluate(["high_fever", "cough"], []) == []
+    assert rules.evaluate(["rash"], []) == []
+
+
+def test_unsupported_operator_is_rejected():
+    with pytest.raises(ValueError, match="bad_rule"):
+        EmergencyRuleSet([_rule("bad_rule", {">": [{"var": "age"}, 60]})])
+
+
+def test_rules_file_is_hot_reloaded(tmp_path, monkeypatch):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [_rule("a", _has("cough"))]}))
+    monkeypatch.setattr(emergency_rules, "_RULES_PATH", path)
+    monkeypatch.setattr(emergency_rules, "_rule_set", None)
+
+    assert [a["rule_id"] for a in emergency_rules.check_emergency_rules(["cough"], [])] == ["a"]
+
+    path.write_text(json.dumps({"rules": [_rule("b", _has("cough"))]}))
+    os.utime(path, ns=(1, 1))
+    assert [a["rule_id"] for a in emergency_rules.check_emergency_rules(["cough"], [])] == ["b"]
+
+    path.write_text("{not json")
+    os.utime(path, ns=(2, 2))
+    assert [a["rule_id"] for a in emergency_rules.check_emergency_rules(["cough"], [])] == ["b"]
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import services.prescription_ocr_service as ocr_service
+from services.cache import LRUCache
+from services.fuzzy_index import TrigramIndex
+
+
+def test_trigram_index_ranks_closest_names_first():
+    names = ["Amoxicillin", "Ampicillin", "Azithromycin", "Paracetamol", "Pantoprazole"]
+    index = TrigramIndex((name, name.lower()) for name in names)
+
+    matches = index.search("amoxicilin", k=2)
+
+    assert [name for name, _ in matches] == ["Amoxicillin", "Ampicillin"]
+    assert matches[0][1] > matches[1][1]
+    assert index.search("") == []
+    assert index.search("zzzz") == []
+
+
+def test_medicine_normalization_uses_index_candidates(monkeypatch):
+    monkeypatch.setattr(ocr_service, "_MEDICINE_LEXICON", ["Dolo 650", "Paracetamol"])
+    monkeypatch.setattr(ocr_service, "_MEDICINE_NORMALIZED", {"dolo 650": "Dolo 650", "paracetamol": "Paracetamol"})
+    monkeypatch.setattr(
+        ocr_service,
+        "_MEDICINE_INDEX",
+        TrigramIndex([("Dolo 650", "dolo 650"), ("Paracetamol", "paracetamol")]),
+    )
+    monkeypatch.setattr(ocr_service, "_NAME_NORMALIZATION_CACHE", LRUCache(16))
+
+    assert ocr_service._normalize_medicine_name("Paracetmol") == "Paracetamol"
+    assert ocr_service._normalize_medicine_name("Xylo") == "Xylo"
+    assert ocr_service.suggest_medicine_names("paracetmol", k=3)[0][0] == "Paracetamol"
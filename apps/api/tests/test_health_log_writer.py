@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+
+from postgrest.exceptions import APIError
+
+from services.health_log_writer import HealthLogWriter
+
+
+def _entry(n: int) -> dict:
+    return {"patient_id": f"p{n}", "recorded_by": "user-1", "log_type": "vitals", "data": {"n": n}, "notes": ""}
+
+
+def test_rows_are_batched_and_survive_restart(tmp_path):
+    spool = tmp_path / "spool.sqlite3"
+    batches: list[list[dict]] = []
+
+    async def failing_insert(_rows):
+        raise ConnectionError("supabase unreachable")
+
+    async def recording_insert(rows):
+        batches.append(rows)
+
+    async def _first_process():
+        writer = HealthLogWriter(spool, flush_interval_s=0, insert_batch=failing_insert)
+        ids = [await writer.enqueue(_entry(n)) for n in range(3)]
+        await writer.stop()
+        assert writer.stats()["pending"] == 3
+        assert [log["id"] for log in writer.pending_for("user-1", "vitals")] == ids
+        return ids
+
+    async def _second_process():
+        writer = HealthLogWriter(spool, flush_interval_s=0, batch_size=2, insert_batch=recording_insert)
+        writer._spool._conn.execute("UPDATE pending_health_logs SET next_attempt_at = 0")
+        assert await writer.flush() == 3
+        return writer
+
+    ids = asyncio.run(_first_process())
+    writer = asyncio.run(_second_process())
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert [row["id"] for batch in batches for row in batch] == ids
+    assert all(row["created_at"] for batch in batches for row in batch)
+    assert writer.stats()["pending"] == 0
+
+
+def test_rejected_batch_is_split_and_bad_row_backs_off(tmp_path):
+    written: list[str] = []
+
+    async def insert(rows):
+        if any(row["patient_id"] == "p1" for row in rows):
+            raise APIError({"message": "violates foreign key constraint", "code": "23503"})
+        written.extend(row["patient_id"] for row in rows)
+
+    async def _run():
+        writer = HealthLogWriter(tmp_path / "spool.sqlite3", flush_interval_s=0, max_attempts=2, insert_batch=insert)
+        for n in range(3):
+            await writer.enqueue(_entry(n))
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(_run())
+
+    assert sorted(written) == ["p0", "p2"]
+    stats = writer.stats()
+    assert stats["pending"] == 1 and stats["retries"] == 1 and stats["dead"] == 0
+
+    writer._spool._conn.execute("UPDATE pending_health_logs SET next_attempt_at = 0")
+    asyncio.run(writer.flush())
+    assert writer.stats()["dead"] == 1 and writer.stats()["pending"] == 0
+
+
+def test_workers_sharing_a_spool_send_each_row_once(tmp_path):
+    spool = tmp_path / "spool.sqlite3"
+    sent: list[str] = []
+
+    async def slow_insert(rows):
+        await asyncio.sleep(0.01)
+        sent.extend(row["id"] for row in rows)
+
+    async def _run():
+        worker_a = HealthLogWriter(spool, flush_interval_s=0, batch_size=2, max_pending=4, insert_batch=slow_insert)
+        worker_b = HealthLogWriter(spool, flush_interval_s=0, batch_size=2, max_pending=4, insert_batch=slow_insert)
+        ids = [await writer.enqueue(_entry(n)) for n, writer in enumerate([worker_a, worker_b] * 2)]
+        # The limit is spool-wide: worker B sees A's rows and writes straight through.
+        direct_id = await worker_b.enqueue(_entry(99))
+        assert worker_b.direct_writes == 1 and worker_b.stats()["pending"] == 4
+        sent.remove(direct_id)
+
+        await asyncio.gather(worker_a.flush(), worker_b.flush())
+        await asyncio.gather(worker_a.stop(), worker_b.stop())
+        return ids, worker_a, worker_b
+
+    ids, worker_a, worker_b = asyncio.run(_run())
+
+    assert sorted(sent) == sorted(ids)
+    assert worker_a.stats()["pending"] == worker_b.stats()["pending"] == 0
+
+
+def test_row_for_a_deleted_self_patient_is_moved_and_resent_once(tmp_path):
+    sent: list[str] = []
+
+    async def insert(rows):
+        for row in rows:
+            if row["patient_id"] in ("patient-old", "patient-stale", "patient-gone"):
+                raise APIError({"message": "violates foreign key constraint", "code": "23503"})
+        sent.extend(row["patient_id"] for row in rows)
+
+    async def replace_patient(record):
+        replacements = {"patient-old": "patient-new", "patient-stale": "patient-gone", "patient-gone": "patient-x"}
+        return replacements.get(record["patient_id"])
+
+    async def _run():
+        writer = HealthLogWriter(tmp_path / "spool.sqlite3", flush_interval_s=0, insert_batch=insert,
+                                 replace_patient=replace_patient)
+        await writer.enqueue({**_entry(1), "patient_id": "patient-old"})
+        await writer.enqueue({**_entry(2), "patient_id": "patient-child"})
+        await writer.enqueue({**_entry(3), "patient_id": "patient-stale"})  # replacement fails too
+        await writer.flush()
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(_run())
+
+    assert sent == ["patient-new", "patient-child"]
+    assert writer.stats()["pending"] == 1 and writer.retries == 1
+    payload = writer._spool._conn.execute("SELECT payload FROM pending_health_logs").fetchone()[0]
+    assert '"patient_id": "patient-gone"' in payload
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+
+import numpy as np
+
+import services.local_ml_service as local_ml
+
+
+class _FakeForest:
+    def __init__(self):
+        self.calls: list[int] = []
+
+    def predict_proba(self, features):
+        self.calls.append(len(features))
+        # Column 0 -> cold, column 1 -> migraine, column 2 -> malaria.
+        weights = features.astype(float) + 0.01
+        return weights / weights.sum(axis=1, keepdims=True)
+
+
+def _install_fake_model(monkeypatch) -> _FakeForest:
+    forest = _FakeForest()
+    model_data = {
+        "model": forest,
+        "classes": np.array(["Common Cold", "Migraine", "Malaria"]),
+        "feature_names": ["cough", "headache", "chills"],
+    }
+    mapping = {"cough": ["cough"], "headache": ["headache"], "chills": ["chills"]}
+    monkeypatch.setattr(local_ml, "_load_symptom_model", lambda: model_data)
+    monkeypatch.setattr(local_ml, "_load_symptom_mapping", lambda: mapping)
+    monkeypatch.setattr(local_ml, "_feature_index", None)
+    return forest
+
+
+def test_batch_prediction_matches_single_requests(monkeypatch):
+    forest = _install_fake_model(monkeypatch)
+    symptom_sets = [["cough"], ["headache", "chills"], ["unknown_symptom"]]
+
+    batched = local_ml._predict_diseases_batch_sync(symptom_sets, top_k=2)
+
+    assert forest.calls == [2]
+    assert batched[0][0]["name"] == "Common Cold"
+    assert {p["name"] for p in batched[1]} == {"Migraine", "Malaria"}
+    assert batched[2] == []
+    assert batched == [local_ml._predict_diseases_sync(s, top_k=2) for s in symptom_sets]
+
+
+def test_concurrent_predictions_are_coalesced(monkeypatch):
+    forest = _install_fake_model(monkeypatch)
+    monkeypatch.setattr(local_ml, "_SYMPTOM_BATCH_WINDOW_S", 0.01)
+    monkeypatch.setattr(local_ml, "_prediction_coalescer", None)
+
+    async def _run():
+        return await asyncio.gather(
+            local_ml._predict_diseases(["cough"], 1),
+            local_ml._predict_diseases(["headache"], 3),
+            local_ml._predict_diseases(["chills"], 2),
+        )
+
+    cold, migraine, malaria = asyncio.run(_run())
+
+    assert forest.calls == [3]
+    assert [p["name"] for p in cold] == ["Common Cold"]
+    assert migraine[0]["name"] == "Migraine"
+    assert malaria[0]["name"] == "Malaria"
+
+
+def test_in_flight_batches_are_held_until_they_finish(monkeypatch):
+    import gc
+    import time
+
+    forest = _install_fake_model(monkeypatch)
+    predict_proba = forest.predict_proba
+    forest.predict_proba = lambda features: (time.sleep(0.05), predict_proba(features))[1]
+    monkeypatch.setattr(local_ml, "_SYMPTOM_BATCH_WINDOW_S", 0.001)
+    monkeypatch.setattr(local_ml, "_prediction_coalescer", None)
+
+    async def _run():
+        pending = asyncio.gather(local_ml._predict_diseases(["cough"], 1), local_ml._predict_diseases(["chills"], 1))
+        await asyncio.sleep(0.02)  # window elapsed, batch running in the worker thread
+        gc.collect()
+        in_flight = len(local_ml._prediction_coalescer._tasks)
+        results = await pending
+        await asyncio.sleep(0)  # done callbacks run on the next loop iteration
+        return in_flight, results, len(local_ml._prediction_coalescer._tasks)
+
+    in_flight, (cold, malaria), remaining = asyncio.run(_run())
+
+    assert in_flight == 1 and remaining == 0
+    assert cold[0]["name"] == "Common Cold" and malaria[0]["name"] == "Malaria"
+
+
+def test_local_analysis_is_cached_per_canonical_symptom_set(monkeypatch):
+    forest = _install_fake_model(monkeypatch)
+    monkeypatch.setattr(local_ml, "_SYMPTOM_BATCH_WINDOW_S", 0.0)
+    monkeypatch.setattr(local_ml, "_symptom_sources_changed", lambda: False)
+    monkeypatch.setattr(local_ml, "get_available_generic_names", lambda: None)
+    local_ml._SYMPTOM_RESULT_CACHE.clear()
+
+    async def _run():
+        first = await local_ml.analyze_symptoms_local(["headache", "cough"], [], 2)
+        second = await local_ml.analyze_symptoms_local(["cough", "headache", "cough"], [], 3)
+        escalated = await local_ml.analyze_symptoms_local(["cough", "headache"], [], 8)
+        return first, second, escalated
+
+    hits_before = local_ml.get_symptom_cache_stats()["hits"]
+    first, second, escalated = asyncio.run(_run())
+
+    assert first == second
+    assert forest.calls == [1, 1]
+    assert local_ml.get_symptom_cache_stats()["hits"] == hits_before + 1
+    assert escalated is not first
+
+    local_ml._invalidate_symptom_model()
+    assert len(local_ml._SYMPTOM_RESULT_CACHE) == 0
+
+
+def test_inconclusive_summary_keeps_the_callers_symptom_order(monkeypatch):
+    async def weak_prediction(_symptoms, _top_k):
+        return [{"name": "Common Cold", "probability": 0.1}]
+
+    monkeypatch.setattr(local_ml, "_predict_diseases", weak_prediction)
+    monkeypatch.setattr(local_ml, "_symptom_sources_changed", lambda: False)
+    monkeypatch.setattr(local_ml, "get_available_generic_names", lambda: None)
+    local_ml._SYMPTOM_RESULT_CACHE.clear()
+
+    first = asyncio.run(local_ml.analyze_symptoms_local(["runny_nose", "cough"], [], 1))
+    second = asyncio.run(local_ml.analyze_symptoms_local(["cough", "runny_nose"], [], 1))
+
+    assert first["summary"].startswith("Your symptoms (runny nose, cough) are common")
+    assert second["summary"].startswith("Your symptoms (cough, runny nose) are common")
+    assert len(local_ml._SYMPTOM_RESULT_CACHE) == 1
+
+
+def test_model_files_are_checked_at_most_once_per_interval(monkeypatch):
+    stats: list[str] = []
+    real_stat = local_ml.Path.stat
+
+    def counting_stat(path, *args, **kwargs):
+        stats.append(path.name)
+        return real_stat(path, *args, **kwargs)
+
+    clock = {"now": 100.0}
+    monkeypatch.setattr(local_ml.Path, "stat", counting_stat)
+    monkeypatch.setattr(local_ml.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(local_ml, "_sources_checked_at", None)
+    monkeypatch.setattr(local_ml, "_symptom_sources_signature", None)
+
+    for _ in range(5):
+        local_ml._symptom_sources_changed()
+    assert len(stats) == 3
+
+    clock["now"] += local_ml._SOURCES_CHECK_INTERVAL_S
+    local_ml._symptom_sources_changed()
+    assert len(stats) == 6
+
+
+def test_recommendations_are_filtered_after_the_cache(monkeypatch):
+    _install_fake_model(monkeypatch)
+    monkeypatch.setattr(local_ml, "_SYMPTOM_BATCH_WINDOW_S", 0.0)
+    monkeypatch.setattr(local_ml, "_symptom_sources_changed", lambda: False)
+    monkeypatch.setattr(local_ml, "_load_disease_metadata", lambda: {
+        "Common Cold": {"recommended_medicines": [
+            {"generic_name": "Paracetamol"}, {"generic_name": "Cetirizine"},
+        ]},
+    })
+    local_ml._SYMPTOM_RESULT_CACHE.clear()
+    available = {"names": None}
+    monkeypatch.setattr(local_ml, "get_available_generic_names", lambda: available["names"])
+
+    def _names(result):
+        return [m["generic_name"] for m in result["recommended_medicines"]]
+
+    unloaded = asyncio.run(local_ml.analyze_symptoms_local(["cough"], [], 1))
+    available["names"] = frozenset({"paracetamol"})
+    stocked = asyncio.run(local_ml.analyze_symptoms_local(["cough"], [], 1))
+    available["names"] = frozenset({"ibuprofen"})
+    unmatched = asyncio.run(local_ml.analyze_symptoms_local(["cough"], [], 1))
+
+    assert _names(unloaded) == ["Paracetamol", "Cetirizine"]
+    assert _names(stocked) == ["Paracetamol"]
+    assert _names(unmatched) == ["Paracetamol", "Cetirizine"]
+    assert len(local_ml._SYMPTOM_RESULT_CACHE) == 1
+
+
+def _wav_bytes(seconds: float = 0.5, rate: int = 8000) -> bytes:
+    import io
+    import wave
+
+    samples = (np.sin(np.linspace(0, 440 * 2 * np.pi * seconds, int(rate * seconds))) * 8000).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+
+def test_audio_is_decoded_in_memory_and_resampled():
+    audio = local_ml._decode_audio(_wav_bytes(seconds=0.5, rate=8000))
+
+    assert audio.dtype == np.float32
+    assert abs(len(audio) - 8000) <= 200  # 0.5 s at 16 kHz
+
+
+class _Segment:
+    def __init__(self, start, end, text):
+        self.start, self.end, self.text = start, end, text
+
+
+class _FakeWhisper:
+    def __init__(self):
+        self.decoded = 0
+        self.beam_sizes = []
+
+    def transcribe(self, audio, beam_size, language, task):
+        self.beam_sizes.append(beam_size)
+
+        def segments():
+            for seg in (_Segment(0.0, 2.0, " I have chest"), _Segment(2.0, 4.0, " pain and a cough")):
+                self.decoded += 1
+                yield seg
+
+        return segments(), type("Info", (), {"language": "en"})()
+
+
+def test_transcription_streams_segments_then_final(monkeypatch):
+    whisper = _FakeWhisper()
+    monkeypatch.setattr(local_ml, "_load_whisper_model", lambda: whisper)
+    monkeypatch.setattr(local_ml, "_decode_audio", lambda _bytes: np.zeros(16000, dtype=np.float32))
+
+    async def _run():
+        return [event async for event in local_ml.stream_transcription_local(b"audio")]
+
+    events = asyncio.run(_run())
+
+    assert [e["type"] for e in events] == ["segment", "segment", "final"]
+    # "chest pain" spans the segment boundary and is reported once both halves arrived.
+    assert events[0]["new_symptoms"] == []
+    assert set(events[1]["new_symptoms"]) >= {"chest_pain", "cough"}
+    assert events[2]["transcription"]["suggested_symptoms"] == events[1]["suggested_symptoms"]
+    assert whisper.beam_sizes == [local_ml._WHISPER_STREAM_BEAM_SIZE]
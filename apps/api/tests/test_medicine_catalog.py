@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import asyncio
+
+import services.medicine_catalog as catalog_module
+from services.medicine_catalog import MedicineCatalog
+
+_ROWS = [
+    {"id": "1", "brand_name": "Crocin", "generic_name": "Paracetamol", "salt_composition": "Paracetamol 500mg",
+     "hindi_name": "पैरासिटामोल", "category": "analgesic", "updated_at": "2026-01-01T00:00:00+00:00"},
+    {"id": "2", "brand_name": "Dolo 650", "generic_name": "Paracetamol", "salt_composition": "Paracetamol 650mg",
+     "hindi_name": None, "category": "analgesic", "updated_at": "2026-01-02T00:00:00+00:00"},
+    {"id": "3", "brand_name": "Mox", "generic_name": "Amoxicillin", "salt_composition": "Amoxicillin 250mg",
+     "hindi_name": None, "category": "antibiotic", "updated_at": "2026-01-03T00:00:00+00:00"},
+]
+
+
+def test_catalog_search_matches_substrings_and_ranks_exact_names_first():
+    catalog = MedicineCatalog(_ROWS)
+
+    assert [row["id"] for row in catalog.search("dolo")] == ["2"]
+    assert [row["id"] for row in catalog.search("PARACETAMOL")] == ["1", "2"]
+    assert [row["id"] for row in catalog.search("cillin")] == ["3"]
+    assert [row["id"] for row in catalog.search("mo")] == ["3", "1", "2"]  # short query: brand prefix first
+    assert [row["id"] for row in catalog.search("पैरा")] == ["1"]
+    assert catalog.search("650mg", fields=("brand_name",)) == []
+    assert catalog.search("zzz") == []
+
+
+def test_catalog_refresh_fetches_only_rows_updated_since_last_load(monkeypatch):
+    calls: list[str | None] = []
+    updated = dict(_ROWS[2], brand_name="Novamox", updated_at="2026-02-01T00:00:00+00:00")
+
+    async def fake_fetch(updated_since=None):
+        calls.append(updated_since)
+        return list(_ROWS) if updated_since is None else [updated]
+
+    monkeypatch.setattr(catalog_module, "_fetch_rows", fake_fetch)
+    monkeypatch.setattr(catalog_module, "_catalog", None)
+    monkeypatch.setattr(catalog_module, "_next_attempt_at", 0.0)
+    monkeypatch.setattr(catalog_module, "_REFRESH_SECONDS", 0)
+
+    async def _run():
+        first = await catalog_module.get_medicine_catalog()
+        await catalog_module.get_medicine_catalog()  # stale: serves `first`, refreshes in background
+        await catalog_module._refresh_task
+        return first, await catalog_module.get_medicine_catalog()
+
+    first, refreshed = asyncio.run(_run())
+
+    assert calls[:2] == [None, "2026-01-03T00:00:00+00:00"]
+    assert len(refreshed) == 3
+    assert refreshed.by_id["3"]["brand_name"] == "Novamox"
+    assert refreshed.version != first.version
+    assert refreshed.updated_at_high_water == "2026-02-01T00:00:00+00:00"
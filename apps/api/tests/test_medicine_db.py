@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+
+import services.medicine_db as medicine_db
+from services.medicine_catalog import MedicineCatalog
+
+_ROW = {"id": "1", "generic_name": "Paracetamol", "brand_name": "Crocin", "strength": "500mg",
+        "dosage_form": "tablet", "category": "analgesic", "market_price": 30}
+
+
+def _reset(monkeypatch):
+    monkeypatch.setattr(medicine_db, "_MEDICINE_NAMES_CACHE", {
+        "value": None, "version": None, "catalog_version": None, "fetched_at": 0.0,
+    })
+    monkeypatch.setattr(medicine_db, "_names_refresh_task", None)
+
+
+def test_prompt_context_follows_catalog_version(monkeypatch):
+    _reset(monkeypatch)
+    catalogs = [MedicineCatalog([_ROW]), MedicineCatalog([dict(_ROW, market_price=25)])]
+    current = {"catalog": catalogs[0]}
+
+    async def fake_catalog():
+        return current["catalog"]
+
+    monkeypatch.setattr(medicine_db, "get_medicine_catalog", fake_catalog)
+
+    first = asyncio.run(medicine_db.get_all_medicine_names())
+    version = medicine_db.get_medicine_names_version()
+    current["catalog"] = catalogs[1]  # price change: catalog version moves, prompt text does not
+    second = asyncio.run(medicine_db.get_all_medicine_names())
+
+    assert first == second == "- Paracetamol (Crocin) 500mg tablet [analgesic]"
+    assert medicine_db.get_medicine_names_version() == version
+
+
+def test_remote_prompt_context_is_fetched_once_and_served_stale(monkeypatch):
+    _reset(monkeypatch)
+    fetches = []
+
+    async def no_catalog():
+        return None
+
+    async def fake_fetch():
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        return f"- list {len(fetches)}"
+
+    monkeypatch.setattr(medicine_db, "get_medicine_catalog", no_catalog)
+    monkeypatch.setattr(medicine_db, "_fetch_all_medicine_names", fake_fetch)
+
+    async def _run():
+        cold = await asyncio.gather(*[medicine_db.get_all_medicine_names() for _ in range(10)])
+        medicine_db._MEDICINE_NAMES_CACHE["fetched_at"] = 0.0  # expire
+        stale = await asyncio.gather(*[medicine_db.get_all_medicine_names() for _ in range(10)])
+        await medicine_db._names_refresh_task
+        return cold, stale, await medicine_db.get_all_medicine_names()
+
+    cold, stale, fresh = asyncio.run(_run())
+
+    assert cold == ["- list 1"] * 10
+    assert stale == ["- list 1"] * 10
+    assert fresh == "- list 2"
+    assert len(fetches) == 2
@@ -65,18 +65,28 @@ def test_prescription_endpoint_returns_ocr_metadata(monkeypatch):
         def insert(self, _row):
             return self
 
-        def execute(self):
+        async def execute(self):
             return {"ok": True}
 
-    class _DummySupabase:
+    class _DummyDB:
         def table(self, _name):
             return _DummyQuery()
 
+    async def fake_self_patient(*_args, **_kwargs):
+        return "patient-1"
+
+    queued = []
+
+    async def fake_enqueue(entry):
+        queued.append(entry)
+        return "log-1"
+
     app.dependency_overrides[get_current_user_id] = lambda: "test-user"
     monkeypatch.setattr(ocr_router, "extract_prescription", fake_extract)
     monkeypatch.setattr(ocr_router, "get_medicines_by_names", fake_db_lookup)
-    monkeypatch.setattr(ocr_router, "get_supabase_client", lambda: _DummySupabase())
-    monkeypatch.setattr(ocr_router, "get_or_create_self_patient", lambda *_args, **_kwargs: "patient-1")
+    monkeypatch.setattr(ocr_router, "get_db", lambda: _DummyDB())
+    monkeypatch.setattr(ocr_router, "get_or_create_self_patient", fake_self_patient)
+    monkeypatch.setattr(ocr_router, "enqueue_health_log", fake_enqueue)
 
     try:
         files = {"image": ("prescription.png", _fake_image_bytes(), "image/png")}
@@ -87,6 +97,24 @@ def test_prescription_endpoint_returns_ocr_metadata(monkeypatch):
     assert response.status_code == 200
     payload = response.json()
     assert payload["success"] is True
+    assert payload["saved"] is True
+    assert payload["record_id"] == "log-1"
+    assert queued[0]["log_type"] == "prescription"
     assert payload["prescription"]["ocr_engine"] == "local-trocr"
     assert isinstance(payload["prescription"]["warnings"], list)
     assert payload["prescription"]["raw_text"]
+
+
+def test_enrichment_picks_best_scoring_match_not_first_reasonable_one():
+    rows = [
+        {"id": "1", "brand_name": "Amoxicillin Clavulanate", "generic_name": "Amoxicillin + Clavulanic Acid"},
+        {"id": "2", "brand_name": "Mox 500", "generic_name": "Amoxicillin"},
+        {"id": "3", "brand_name": "Crocin", "generic_name": "Paracetamol"},
+    ]
+    index = ocr_router._MedicineMatchIndex(rows)
+
+    assert index.best_match("amoxicillin")["id"] == "2"
+    assert index.best_match("amoxicillin clavulanate 625")["id"] == "1"
+    assert index.best_match("crocin advance")["id"] == "3"
+    assert index.best_match("cetirizine") is None
+    assert index.best_match("") is None
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+
+from postgrest.exceptions import APIError
+
+import services.patient_utils as patient_utils
+
+
+class _FakeRpc:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+
+    async def execute(self):
+        self.db.rpc_calls.append(self.params)
+        await asyncio.sleep(0.01)
+        if self.db.missing_rpc:
+            raise APIError({"message": "Could not find the function", "code": "PGRST202"})
+        return type("Response", (), {"data": "patient-1"})()
+
+
+class _FakeDB:
+    def __init__(self, missing_rpc=False):
+        self.rpc_calls: list[dict] = []
+        self.missing_rpc = missing_rpc
+
+    def rpc(self, name, params):
+        return _FakeRpc(self, name, params)
+
+
+def _reset(monkeypatch):
+    patient_utils._SELF_PATIENT_CACHE.clear()
+    patient_utils._REPLACED_SELF_PATIENTS.clear()
+    monkeypatch.setattr(patient_utils, "_upsert_rpc_available", None)
+
+
+def test_concurrent_first_calls_share_one_upsert_and_repeat_calls_hit_cache(monkeypatch):
+    _reset(monkeypatch)
+    db = _FakeDB()
+
+    async def _run():
+        first = await asyncio.gather(*[patient_utils.get_or_create_self_patient(db, "user-1", 30) for _ in range(5)])
+        again = await patient_utils.get_or_create_self_patient(db, "user-1")
+        return first, again
+
+    first, again = asyncio.run(_run())
+
+    assert first == ["patient-1"] * 5
+    assert again == "patient-1"
+    assert db.rpc_calls == [{"p_user_id": "user-1", "p_age": 30, "p_gender": None}]
+
+
+def test_falls_back_to_queries_when_upsert_function_is_missing(monkeypatch):
+    _reset(monkeypatch)
+    db = _FakeDB(missing_rpc=True)
+    fallback_calls = []
+
+    async def fake_fallback(_db, user_id, _age, _gender):
+        fallback_calls.append(user_id)
+        return "patient-legacy"
+
+    monkeypatch.setattr(patient_utils, "_find_or_create_self_patient", fake_fallback)
+
+    async def _run():
+        first = await patient_utils.get_or_create_self_patient(db, "user-2")
+        patient_utils.invalidate_self_patient("user-2")
+        second = await patient_utils.get_or_create_self_patient(db, "user-2")
+        return first, second
+
+    assert asyncio.run(_run()) == ("patient-legacy", "patient-legacy")
+    assert len(db.rpc_calls) == 1
+    assert fallback_calls == ["user-2", "user-2"]
+
+
+def test_stale_self_patient_is_replaced_only_for_self_patient_ids(monkeypatch):
+    _reset(monkeypatch)
+    ids = iter(["patient-old", "patient-new"])
+
+    async def fake_resolve(_db, _user_id, _age, _gender):
+        return next(ids)
+
+    monkeypatch.setattr(patient_utils, "_resolve_self_patient", fake_resolve)
+
+    async def _run():
+        await patient_utils.get_or_create_self_patient(None, "user-3")
+        dependent = await patient_utils.replace_stale_self_patient(None, "user-3", "patient-child")
+        first = await patient_utils.replace_stale_self_patient(None, "user-3", "patient-old")
+        second = await patient_utils.replace_stale_self_patient(None, "user-3", "patient-old")
+        current = await patient_utils.get_or_create_self_patient(None, "user-3")
+        return dependent, first, second, current
+
+    assert asyncio.run(_run()) == (None, "patient-new", "patient-new", "patient-new")
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
 import io
+import sys
+import threading
+from types import SimpleNamespace
 
+import numpy as np
 from PIL import Image, ImageDraw
 
 import services.prescription_ocr_service as ocr_service
@@ -30,7 +34,7 @@ def _make_fixture_image() -> bytes:
 def test_pipeline_parses_synthetic_fixture(monkeypatch):
     fixture_bytes = _make_fixture_image()
 
-    def fake_recognize(_line_images, _preferred_engine):
+    def fake_recognize(_line_images, _preferred_engine, **_kwargs):
         return OCRRecognitionResult(
             lines=[
                 "Dr.R Sharma",
@@ -52,3 +56,223 @@ def test_pipeline_parses_synthetic_fixture(monkeypatch):
     assert result["date"] == "12/02/2026"
     assert len(result["medicines"]) >= 2
     assert any("paracetamol" in m["brand_name"].lower() for m in result["medicines"])
+
+
+class _FakeSession:
+    def __init__(self, input_names, output_names, run_fn):
+        self._inputs = [SimpleNamespace(name=name) for name in input_names]
+        self._outputs = [SimpleNamespace(name=name) for name in output_names]
+        self._run_fn = run_fn
+        self.calls = []
+
+    def get_inputs(self):
+        return self._inputs
+
+    def get_outputs(self):
+        return self._outputs
+
+    def run(self, output_names, feeds):
+        self.calls.append(feeds)
+        result = self._run_fn(feeds)
+        return [result[name] for name in output_names]
+
+
+def _one_hot_logits(token_ids, vocab_size=8):
+    logits = np.full((len(token_ids), 1, vocab_size), -10.0, dtype=np.float32)
+    for row, token in enumerate(token_ids):
+        logits[row, 0, token] = 10.0
+    return logits
+
+
+def test_onnx_greedy_decode_feeds_kv_cache_until_eos():
+    script = {0: [5, 6], 1: [6, 2], 2: [2, 2]}
+    encoder = _FakeSession(
+        ["pixel_values"],
+        ["last_hidden_state"],
+        lambda feeds: {"last_hidden_state": np.zeros((feeds["pixel_values"].shape[0], 4, 3), np.float32)},
+    )
+    decoder = _FakeSession(
+        ["input_ids", "encoder_hidden_states"],
+        ["logits", "present.0.decoder.key"],
+        lambda feeds: {
+            "logits": _one_hot_logits([script[0][0], script[0][1]]),
+            "present.0.decoder.key": np.full((2, 1), 1.0, np.float32),
+        },
+    )
+
+    def _with_past(feeds):
+        step = int(feeds["past_key_values.0.decoder.key"][0, 0])
+        return {
+            "logits": _one_hot_logits(script[step]),
+            "present.0.decoder.key": np.full((2, 1), step + 1.0, np.float32),
+        }
+
+    decoder_with_past = _FakeSession(
+        ["input_ids", "past_key_values.0.decoder.key"],
+        ["logits", "present.0.decoder.key"],
+        _with_past,
+    )
+    runtime = ocr_service._OnnxTrOCRRuntime(
+        encoder=encoder,
+        decoder=decoder,
+        decoder_with_past=decoder_with_past,
+        tokenizer=None,
+        image_size=(8, 8),
+        resample=Image.BILINEAR,
+        rescale_factor=1 / 255,
+        image_mean=np.full(3, 0.5, np.float32),
+        image_std=np.full(3, 0.5, np.float32),
+        decoder_start_token_id=0,
+        eos_token_id=2,
+        pad_token_id=1,
+        special_token_ids=frozenset({0, 1, 2}),
+    )
+
+    sequences, confidences = ocr_service._greedy_decode_onnx(runtime, np.zeros((2, 3, 8, 8), np.float32), 10)
+
+    assert sequences == [[5, 6], [6]]
+    assert len(decoder_with_past.calls) == 2
+    assert decoder_with_past.calls[0]["input_ids"].tolist() == [[5], [6]]
+    assert all(0.99 < c <= 1.0 for c in confidences)
+
+
+class _FakeWord:
+    def __init__(self, text, conf, box):
+        self._text, self._conf, self._box = text, conf, box
+
+    def GetUTF8Text(self, _level):
+        return self._text
+
+    def Confidence(self, _level):
+        return self._conf
+
+    def BoundingBox(self, _level):
+        return self._box
+
+
+class _FakeTessBaseAPI:
+    instances = 0
+    line_tops: list[int] = []
+
+    def __init__(self, lang, oem):
+        type(self).instances += 1
+        self.recognize_calls = 0
+
+    def SetPageSegMode(self, psm):
+        self.psm = psm
+
+    def SetImage(self, _image):
+        pass
+
+    def Recognize(self, _timeout_ms):
+        self.recognize_calls += 1
+        return True
+
+    def GetIterator(self):
+        words = []
+        for top in self.line_tops:
+            # Emitted out of reading order to check per-line sorting by x.
+            words.append(_FakeWord("500mg", 80, (120, top + 4, 180, top + 30)))
+            words.append(_FakeWord("Paracetamol", 90, (20, top + 2, 110, top + 32)))
+        return words
+
+
+def test_onnx_load_failure_falls_back_to_pytorch_trocr(monkeypatch):
+    def broken_onnx(_line_images):
+        raise RuntimeError("tokenizer files missing")
+
+    torch_result = OCRRecognitionResult(lines=["Tab Paracetamol 500 mg"], confidence=0.78, engine="local-trocr", warnings=[])
+    monkeypatch.setattr(ocr_service, "_onnx_artifacts_present", lambda: True)
+    monkeypatch.setattr(ocr_service, "_recognize_lines_trocr_onnx", broken_onnx)
+    monkeypatch.setattr(ocr_service, "_recognize_lines_trocr_torch", lambda _line_images: torch_result)
+
+    result = ocr_service._recognize_lines_trocr([Image.new("L", (200, 40), 255)])
+
+    assert result.engine == "local-trocr"
+    assert result.warnings == ["ONNX TrOCR unavailable, used PyTorch TrOCR: tokenizer files missing"]
+
+
+def test_tesseract_fallback_recognizes_all_lines_in_one_pass(monkeypatch):
+    _FakeTessBaseAPI.instances = 0
+    crops = [Image.new("L", (200, 40), 255) for _ in range(3)]
+    _FakeTessBaseAPI.line_tops = ocr_service._stitch_line_images(crops)[1]
+    fake_module = SimpleNamespace(
+        PyTessBaseAPI=_FakeTessBaseAPI,
+        OEM=SimpleNamespace(DEFAULT=3),
+        RIL=SimpleNamespace(WORD=3),
+        iterate_level=lambda iterator, _level: iter(iterator),
+    )
+    monkeypatch.setitem(sys.modules, "tesserocr", fake_module)
+    monkeypatch.setattr(ocr_service, "_TESSEROCR_AVAILABLE", None)
+    monkeypatch.setattr(ocr_service, "_TESSERACT_ENGINES", threading.local())
+
+    first = ocr_service._recognize_lines_tesseract(crops)
+    second = ocr_service._recognize_lines_tesseract(crops)
+    engine = ocr_service._get_tesseract_engine()
+
+    worker = threading.Thread(target=ocr_service._recognize_lines_tesseract, args=(crops,))
+    worker.start()
+    worker.join()
+
+    assert first.lines == second.lines == ["Paracetamol 500mg"] * 3
+    assert abs(first.confidence - 0.85) < 1e-9
+    assert engine.recognize_calls == 2
+    assert _FakeTessBaseAPI.instances == 2
+
+
+def test_stitched_tesseract_timeout_falls_back_to_per_line_passes(monkeypatch):
+    crops = [Image.new("L", (200, 40), shade) for shade in (255, 254, 253)]
+    calls: list[tuple[int, float]] = []
+
+    def fake_words(image, psm, timeout_s):
+        calls.append((psm, timeout_s))
+        if psm == 6:
+            raise RuntimeError("Tesseract process timeout")
+        shade = image.getpixel((0, 0))
+        if shade == 254:  # one garbled region still times out on its own
+            raise RuntimeError("Tesseract process timeout")
+        return [ocr_service._OCRWord(f"line{255 - shade}", 0.9, 0, 5, 20)]
+
+    monkeypatch.setattr(ocr_service, "_tesseract_words", fake_words)
+
+    lines, confidences = ocr_service._recognize_line_crops_tesseract(crops, timeout_s=1.05)
+
+    assert lines == ["line0", "line2"]
+    assert confidences == [0.9, 0.9]
+    assert calls[0] == (6, 1.05)
+    assert [psm for psm, _ in calls[1:]] == [7, 7, 7]
+    assert all(abs(timeout - 0.35) < 1e-9 for _, timeout in calls[1:])
+
+
+def test_segmentation_returns_per_line_horizontal_bounds():
+    page = Image.new("L", (1200, 600), 255)
+    draw = ImageDraw.Draw(page)
+    draw.rectangle((100, 80, 1000, 110), fill=0)
+    draw.rectangle((100, 115, 1000, 124), fill=0)  # within merge gap of the first line
+    draw.rectangle((600, 300, 900, 330), fill=0)
+    draw.rectangle((50, 500, 200, 505), fill=0)  # shorter than the minimum line height
+
+    crops = ocr_service.segment_prescription_lines(page)
+
+    assert [crop.size for crop in crops] == [(920, 53), (320, 39)]
+
+
+def test_large_jpeg_is_decoded_at_bounded_working_resolution():
+    photo = Image.new("RGB", (4800, 3600), "white")
+    draw = ImageDraw.Draw(photo)
+    draw.rectangle((400, 800, 4000, 900), fill="black")
+    draw.rectangle((400, 1600, 2400, 1700), fill="black")
+    buf = io.BytesIO()
+    photo.save(buf, format="JPEG", quality=90)
+
+    page = ocr_service.preprocess_prescription_page(buf.getvalue())
+    assert page.mode == "L"
+    assert page.size == (ocr_service.DEFAULT_MAX_SIDE, ocr_service.DEFAULT_MAX_SIDE * 3 // 4)
+
+    # Segmentation runs on a reduced copy but crops come from the full working page.
+    crops = ocr_service.segment_prescription_lines(page)
+    assert len(crops) == 2
+    scale = ocr_service.DEFAULT_MAX_SIDE / 4800
+    assert abs(crops[0].width - 3600 * scale) <= 24
+    assert abs(crops[1].width - 2000 * scale) <= 24
+    assert all(abs(crop.height - 100 * scale) <= 12 for crop in crops)
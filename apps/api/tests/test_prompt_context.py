@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+
+import services.prompt_context as prompt_context
+from services.medicine_catalog import MedicineCatalog
+
+_ROWS = [
+    {"id": 1, "generic_name": "Paracetamol", "brand_name": "Crocin", "strength": "500mg", "category": "analgesic"},
+    {"id": 2, "generic_name": "Paracetamol", "brand_name": "Dolo 650", "strength": "650mg", "category": "analgesic"},
+    {"id": 3, "generic_name": "Calamine", "brand_name": "Lacto Calamine", "strength": "8%", "category": "dermatological"},
+    {"id": 4, "generic_name": "Clotrimazole", "brand_name": "Candid", "strength": "1%", "category": "dermatological"},
+    {"id": 5, "generic_name": "Amlodipine", "brand_name": "Amlong", "strength": "5mg", "category": "antihypertensive"},
+    {"id": 6, "generic_name": "Chlorpheniramine + Phenylephrine", "brand_name": "Sinarest", "strength": "2mg+10mg",
+     "category": "respiratory"},
+]
+
+
+def test_generic_components_ignore_forms_and_split_combinations():
+    assert prompt_context.generic_components("Calamine lotion") == {"calamine"}
+    assert prompt_context.generic_components("ORS (Oral Rehydration Salts)") == {"ors", "oral rehydration salts"}
+    assert prompt_context.generic_components("Chlorpheniramine + Phenylephrine") == {"chlorpheniramine", "phenylephrine"}
+
+
+def test_relevant_rows_follow_predicted_generics_and_their_categories():
+    catalog = MedicineCatalog(_ROWS)
+
+    rows = prompt_context.select_relevant_rows(catalog, frozenset({"Calamine lotion", "Phenylephrine"}))
+    text = prompt_context.render_compact(rows)
+
+    assert {row["id"] for row in rows} == {1, 2, 3, 4, 6}  # amlodipine is unrelated
+    assert "- Paracetamol 500mg/650mg (Crocin, Dolo 650) [analgesic]" in text.splitlines()
+    assert len(text.splitlines()) == 4
+
+
+def test_context_is_built_from_predictions_and_cached(monkeypatch):
+    catalog = MedicineCatalog(_ROWS)
+    predictions = []
+
+    async def fake_catalog():
+        return catalog
+
+    async def fake_predict(symptoms):
+        predictions.append(symptoms)
+        return ["Clotrimazole cream"] if "itching" in symptoms else []
+
+    async def full_list():
+        return "\n".join(f"- {row['generic_name']} ({row['brand_name']})" for row in _ROWS)
+
+    monkeypatch.setattr(prompt_context, "get_medicine_catalog", fake_catalog)
+    monkeypatch.setattr(prompt_context, "predict_recommended_generics", fake_predict)
+    monkeypatch.setattr(prompt_context, "get_all_medicine_names", full_list)
+    prompt_context._CONTEXT_CACHE.clear()
+
+    async def _run():
+        skin = await prompt_context.build_symptom_medicines_context(["itching"])
+        again = await prompt_context.build_symptom_medicines_context(["itching"])
+        unknown = await prompt_context.build_symptom_medicines_context(["mystery"])
+        return skin, again, unknown
+
+    skin, again, unknown = asyncio.run(_run())
+
+    assert skin == again
+    assert "Amlodipine" not in skin and "Clotrimazole" in skin
+    assert "Amlodipine" in unknown  # no predictions: whole catalog, deduplicated
+    assert len(prompt_context._CONTEXT_CACHE) == 2
+    assert prompt_context.get_prompt_context_stats()["full_context_tokens"] > 0
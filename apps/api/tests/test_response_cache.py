@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+
+import services.ai_service as ai_service
+from services.circuit_breaker import reset_breakers
+from services.response_cache import ResponseCache, normalize_symptom_request
+
+
+def test_fingerprint_normalizes_and_hides_inputs():
+    cache = ResponseCache()
+    a = normalize_symptom_request(["Cough", "fever"], [], 2, age=34, medical_history=["Diabetes "])
+    b = normalize_symptom_request(["fever", "cough", "cough"], [], 1, age=21, medical_history=["diabetes"])
+    older = normalize_symptom_request(["cough", "fever"], [], 2, age=64, medical_history=["diabetes"])
+
+    assert cache.fingerprint(a) == cache.fingerprint(b)
+    assert cache.fingerprint(a) != cache.fingerprint(older)
+    assert "diabetes" not in cache.fingerprint(a)
+    assert ResponseCache().fingerprint(a) != cache.fingerprint(a)  # per-process salt without a disk tier
+
+
+def test_disk_tier_survives_a_new_process(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    first = ResponseCache(disk_path=path)
+    key = first.fingerprint(normalize_symptom_request(["cough"], [], 1))
+    asyncio.run(first.put(key, {"summary": "cold"}))
+    assert first.stats()["disk_size"] == 1  # tracked on write, not counted per stats() call
+
+    second = ResponseCache(disk_path=path)
+    assert second.stats()["disk_size"] == 1
+    assert second.fingerprint(normalize_symptom_request(["cough"], [], 1)) == key
+    assert asyncio.run(second.get(key)) == {"summary": "cold"}
+    assert second.stats()["disk_hits"] == 1
+
+
+def test_cloud_analysis_is_served_from_cache(monkeypatch):
+    reset_breakers()
+    cache = ResponseCache()
+    calls = []
+
+    async def fake_openai(*args, **kwargs):
+        calls.append(kwargs["medicines_context"])
+        return {"summary": "cold"}
+
+    monkeypatch.setattr(ai_service, "get_model_for_task", lambda task: "gpt-4o-mini")
+    monkeypatch.setattr(ai_service, "get_symptom_response_cache", lambda: cache)
+    monkeypatch.setattr(ai_service, "analyze_symptoms_openai", fake_openai)
+    monkeypatch.delenv("AI_HEDGE_DELAY_MS", raising=False)
+
+    async def _run():
+        first = await ai_service.analyze_symptoms(symptoms=["cough"], modifiers=[], duration_days=1,
+                                                  medicines_context="- Paracetamol")
+        first["summary"] = "mutated by caller"
+        second = await ai_service.analyze_symptoms(["cough"], [], 2, medicines_context="- Paracetamol")
+        other_context = await ai_service.analyze_symptoms(["cough"], [], 2, medicines_context="- Ibuprofen")
+        return second, other_context
+
+    second, other_context = asyncio.run(_run())
+
+    assert second == {"summary": "cold"}
+    assert other_context == {"summary": "cold"}
+    assert calls == ["- Paracetamol", "- Ibuprofen"]
+    reset_breakers()
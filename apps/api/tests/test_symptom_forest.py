@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from services.symptom_forest import load_compiled_model, save_compiled_model
+
+
+def _fit_binary_forest() -> tuple[RandomForestClassifier, np.ndarray]:
+    rng = np.random.default_rng(7)
+    features = (rng.random((300, 24)) < 0.2).astype(np.uint8)
+    labels = features[:, :4].argmax(axis=1) + 2 * features[:, 4]
+    model = RandomForestClassifier(n_estimators=25, class_weight="balanced", random_state=0)
+    model.fit(features, labels)
+    return model, features
+
+
+def test_compiled_forest_matches_sklearn_probabilities(tmp_path):
+    model, features = _fit_binary_forest()
+    path = tmp_path / "symptom_model_compiled.npz"
+    feature_names = [f"f{i}" for i in range(features.shape[1])]
+
+    save_compiled_model(path, model, model.classes_, feature_names, version="test")
+    loaded = load_compiled_model(path)
+
+    compiled = loaded["model"]
+    assert compiled.binary_splits
+    assert loaded["feature_names"] == feature_names
+    assert loaded["classes"].tolist() == [str(c) for c in model.classes_]
+    np.testing.assert_allclose(compiled.predict_proba(features), model.predict_proba(features), atol=1e-6)
+    np.testing.assert_allclose(
+        compiled.predict_proba(features[0]), model.predict_proba(features[:1]), atol=1e-6
+    )
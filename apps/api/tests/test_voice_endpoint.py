@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+
+from fastapi.testclient import TestClient
+
+from main import app
+from services.auth import get_current_user_id
+import routers.voice as voice_router
+
+
+def test_stream_endpoint_emits_ndjson_segments_and_final(monkeypatch):
+    async def fake_stream(_audio_bytes, _mime_type):
+        yield {"type": "segment", "text": "I have a fever", "new_symptoms": ["high_fever"],
+               "suggested_symptoms": ["high_fever"]}
+        yield {"type": "final", "transcription": {"english_text": "I have a fever",
+                                                  "suggested_symptoms": ["high_fever"]}}
+
+    app.dependency_overrides[get_current_user_id] = lambda: "test-user"
+    monkeypatch.setattr(voice_router, "get_model_for_task", lambda task: "local")
+    monkeypatch.setattr(voice_router, "stream_transcription_local", fake_stream)
+    try:
+        client = TestClient(app)
+        files = {"audio": ("note.wav", b"RIFF....", "audio/wav")}
+        response = client.post("/api/voice/transcribe-stream", files=files)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["type"] for line in lines] == ["segment", "final"]
+    assert lines[-1]["success"] is True
+    assert lines[-1]["transcription"]["suggested_symptoms"] == ["high_fever"]
+
+
+def test_stream_endpoint_falls_back_when_local_decode_fails(monkeypatch):
+    async def failing_stream(_audio_bytes, _mime_type):
+        yield {"type": "error", "error": "Could not decode audio: invalid data"}
+
+    async def fake_gemini(_audio_bytes, _mime_type, local_error=None):
+        return {"success": False, "error": local_error}
+
+    app.dependency_overrides[get_current_user_id] = lambda: "test-user"
+    monkeypatch.setattr(voice_router, "get_model_for_task", lambda task: "local")
+    monkeypatch.setattr(voice_router, "stream_transcription_local", failing_stream)
+    monkeypatch.setattr(voice_router, "_transcribe_with_gemini", fake_gemini)
+    try:
+        client = TestClient(app)
+        response = client.post("/api/voice/transcribe-stream", files={"audio": ("a.ogg", b"xx", "audio/ogg")})
+    finally:
+        app.dependency_overrides.clear()
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [{"type": "final", "success": False, "error": "Could not decode audio: invalid data"}]
+
+
+def test_malformed_gemini_transcription_does_not_trip_the_shared_breaker(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+
+    import services.gemini_service as gemini_service
+    from services.circuit_breaker import get_breaker, reset_breakers
+
+    async def fake_generate(_client, _model, _contents):
+        return SimpleNamespace(text="Sorry, I could not understand the audio.")
+
+    reset_breakers()
+    monkeypatch.setattr(gemini_service, "_get_client", lambda: object())
+    monkeypatch.setattr(gemini_service, "generate_content", fake_generate)
+    try:
+        for _ in range(10):
+            result = asyncio.run(voice_router._transcribe_with_gemini(b"audio", "audio/wav"))
+            assert result == {"success": False, "error": "Failed to parse AI response"}
+        breaker = get_breaker("gemini")
+        assert breaker.state == "closed" and breaker.health_score() == 1.0
+    finally:
+        reset_breakers()
@@ -17,7 +17,8 @@ CREATE TABLE IF NOT EXISTS public.medicines (
   contraindications TEXT[],
   hindi_name TEXT,
   is_nlem BOOLEAN DEFAULT false,
-  created_at TIMESTAMPTZ DEFAULT now()
+  created_at TIMESTAMPTZ DEFAULT now(),
+  updated_at TIMESTAMPTZ DEFAULT now()
 );
 
 -- Enable RLS
@@ -36,3 +37,10 @@ CREATE INDEX IF NOT EXISTS idx_medicines_generic_name ON public.medicines (gener
 CREATE INDEX IF NOT EXISTS idx_medicines_brand_name ON public.medicines (brand_name);
 CREATE INDEX IF NOT EXISTS idx_medicines_category ON public.medicines (category);
 CREATE INDEX IF NOT EXISTS idx_medicines_salt ON public.medicines (salt_composition);
+CREATE INDEX IF NOT EXISTS idx_medicines_updated_at ON public.medicines (updated_at);
+
+-- Keep updated_at current for incremental catalog refresh (update_updated_at() is in schema.sql)
+DROP TRIGGER IF EXISTS update_medicines_updated_at ON public.medicines;
+CREATE TRIGGER update_medicines_updated_at
+  BEFORE UPDATE ON public.medicines
+  FOR EACH ROW EXECUTE FUNCTION public.update_updated_at();
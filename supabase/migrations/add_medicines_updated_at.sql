@@ -0,0 +1,18 @@
+-- =============================================================================
+-- MIGRATION: Track medicine row changes for incremental catalog refresh
+-- The API keeps the medicines table in memory and re-fetches only rows with
+-- updated_at newer than the last refresh.
+-- =============================================================================
+
+ALTER TABLE public.medicines
+  ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();
+
+UPDATE public.medicines SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_medicines_updated_at ON public.medicines (updated_at);
+
+-- update_updated_at() is defined in schema.sql
+DROP TRIGGER IF EXISTS update_medicines_updated_at ON public.medicines;
+CREATE TRIGGER update_medicines_updated_at
+  BEFORE UPDATE ON public.medicines
+  FOR EACH ROW EXECUTE FUNCTION public.update_updated_at();
@@ -0,0 +1,35 @@
+-- =============================================================================
+-- MIGRATION: One-round-trip find-or-create for self patient profiles
+-- Requires: add_self_profile_flag.sql (idx_patients_self_profile_unique)
+-- =============================================================================
+
+-- PostgREST cannot target a partial unique index with on_conflict, so the
+-- upsert lives in a function. Concurrent first calls for the same user insert
+-- at most one row; the loser reads the winner's id.
+CREATE OR REPLACE FUNCTION public.get_or_create_self_patient(
+  p_user_id UUID,
+  p_age INTEGER DEFAULT NULL,
+  p_gender TEXT DEFAULT NULL
+)
+RETURNS UUID AS $$
+DECLARE
+  v_patient_id UUID;
+BEGIN
+  INSERT INTO public.patients (created_by, name, is_self_profile, user_id, age, gender)
+  VALUES (p_user_id, 'My Health Profile', true, p_user_id, p_age, p_gender)
+  ON CONFLICT (created_by) WHERE is_self_profile = true DO NOTHING
+  RETURNING id INTO v_patient_id;
+
+  IF v_patient_id IS NULL THEN
+    SELECT id INTO v_patient_id
+    FROM public.patients
+    WHERE created_by = p_user_id AND is_self_profile = true
+    LIMIT 1;
+  END IF;
+
+  RETURN v_patient_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.get_or_create_self_patient(UUID, INTEGER, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_or_create_self_patient(UUID, INTEGER, TEXT) TO service_role;